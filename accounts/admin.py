@@ -7,3 +7,11 @@ class StaffAdmin(admin.ModelAdmin):
     list_filter = ('role', 'is_active', 'department')
     search_fields = ('first_name', 'last_name', 'email', 'employee_id')
     ordering = ('employee_id',)
+    list_per_page = 50
+    show_full_result_count = False
+    
+    def save_model(self, request, obj, form, change):
+        # The Staff post_save signal writes the audit entry
+        obj._audit_actor = request.user
+        obj._audit_fields = [name for name in form.changed_data if name != 'password']
+        super().save_model(request, obj, form, change)
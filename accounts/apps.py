@@ -7,3 +7,4 @@ class AccountsConfig(AppConfig):
     
     def ready(self):
         import accounts.models  # This ensures signals are registered
+        import accounts.tasks  # Registers background job handlers
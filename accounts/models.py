@@ -33,78 +33,61 @@ class Staff(models.Model):
     def is_staff_member(self):
         return self.role == 'STAFF'
 
-# When Staff is created, automatically create a Django User
-@receiver(post_save, sender=Staff)
-def create_user_for_staff(sender, instance, created, **kwargs):
-    # Prevent recursion
-    if hasattr(instance, '_signal_processing'):
-        return
+def sync_staff_user(instance):
+    """Create or update the Django User that belongs to a Staff record"""
+    try:
+        # Update existing user
+        user = User.objects.get(email=instance.email)
+    except User.DoesNotExist:
+        # Create unique username from employee_id
+        username = instance.employee_id
+        
+        # If username already exists, use email prefix with employee_id
+        if User.objects.filter(username=username).exists():
+            username = f"{instance.email.split('@')[0]}_{instance.employee_id}"
+        
+        # Create new Django User with password (use default if no password set)
+        password = instance.password if instance.password else 'changeme123'
+        
+        user = User.objects.create_user(
+            username=username,
+            email=instance.email,
+            first_name=instance.first_name,
+            last_name=instance.last_name,
+            password=password,
+            is_staff=(instance.role == 'ADMIN'),
+            is_superuser=(instance.role == 'ADMIN')
+        )
+        
+        # Add user to "Staff" group
+        staff_group, _ = Group.objects.get_or_create(name='Staff')
+        user.groups.add(staff_group)
+        print(f"Created user {user.username} and added to Staff group")
+        return user
     
-    instance._signal_processing = True
+    user.first_name = instance.first_name
+    user.last_name = instance.last_name
+    user.is_staff = (instance.role == 'ADMIN')
+    user.is_superuser = (instance.role == 'ADMIN')
+    if instance.password and not user.check_password(instance.password):
+        user.set_password(instance.password)
+    user.save()
     
-    try:
-        if created:
-            # Create unique username from employee_id
-            username = instance.employee_id
-            
-            # If username already exists, use email prefix with employee_id
-            if User.objects.filter(username=username).exists():
-                username = f"{instance.email.split('@')[0]}_{instance.employee_id}"
-            
-            # Create new Django User with password (use default if no password set)
-            password = instance.password if instance.password else 'changeme123'
-            
-            user = User.objects.create_user(
-                username=username,
-                email=instance.email,
-                first_name=instance.first_name,
-                last_name=instance.last_name,
-                password=password,
-                is_staff=(instance.role == 'ADMIN'),
-                is_superuser=(instance.role == 'ADMIN')
-            )
-            
-            # Add user to "Staff" group
-            staff_group, _ = Group.objects.get_or_create(name='Staff')
-            user.groups.add(staff_group)
-            print(f"Added {user.username} to Staff group")
-        else:
-            # Update existing user
-            try:
-                user = User.objects.get(email=instance.email)
-                user.first_name = instance.first_name
-                user.last_name = instance.last_name
-                user.is_staff = (instance.role == 'ADMIN')
-                user.is_superuser = (instance.role == 'ADMIN')
-                if instance.password and not user.check_password(instance.password):
-                    user.set_password(instance.password)
-                user.save()
-                
-                # Ensure user is in "Staff" group
-                staff_group, _ = Group.objects.get_or_create(name='Staff')
-                if staff_group not in user.groups.all():
-                    user.groups.add(staff_group)
-                    print(f"Added {user.username} to Staff group on update")
-            except User.DoesNotExist:
-                # User doesn't exist, create one
-                username = instance.employee_id
-                if User.objects.filter(username=username).exists():
-                    username = f"{instance.email.split('@')[0]}_{instance.employee_id}"
-                
-                password = instance.password if instance.password else 'changeme123'
-                
-                user = User.objects.create_user(
-                    username=username,
-                    email=instance.email,
-                    first_name=instance.first_name,
-                    last_name=instance.last_name,
-                    password=password,
-                    is_staff=(instance.role == 'ADMIN'),
-                    is_superuser=(instance.role == 'ADMIN')
-                )
-                
-                staff_group, _ = Group.objects.get_or_create(name='Staff')
-                user.groups.add(staff_group)
-                print(f"Created user {user.username} and added to Staff group")
-    finally:
-        delattr(instance, '_signal_processing')
+    # Ensure user is in "Staff" group
+    staff_group, _ = Group.objects.get_or_create(name='Staff')
+    if not user.groups.filter(pk=staff_group.pk).exists():
+        user.groups.add(staff_group)
+        print(f"Added {user.username} to Staff group on update")
+    return user
+
+# When Staff is saved, audit the save and sync its Django User in the background worker
+@receiver(post_save, sender=Staff)
+def create_user_for_staff(sender, instance, created, update_fields=None, **kwargs):
+    from inventory.audit import record
+    from inventory.jobs import enqueue
+    # The admin says who made the change and which fields it touched; shell and scripts leave no actor
+    fields = getattr(instance, '_audit_fields', None)
+    if fields is None:
+        fields = sorted(name for name in update_fields or () if name != 'password')
+    record(getattr(instance, '_audit_actor', None), 'STAFF_SAVE', obj=instance, created=created, role=instance.role, fields=fields)
+    enqueue('accounts.sync_staff_user', {'staff_id': instance.pk}, dedupe_key=f'staff:{instance.pk}')
@@ -0,0 +1,11 @@
+"""Background job handlers for the accounts app (see inventory/jobs.py)"""
+from inventory.jobs import task
+from .models import Staff, sync_staff_user
+
+
+@task('accounts.sync_staff_user')
+def sync_staff_user_job(payload):
+    """Create or update the User account for a saved Staff record"""
+    staff = Staff.objects.filter(pk=payload['staff_id']).first()
+    if staff is not None:
+        sync_staff_user(staff)
@@ -1,3 +1,83 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from inventory import audit, jobs
+from inventory.models import AuditLog, Job
+
+from .models import Staff
+
+
+def make_staff(index=1, **fields):
+    defaults = {
+        'first_name': 'Ada',
+        'last_name': f'Lovelace{index}',
+        'email': f'staff{index}@example.com',
+        'employee_id': f'EMP{index:04d}',
+        'password': 'Passw0rd123',
+    }
+    defaults.update(fields)
+    return Staff.objects.create(**defaults)
+
+
+@override_settings(JOBS_RUN_EAGERLY=False)
+class StaffSignalTests(TestCase):
+    def setUp(self):
+        audit._buffer.clear()
+
+    def run_queue(self):
+        return jobs.run_jobs(jobs.claim('test-worker'))
+
+    def test_saving_staff_only_queues_a_job(self):
+        # INSERT staff, dedupe check, INSERT job - no user work in the request
+        with self.assertNumQueries(3):
+            make_staff()
+        self.assertEqual(Job.objects.filter(kind='accounts.sync_staff_user').count(), 1)
+        self.assertFalse(User.objects.exists())
+
+    def test_repeated_saves_are_deduplicated(self):
+        staff = make_staff()
+        for _ in range(5):
+            staff.save()
+        self.assertEqual(Job.objects.filter(status='QUEUED').count(), 1)
+
+    def test_job_creates_user_in_staff_group(self):
+        make_staff(role='ADMIN')
+        self.assertEqual(self.run_queue()['done'], 1)
+
+        user = User.objects.get(email='staff1@example.com')
+        self.assertEqual(user.username, 'EMP0001')
+        self.assertTrue(user.is_superuser)
+        self.assertTrue(user.groups.filter(name='Staff').exists())
+        self.assertTrue(user.check_password('Passw0rd123'))
+
+    def test_sync_cost_does_not_grow_with_staff_count(self):
+        for index in range(20):
+            make_staff(index)
+        self.run_queue()
+
+        staff = Staff.objects.get(employee_id='EMP0003')
+        staff.first_name = 'Grace'
+        staff.save()
+        claimed = jobs.claim('test-worker')
+        # Load staff, load user, save user, group lookup, membership check, mark job done
+        with self.assertNumQueries(6):
+            jobs.run_jobs(claimed)
+        self.assertEqual(User.objects.get(email='staff3@example.com').first_name, 'Grace')
+        self.assertEqual(User.objects.count(), 20)
+
+    @override_settings(JOBS_RUN_EAGERLY=True)
+    def test_eager_mode_syncs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_staff()
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(User.objects.filter(email='staff1@example.com').exists())
+
+    def test_saves_outside_the_admin_are_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            staff = make_staff()
+            staff.role = 'ADMIN'
+            staff.save(update_fields=['role'])
+        audit.flush()
+        entries = AuditLog.objects.filter(action='STAFF_SAVE', object_id=str(staff.pk)).order_by('pk')
+        self.assertEqual([(entry.actor_id, entry.details['created'], entry.details['fields']) for entry in entries],
+                         [(None, True, []), (None, False, ['role'])])
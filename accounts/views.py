@@ -4,6 +4,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout, authenticate, login
 from inventory.models import BorrowRecord
+from inventory.archive import count_both, merged
 
 def login_view(request):
     """Custom login view that handles admin and user redirection"""
@@ -57,18 +58,16 @@ def profile_view(request):
         is_returned=False
     ).order_by('-borrow_date')
     
-    returned_borrowings = BorrowRecord.objects.filter(
-        user=user,
-        is_returned=True
-    ).order_by('-return_date')
+    # Returned history may already live in the archive table
+    returned_borrowings = merged({'user': user, 'is_returned': True}, '-return_date', select_related=('asset__category',))
     
     context = {
         'pending_requests': pending_requests,
         'active_borrowings': active_borrowings,
         'returned_borrowings': returned_borrowings,
-        'total_borrowed': BorrowRecord.objects.filter(user=user).count(),
+        'total_borrowed': count_both(user=user),
         'active_count': active_borrowings.count(),
-        'returned_count': returned_borrowings.count(),
+        'returned_count': len(returned_borrowings),
     }
     
     return render(request, 'accounts/profile.html', context)
@@ -97,17 +96,14 @@ def profile(request):
         is_returned=False
     ).select_related('asset').order_by('-borrow_date')
     
-    # Returned borrowings - APPROVED and returned
-    returned_borrowings = BorrowRecord.objects.filter(
-        user=user,
-        status='APPROVED',
-        is_returned=True
-    ).select_related('asset').order_by('-return_date')
+    # Returned borrowings - APPROVED and returned, possibly already archived
+    returned_borrowings = merged({'user': user, 'status': 'APPROVED', 'is_returned': True}, '-return_date',
+                                 select_related=('asset',))
     
     # Statistics
-    total_borrowed = BorrowRecord.objects.filter(user=user, status='APPROVED').count()
+    total_borrowed = count_both(user=user, status='APPROVED')
     active_count = active_borrowings.count()
-    returned_count = returned_borrowings.count()
+    returned_count = len(returned_borrowings)
     
     context = {
         'user': user,
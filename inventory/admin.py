@@ -1,16 +1,145 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
-from .models import Category, Asset, BorrowRecord
+from .models import ApprovalRule, AuditLog, Category, Asset, BorrowRecord, Location, StockLevel, WaitlistEntry
+from .audit import record
+from .jobs import enqueue
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'asset_count']
+    # Prefix search served by the NOCASE name index (also behind the asset form's autocomplete)
+    search_fields = ['name__istartswith']
+    ordering = ['name']
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(asset_count=Count('asset'))
+    
+    @admin.display(description='Assets', ordering='asset_count')
+    def asset_count(self, obj):
+        return obj.asset_count
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code', 'is_default']
+    search_fields = ['name', 'code__exact']
+    ordering = ['name']
+
+class StockLevelInline(admin.TabularInline):
+    model = StockLevel
+    # Counters are maintained by the workflows; on-hand must keep adding up to total_quantity,
+    # so units move between storerooms with `manage.py transfer_stock`
+    fields = ['location', 'on_hand', 'borrowed', 'pending', 'damaged']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Asset)
 class AssetAdmin(admin.ModelAdmin):
-    list_display = ['name', 'image_preview']
+    list_display = ['name', 'serial_number', 'category', 'status', 'total_quantity',
+                    'available_stock', 'borrowed_stock', 'pending_stock', 'image_preview', 'created_at']
+    list_select_related = ['category']
+    list_filter = ['status', 'category']
+    # Names match anywhere; serials are scanned or copied, so they must match exactly
+    search_fields = ['name', 'serial_number__exact', 'category__name']
+    autocomplete_fields = ['category']
+    readonly_fields = ['serial_number', 'stock_version', 'updated_at']
+    inlines = [StockLevelInline]
+    date_hierarchy = 'created_at'
+    ordering = ['-created_at']
+    list_per_page = 50
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # Stock columns come from one annotated query instead of three aggregates per row
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.with_stock()
+        return queryset
+    
+    @admin.display(description='Available', ordering='available_qty')
+    def available_stock(self, obj):
+        return obj.available_qty
+    
+    @admin.display(description='Borrowed', ordering='borrowed_qty')
+    def borrowed_stock(self, obj):
+        return obj.borrowed_qty
+    
+    @admin.display(description='Pending', ordering='pending_qty')
+    def pending_stock(self, obj):
+        return obj.pending_qty
     
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="50" height="50" />', obj.image.url)
+            return format_html(
+                '<img src="{}" width="40" height="40" loading="lazy" decoding="async" style="object-fit: cover;" />',
+                obj.image.url
+            )
         return "No image"
     image_preview.short_description = 'Preview'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        record(request.user, 'ASSET_EDIT' if change else 'ASSET_CREATE', obj.pk, obj, fields=form.changed_data)
+        # Resize/normalize the uploaded photo outside the request
+        if 'image' in form.changed_data and obj.image:
+            enqueue('inventory.process_asset_image', {'asset_id': obj.pk}, dedupe_key=f'asset:{obj.pk}')
+
+@admin.register(ApprovalRule)
+class ApprovalRuleAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'category', 'max_quantity', 'max_open_per_user', 'min_headroom', 'is_active']
+    list_select_related = ['category']
+    list_editable = ['max_quantity', 'max_open_per_user', 'min_headroom', 'is_active']
+    list_filter = ['is_active']
+    autocomplete_fields = ['category']
 
-admin.site.register(Category)
-admin.site.register(BorrowRecord)
\ No newline at end of file
+@admin.register(BorrowRecord)
+class BorrowRecordAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'asset', 'location', 'quantity', 'status', 'is_returned',
+                    'borrow_date', 'approved_date', 'return_date', 'approved_by']
+    list_select_related = ['user', 'asset', 'location', 'approved_by']
+    list_filter = ['status', 'is_returned', 'location']
+    search_fields = ['user__username__exact', 'asset__serial_number__exact', 'asset__name']
+    # Never render <select> widgets with every User/Asset in them
+    raw_id_fields = ['user', 'approved_by']
+    autocomplete_fields = ['asset']
+    date_hierarchy = 'borrow_date'
+    ordering = ['-borrow_date', '-id']
+    list_per_page = 50
+    show_full_result_count = False
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'asset', 'quantity', 'priority', 'status', 'created_at', 'allocated_at']
+    list_select_related = ['user', 'asset']
+    list_filter = ['status']
+    # Raise the priority to move someone up the queue
+    list_editable = ['priority']
+    search_fields = ['user__username__exact', 'asset__serial_number__exact', 'asset__name']
+    raw_id_fields = ['user', 'borrow_record']
+    autocomplete_fields = ['asset']
+    ordering = ['asset', '-priority', 'created_at']
+    list_per_page = 50
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'actor_name', 'action', 'asset', 'object_type', 'object_id']
+    list_select_related = ['asset']
+    list_filter = ['action']
+    search_fields = ['actor_name__exact', 'asset__serial_number__exact']
+    raw_id_fields = ['actor', 'asset']
+    date_hierarchy = 'created_at'
+    ordering = ['-created_at', '-id']
+    list_per_page = 50
+    show_full_result_count = False
+    
+    # The log is written by inventory/audit.py only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
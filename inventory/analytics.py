@@ -0,0 +1,180 @@
+"""
+Utilization and demand analytics over the borrow history.
+
+Borrow intervals from the hot and archived tables are loaded with
+``values_list`` straight into NumPy arrays - no model instances - and every
+figure is computed for all assets at once with array operations:
+
+* utilization: borrowed unit-days / (total_quantity x days in the window),
+  per asset and per category (``bincount`` over asset/category indexes);
+* peak concurrent usage: +quantity/-quantity events sorted by (asset, day),
+  a running sum restarted at each asset and ``maximum.reduceat`` per asset;
+* idle inventory: units that were never out at the same time
+  (total_quantity - peak), i.e. how far total_quantity could shrink;
+* weekly demand: units requested per week (any outcome), per category.
+
+A borrowing holds its units from approval (or the request, if not recorded)
+through the return date; open borrowings run to today. Results are plain
+Python data cached per catalog version and day, so they are only recomputed
+after stock records change.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import Q
+from django.utils import timezone
+
+from rezo.replicas import REPLICA, replica_synced_at
+
+from .models import ArchivedBorrowRecord, Asset, BorrowRecord
+from .versioning import CATALOG, get_cached_version
+
+
+def _columns(rows, width):
+    return list(zip(*rows)) if rows else [()] * width
+
+
+def _intervals(first_day):
+    """(asset_id, approved_date, borrow_date, return_date, quantity) rows of borrowings overlapping the window"""
+    rows = []
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        rows.extend(
+            model.objects.filter(status='APPROVED').filter(Q(is_returned=False) | Q(return_date__gte=first_day))
+            .values_list('asset_id', 'approved_date', 'borrow_date', 'return_date', 'quantity').iterator()
+        )
+    return rows
+
+
+def _requests(first_day):
+    """(asset_id, borrow_date, quantity) rows of every request made in the window"""
+    rows = []
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        rows.extend(model.objects.filter(borrow_date__gte=first_day).values_list('asset_id', 'borrow_date', 'quantity').iterator())
+    return rows
+
+
+def _peaks(asset_index, start, end, quantity, size):
+    """Largest number of units out at the same time, per asset"""
+    import numpy as np
+
+    peaks = np.zeros(size, dtype=np.int64)
+    if not len(asset_index):
+        return peaks
+    assets = np.concatenate([asset_index, asset_index])
+    days = np.concatenate([start, end])
+    delta = np.concatenate([quantity, -quantity])
+    # Returns sort before checkouts on the same day: intervals are half-open
+    order = np.lexsort((delta, days, assets))
+    assets, delta = assets[order], delta[order]
+
+    running = np.cumsum(delta)
+    group_starts = np.flatnonzero(np.r_[True, assets[1:] != assets[:-1]])
+    before = running[group_starts] - delta[group_starts]
+    running -= np.repeat(before, np.diff(np.r_[group_starts, len(running)]))
+    peaks[assets[group_starts]] = np.maximum.reduceat(running, group_starts)
+    return peaks
+
+
+def compute(days=90, today=None):
+    """Utilization, peaks, idle units and weekly demand over the last `days` days"""
+    import numpy as np
+
+    today = today or timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    window_start = np.datetime64(first_day, 'D')
+    window_end = np.datetime64(today, 'D') + 1
+    weeks = -(-days // 7)
+
+    asset_rows = list(Asset.objects.order_by('pk').values_list(
+        'pk', 'name', 'serial_number', 'category_id', 'category__name', 'total_quantity'
+    ))
+    ids, names, serials, category_ids, category_names, totals = _columns(asset_rows, 6)
+    ids = np.array(ids, dtype=np.int64)
+    totals = np.array(totals, dtype=np.int64)
+    categories, category_index = np.unique(np.array(category_ids, dtype=np.int64), return_inverse=True)
+    category_name = dict(zip(category_ids, category_names))
+
+    # Borrowed intervals clipped to the window, as day offsets
+    asset_id, approved, requested, returned, quantity = _columns(_intervals(first_day), 5)
+    asset_id = np.array(asset_id, dtype=np.int64)
+    approved = np.array(approved, dtype='datetime64[D]')
+    requested = np.array(requested, dtype='datetime64[D]')
+    returned = np.array(returned, dtype='datetime64[D]')
+    quantity = np.array(quantity, dtype=np.int64)
+    start = np.maximum(np.where(np.isnat(approved), requested, approved), window_start)
+    end = np.minimum(np.where(np.isnat(returned), window_end, returned + 1), window_end)
+    keep = np.isin(asset_id, ids) & (end > start)
+    asset_index = np.searchsorted(ids, asset_id[keep])
+    start = (start[keep] - window_start).astype(np.int64)
+    end = (end[keep] - window_start).astype(np.int64)
+    quantity = quantity[keep]
+
+    unit_days = np.bincount(asset_index, weights=(end - start) * quantity, minlength=len(ids))
+    capacity = totals * days
+    utilization = np.divide(unit_days * 100, capacity, out=np.zeros(len(ids)), where=capacity > 0)
+    peaks = _peaks(asset_index, start, end, quantity, len(ids))
+    idle = np.maximum(totals - peaks, 0)
+
+    category_unit_days = np.bincount(category_index, weights=unit_days, minlength=len(categories))
+    category_capacity = np.bincount(category_index, weights=capacity, minlength=len(categories))
+    category_utilization = np.divide(category_unit_days * 100, category_capacity,
+                                     out=np.zeros(len(categories)), where=category_capacity > 0)
+    category_units = np.bincount(category_index, weights=totals, minlength=len(categories))
+    category_idle = np.bincount(category_index, weights=idle, minlength=len(categories))
+
+    # Weekly demand per category, as a categories x weeks matrix
+    request_asset, request_date, request_quantity = _columns(_requests(first_day), 3)
+    request_asset = np.array(request_asset, dtype=np.int64)
+    known = np.isin(request_asset, ids)
+    week = ((np.array(request_date, dtype='datetime64[D]')[known] - window_start).astype(np.int64) // 7)
+    row = category_index[np.searchsorted(ids, request_asset[known])]
+    demand = np.bincount(row * weeks + week, weights=np.array(request_quantity, dtype=np.int64)[known],
+                         minlength=len(categories) * weeks).reshape(len(categories), weeks)
+
+    assets = [
+        {
+            'id': int(ids[i]), 'name': names[i], 'serial_number': serials[i], 'category': category_names[i],
+            'total_quantity': int(totals[i]), 'utilization': round(float(utilization[i]), 1),
+            'peak': int(peaks[i]), 'idle': int(idle[i]),
+        }
+        for i in np.argsort(-utilization, kind='stable')
+    ]
+    week_starts = [first_day + timedelta(weeks=index) for index in range(weeks)]
+    return {
+        'days': days,
+        'first_day': first_day,
+        'last_day': today,
+        'assets': assets,
+        'categories': [
+            {
+                'id': int(category_id), 'name': category_name[category_id],
+                'utilization': round(float(category_utilization[i]), 1),
+                'total_quantity': int(category_units[i]), 'idle': int(category_idle[i]),
+                'weekly_demand': [int(units) for units in demand[i]],
+            }
+            for i, category_id in enumerate(categories.tolist())
+        ],
+        'weekly_demand': [
+            {'week': week_start, 'units': int(units)} for week_start, units in zip(week_starts, demand.sum(axis=0))
+        ],
+        'utilization': round(float(unit_days.sum() * 100 / capacity.sum()), 1) if capacity.sum() else 0.0,
+        'idle': int(idle.sum()),
+        'total_quantity': int(totals.sum()),
+    }
+
+
+def cached(days=90):
+    """compute() for today, cached until the catalog version moves (or a newer replica copy is read)"""
+    version, _ = get_cached_version(CATALOG)
+    today = timezone.localdate()
+    # Figures read from a replica copy are only as new as that copy, so they are keyed by it
+    alias = router.db_for_read(Asset) or DEFAULT_DB_ALIAS
+    source = f'{alias}@{replica_synced_at()}' if alias == REPLICA else alias
+    key = f'analytics:{version}:{source}:{days}:{today.isoformat()}'
+    result = cache.get(key)
+    if result is None:
+        result = compute(days, today)
+        cache.set(key, result, getattr(settings, 'ANALYTICS_CACHE_SECONDS', 600))
+    return result
@@ -0,0 +1,245 @@
+"""
+Read-only JSON API for the catalog.
+
+Every endpoint is wrapped in Django's ``condition`` decorator with validators
+taken from version stamps (see inventory/versioning.py), so a client that
+revalidates an unchanged resource gets a 304 after a single indexed lookup and
+the catalog query itself never runs. The exception is autocomplete, which is
+answered from an in-memory index (inventory/autocomplete.py) and may simply be
+cached briefly.
+
+Common query parameters:
+    fields=id,name,...   only return these fields
+    format=compact       {"fields": [...], "rows": [[...], ...]} instead of objects
+"""
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import condition, require_GET
+
+from .autocomplete import suggest
+from .availability import category_calendar, free_units
+from .models import Asset, Category
+from .versioning import CATALOG, get_version
+from .views import parse_moment
+
+# API field name -> queryset lookup
+ASSET_FIELDS = {
+    'id': 'pk',
+    'name': 'name',
+    'serial_number': 'serial_number',
+    'category_id': 'category_id',
+    'category': 'category__name',
+    'status': 'status',
+    'total_quantity': 'total_quantity',
+    'available': 'available_qty',
+    'image': 'image',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+LIST_PARAMS = ('search', 'category', 'status', 'page', 'page_size', 'fields', 'format')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _catalog_stamp(request):
+    # condition() calls the ETag and Last-Modified functions separately; look the stamp up once
+    if not hasattr(request, '_catalog_stamp'):
+        request._catalog_stamp = get_version(CATALOG)
+    return request._catalog_stamp
+
+
+def _asset_stamp(request, pk):
+    if not hasattr(request, '_asset_stamp'):
+        request._asset_stamp = Asset.objects.filter(pk=pk).values_list('stock_version', 'updated_at').first()
+    return request._asset_stamp
+
+
+def _params_key(request, names):
+    """Short digest of the query parameters that shape the representation"""
+    raw = '&'.join(f'{name}={request.GET.get(name, "")}' for name in names)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def _catalog_etag(*names):
+    def etag(request, *args, **kwargs):
+        version, _ = _catalog_stamp(request)
+        return f'c{version}-{_params_key(request, names)}'
+    return etag
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return _catalog_stamp(request)[1]
+
+
+def _asset_etag(*names):
+    def etag(request, pk, *args, **kwargs):
+        stamp = _asset_stamp(request, pk)
+        if stamp is None:
+            return None
+        version, updated_at = stamp
+        return f'a{pk}-{version}-{int(updated_at.timestamp() * 1000000)}-{_params_key(request, names)}'
+    return etag
+
+
+def _asset_last_modified(request, pk, *args, **kwargs):
+    stamp = _asset_stamp(request, pk)
+    return stamp[1] if stamp else None
+
+
+def _json(data):
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    # Clients may keep the response but must revalidate it (cheaply) before reuse
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _selected_fields(request):
+    requested = [name for name in request.GET.get('fields', '').split(',') if name in ASSET_FIELDS]
+    return requested or list(ASSET_FIELDS)
+
+
+def _asset_rows(queryset, fields):
+    """Fetch only the requested columns (and stock aggregates only if asked for)"""
+    if 'available' in fields:
+        queryset = queryset.with_stock()
+    image_url = Asset._meta.get_field('image').storage.url
+    rows = []
+    for values in queryset.values(*[ASSET_FIELDS[name] for name in fields]):
+        row = {name: values[ASSET_FIELDS[name]] for name in fields}
+        if 'image' in row:
+            row['image'] = image_url(row['image']) if row['image'] else None
+        rows.append(row)
+    return rows
+
+
+def _encode(request, rows, fields, **extra):
+    if request.GET.get('format') == 'compact':
+        return {**extra, 'fields': fields, 'rows': [[row[name] for name in fields] for row in rows]}
+    return {**extra, 'results': rows}
+
+
+@require_GET
+@condition(etag_func=_catalog_etag(*LIST_PARAMS), last_modified_func=_catalog_last_modified)
+def asset_list(request):
+    """Paginated asset list (?search=&category=&status=&page=&page_size=)"""
+    assets = Asset.objects.exclude(status='DISPOSED').order_by('-created_at', '-pk')
+
+    search = request.GET.get('search', '').strip()
+    if search:
+        assets = assets.filter(
+            Q(name__icontains=search) |
+            Q(serial_number__icontains=search) |
+            Q(category__name__icontains=search)
+        )
+    category = request.GET.get('category', '')
+    if category.isascii() and category.isdigit():
+        assets = assets.filter(category_id=int(category))
+    if request.GET.get('status'):
+        assets = assets.filter(status=request.GET['status'].upper())
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page, page_size = 1, DEFAULT_PAGE_SIZE
+
+    # Fetch one extra row instead of running a COUNT(*) to know whether there is a next page
+    fields = _selected_fields(request)
+    offset = (page - 1) * page_size
+    rows = _asset_rows(assets[offset:offset + page_size + 1], fields)
+    has_next = len(rows) > page_size
+    return _json(_encode(request, rows[:page_size], fields, page=page, has_next=has_next))
+
+
+@require_GET
+@condition(etag_func=_asset_etag('fields', 'format'), last_modified_func=_asset_last_modified)
+def asset_detail(request, pk):
+    fields = _selected_fields(request)
+    rows = _asset_rows(Asset.objects.filter(pk=pk), fields)
+    if not rows:
+        return JsonResponse({'error': 'not found'}, status=404)
+    if request.GET.get('format') == 'compact':
+        return _json({'fields': fields, 'row': [rows[0][name] for name in fields]})
+    return _json(rows[0])
+
+
+@require_GET
+@condition(etag_func=_catalog_etag('format'), last_modified_func=_catalog_last_modified)
+def category_list(request):
+    fields = ['id', 'name', 'asset_count']
+    rows = list(
+        Category.objects.order_by('name').annotate(
+            asset_count=Count('asset', filter=~Q(asset__status='DISPOSED'))
+        ).values(*fields)
+    )
+    return _json(_encode(request, rows, fields))
+
+
+def _availability_etag(request, pk):
+    etag = _asset_etag('start', 'end')(request, pk)
+    if etag and not request.GET.get('start'):
+        # "Now" moves even when nothing is written; keep the validator for one minute at most
+        etag += timezone.now().strftime('-%Y%m%d%H%M')
+    return etag
+
+
+@require_GET
+@condition(etag_func=_availability_etag, last_modified_func=None)
+def asset_availability(request, pk):
+    """Free units of one asset for ?start=&end= (ISO dates or datetimes)"""
+    asset = get_object_or_404(Asset, pk=pk)
+    starts_at = parse_moment(request.GET.get('start')) or timezone.now()
+    ends_at = parse_moment(request.GET.get('end'), end_of_day=True) or starts_at + timedelta(days=1)
+    if ends_at <= starts_at:
+        return JsonResponse({'error': 'end must be after start'}, status=400)
+
+    return _json({
+        'asset': asset.pk,
+        'start': starts_at.isoformat(),
+        'end': ends_at.isoformat(),
+        'free': free_units(asset, starts_at, ends_at),
+    })
+
+
+def _calendar_etag(request, category_id):
+    etag = _catalog_etag('start', 'days')(request)
+    return f'{etag}-{timezone.localdate():%Y%m%d}'
+
+
+@require_GET
+@condition(etag_func=_calendar_etag, last_modified_func=None)
+def category_availability_calendar(request, category_id):
+    """Daily free units for every asset in a category (?start=YYYY-MM-DD&days=30)"""
+    category = get_object_or_404(Category, pk=category_id)
+    try:
+        first_day = parse_date(request.GET.get('start', '')) or timezone.localdate()
+    except ValueError:
+        # Well-formed but impossible, e.g. 2024-02-30
+        return JsonResponse({'error': 'start must be a valid date'}, status=400)
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 90)
+    except ValueError:
+        days = 30
+
+    calendar = category_calendar(category.pk, first_day, days)
+    return _json({'category': {'id': category.pk, 'name': category.name}, **calendar})
+
+
+@require_GET
+def autocomplete(request):
+    """Type-ahead suggestions for the search box, served from memory without database queries"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 20))
+    except ValueError:
+        limit = 10
+    query = request.GET.get('q', '')
+    response = JsonResponse({'query': query, 'results': suggest(query, limit)}, json_dumps_params={'separators': (',', ':')})
+    patch_cache_control(response, max_age=30)
+    return response
@@ -0,0 +1,110 @@
+"""
+Automatic approval of borrow requests.
+
+Staff define ``ApprovalRule`` rows in the admin: per category (plus one rule
+for every category without its own) the largest quantity per request, the
+number of open borrowings a user may hold and the stock headroom that must
+remain. Pending requests are evaluated in batches - by a job queued from
+``borrow_asset`` and by ``manage.py auto_approve`` - and the ones within the
+limits are approved; everything else stays PENDING for staff.
+
+The active rules are compiled into a dict keyed by category and kept per
+process until the ``approval_rules`` version stamp moves. A batch costs a
+fixed number of queries (the pending records, their assets with stock
+annotations, one grouped count of open borrowings per user); the per-user
+counts are then kept current in memory, so each request is checked in O(1).
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from . import audit, services
+from .jobs import enqueue
+from .models import ApprovalRule, Asset, BorrowRecord
+from .reconcile import reconcile_assets
+from .versioning import deferred_bumps, get_cached_version
+
+RULES = 'approval_rules'
+
+_compiled = (None, {})
+
+
+def compiled_rules():
+    """{category_id or None: (max_quantity, max_open_per_user, min_headroom)} for the active rules"""
+    global _compiled
+    stamp = get_cached_version(RULES)
+    if _compiled[0] != stamp:
+        rules = {}
+        for rule in ApprovalRule.objects.filter(is_active=True).order_by('pk'):
+            rules.setdefault(rule.category_id, (rule.max_quantity, rule.max_open_per_user, rule.min_headroom))
+        _compiled = (stamp, rules)
+    return _compiled[1]
+
+
+def _exception(record, available, rule, open_count):
+    """Why a request needs staff review, or '' if the rule approves it"""
+    if rule is None:
+        return 'No auto-approval rule for this category'
+    max_quantity, max_open, min_headroom = rule
+    if record.quantity > max_quantity:
+        return f'More than {max_quantity} unit(s) requested'
+    if open_count >= max_open:
+        return f'Borrower already has {open_count} open borrowing(s)'
+    if available < min_headroom:
+        return f'Fewer than {min_headroom} unit(s) would stay available'
+    return ''
+
+
+def evaluate(records, rules=None):
+    """[(record, reason)] in order; reason is '' for requests the rules approve
+
+    Requests approved earlier in the list count towards the borrower's open
+    borrowings. Approval moves units from pending to borrowed, so the
+    headroom of an asset does not change within a batch.
+    """
+    if not records:
+        return []
+    rules = compiled_rules() if rules is None else rules
+    assets = {
+        pk: (category_id, available)
+        for pk, category_id, available in Asset.objects.with_stock()
+        .filter(pk__in={record.asset_id for record in records}).values_list('pk', 'category_id', 'available_qty')
+    }
+    open_counts = dict(
+        BorrowRecord.objects.filter(
+            user_id__in={record.user_id for record in records}, status='APPROVED', is_returned=False
+        ).order_by().values_list('user_id').annotate(count=Count('pk'))
+    )
+
+    results = []
+    for record in records:
+        category_id, available = assets[record.asset_id]
+        rule = rules.get(category_id, rules.get(None))
+        reason = _exception(record, available, rule, open_counts.get(record.user_id, 0))
+        if not reason:
+            open_counts[record.user_id] = open_counts.get(record.user_id, 0) + 1
+        results.append((record, reason))
+    return results
+
+
+def auto_approve(record_ids=None):
+    """Approve the pending requests (all, or the given ones) within the rules; returns the approved records"""
+    rules = compiled_rules()
+    if not rules:
+        return []
+    with transaction.atomic():
+        pending = BorrowRecord.objects.select_for_update().filter(status='PENDING').order_by('borrow_date', 'pk')
+        if record_ids is not None:
+            pending = pending.filter(pk__in=record_ids)
+        approved = [record for record, reason in evaluate(list(pending), rules) if not reason]
+        with deferred_bumps():
+            for record in approved:
+                services.approve(record, None)
+                audit.record(None, 'AUTO_APPROVE', record.asset_id, record, borrower_id=record.user_id, quantity=record.quantity)
+        reconcile_assets({record.asset_id for record in approved})
+    return approved
+
+
+def queue_evaluation(record):
+    """Have the worker apply the rules to a new request (nothing to do while no rule is active)"""
+    if compiled_rules():
+        enqueue('inventory.auto_approve', {'record_id': record.pk})
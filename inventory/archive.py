@@ -0,0 +1,87 @@
+"""
+Hot/cold split for BorrowRecord.
+
+Closed records (returned or rejected) are moved in batches into
+ArchivedBorrowRecord, keeping their ids, so the BorrowRecord table only holds
+recent history plus the PENDING/APPROVED rows that every stock aggregate
+filters. Reporting code reads both tables through the helpers below.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedBorrowRecord, BorrowRecord
+from .versioning import deferred_bumps
+
+ARCHIVED_FIELDS = [
+    'id', 'user_id', 'asset_id', 'location_id', 'quantity', 'status', 'borrow_date', 'approved_date',
+    'return_date', 'is_returned', 'approved_by_id', 'rejection_reason',
+]
+CLOSED = Q(status='REJECTED') | Q(status='APPROVED', is_returned=True)
+
+
+def archivable(older_than_days):
+    """Closed records whose last activity is older than the cutoff"""
+    cutoff = timezone.now().date() - timedelta(days=older_than_days)
+    return BorrowRecord.objects.filter(CLOSED).filter(
+        Q(return_date__lt=cutoff) | Q(status='REJECTED', borrow_date__lt=cutoff)
+    ).exclude(
+        # Damage reports keep pointing at their borrow record
+        damaged_items__isnull=False
+    )
+
+
+def archive_batch(older_than_days, batch_size=500):
+    """Move one batch of closed records to the archive; returns the number moved"""
+    with transaction.atomic(), deferred_bumps():
+        ids = list(archivable(older_than_days).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        rows = BorrowRecord.objects.filter(pk__in=ids).values(*ARCHIVED_FIELDS)
+        ArchivedBorrowRecord.objects.bulk_create(
+            [ArchivedBorrowRecord(**row) for row in rows], ignore_conflicts=True
+        )
+        BorrowRecord.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def count_both(**filters):
+    """COUNT(*) over the hot and archived tables"""
+    return BorrowRecord.objects.filter(**filters).count() + ArchivedBorrowRecord.objects.filter(**filters).count()
+
+
+def borrow_count_subquery(**filters):
+    """Correlated count of hot + archived borrow records for the outer Asset row"""
+    def counted(model):
+        return Coalesce(Subquery(
+            model.objects.filter(asset=OuterRef('pk'), **filters).order_by().values('asset').annotate(
+                total=Count('pk')
+            ).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+    return counted(BorrowRecord) + counted(ArchivedBorrowRecord)
+
+
+def merged(filters, order_by, limit=None, select_related=('user', 'asset')):
+    """Records from both tables matching `filters`, ordered by one field (prefix '-' for descending)"""
+    field = order_by.lstrip('-')
+    reverse = order_by.startswith('-')
+    querysets = [
+        model.objects.filter(**filters).select_related(*select_related).order_by(order_by, '-pk' if reverse else 'pk')
+        for model in (BorrowRecord, ArchivedBorrowRecord)
+    ]
+    if limit is not None:
+        querysets = [queryset[:limit] for queryset in querysets]
+
+    def sort_key(record):
+        # Dates may be NULL (e.g. rejected records have no return_date)
+        value = getattr(record, field)
+        return (value is not None, value)
+
+    records = heapq.merge(*[list(queryset) for queryset in querysets], key=sort_key, reverse=reverse)
+    records = list(records)
+    return records[:limit] if limit is not None else records
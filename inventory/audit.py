@@ -0,0 +1,133 @@
+"""
+Audit trail of staff actions.
+
+``record()`` never writes to the database in the request. Inside a
+transaction the entry waits for the commit (a rolled-back action leaves no
+trace) and then joins a per-process buffer. The buffer is written with one
+``bulk_create`` by a background timer AUDIT_FLUSH_SECONDS after its first
+entry, straight away once it holds AUDIT_BATCH_SIZE entries, and when the
+process exits. Entries keep the time of the action, not of the flush; a
+process that is killed outright loses at most the entries of the last timer
+period.
+
+AuditLog is indexed by (actor, time), (asset, time) and time, so
+``entries()`` filtered by actor, asset and/or a time range is a range scan.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import Asset, AuditLog
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_buffer = []
+_timer = None
+
+
+def record(actor, action, asset_id=None, obj=None, **details):
+    """Log an action by `actor` (None for automatic ones) once the current transaction commits"""
+    entry = AuditLog(
+        actor_id=getattr(actor, 'pk', None),
+        actor_name=getattr(actor, 'username', '') or '',
+        action=action,
+        asset_id=asset_id,
+        object_type=obj._meta.model_name if obj is not None else '',
+        object_id=str(obj.pk) if obj is not None else '',
+        details=details,
+        created_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: _add(entry))
+
+
+def _add(entry):
+    with _lock:
+        _buffer.append(entry)
+        full = len(_buffer) >= getattr(settings, 'AUDIT_BATCH_SIZE', 200)
+    if full:
+        _schedule(0)
+    elif getattr(settings, 'AUDIT_FLUSH_SECONDS', 5):
+        _schedule(settings.AUDIT_FLUSH_SECONDS)
+
+
+def _schedule(delay):
+    """Start the flush timer unless one is already due sooner"""
+    global _timer
+    with _lock:
+        if _timer is not None and (delay or not _timer.is_alive()):
+            return
+        if _timer is not None:
+            _timer.cancel()
+        _timer = threading.Timer(delay, _flush_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_in_background():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    except Exception:
+        logger.exception('Audit log flush failed; retrying later')
+    finally:
+        connection.close()
+    if _buffer and getattr(settings, 'AUDIT_FLUSH_SECONDS', 5):
+        _schedule(settings.AUDIT_FLUSH_SECONDS)
+
+
+def flush():
+    """Write every buffered entry with bulk_create; returns the number written"""
+    with _lock:
+        entries, _buffer[:] = list(_buffer), []
+    if not entries:
+        return 0
+    try:
+        # Users or assets deleted since the action would break the foreign keys
+        asset_ids = set(Asset.objects.filter(pk__in={entry.asset_id for entry in entries}).values_list('pk', flat=True))
+        actor_ids = set(User.objects.filter(pk__in={entry.actor_id for entry in entries}).values_list('pk', flat=True))
+        for entry in entries:
+            if entry.asset_id not in asset_ids:
+                entry.asset_id = None
+            if entry.actor_id not in actor_ids:
+                entry.actor_id = None
+        AuditLog.objects.bulk_create(entries, batch_size=500)
+    except DatabaseError:
+        with _lock:
+            _buffer[:0] = entries
+        raise
+    return len(entries)
+
+
+def _flush_at_exit():
+    if _buffer:
+        try:
+            flush()
+        except DatabaseError:
+            logger.exception('Audit log entries lost at exit')
+
+
+atexit.register(_flush_at_exit)
+
+
+def entries(actor=None, asset=None, since=None, until=None, action=''):
+    """Logged actions, newest first, filtered by actor, asset, time range [since, until) and action"""
+    log = AuditLog.objects.select_related('asset')
+    if actor is not None:
+        log = log.filter(actor=actor)
+    if asset is not None:
+        log = log.filter(asset=asset)
+    if since is not None:
+        log = log.filter(created_at__gte=since)
+    if until is not None:
+        log = log.filter(created_at__lt=until)
+    if action:
+        log = log.filter(action=action)
+    return log.order_by('-created_at', '-pk')
@@ -0,0 +1,160 @@
+"""
+In-process prefix index for search-box type-ahead.
+
+Every catalog asset (its name and serial number) and every category name is
+indexed under the lower-cased text starting at each word, in one sorted list
+of ``(key, kind, pk)`` tuples. A lookup is a ``bisect`` to the first key with
+the typed prefix plus a short forward scan, so suggestions are served from
+memory in microseconds without touching the database.
+
+The index is built when the WSGI application starts (rezo/wsgi.py) and kept
+current by the Asset/Category signals once their transaction commits. Writes
+made by other processes, or by bulk_create/update(), which send no signals,
+are picked up by a rebuild in a background thread once the index is older
+than AUTOCOMPLETE_REFRESH_SECONDS. If the startup build failed, the first
+lookup starts one in the background and gets no suggestions until it is done.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.urls import reverse
+
+from .models import Asset, Category
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_entries = []  # sorted (key, kind, pk)
+_items = {}    # (kind, pk) -> (suggestion dict, keys)
+_built_at = None
+_rebuilding = False
+
+
+def _keys(*texts):
+    """The text from the start of every word, lower-cased"""
+    keys = set()
+    for text in texts:
+        text = ' '.join(text.lower().split())
+        keys.update(text[index:] for index, char in enumerate(text) if char != ' ' and (index == 0 or text[index - 1] == ' '))
+    return keys
+
+
+def _asset_item(pk, name, serial_number):
+    url = reverse('asset_list') + '?' + urlencode({'search': serial_number})
+    return {'type': 'asset', 'id': pk, 'label': name, 'detail': serial_number, 'url': url}, _keys(name, serial_number)
+
+
+def _category_item(pk, name):
+    url = reverse('asset_list') + '?' + urlencode({'category': pk})
+    return {'type': 'category', 'id': pk, 'label': name, 'detail': 'Category', 'url': url}, _keys(name)
+
+
+def _remove(kind, pk):
+    _, keys = _items.pop((kind, pk), (None, ()))
+    for key in keys:
+        index = bisect_left(_entries, (key, kind, pk))
+        if index < len(_entries) and _entries[index] == (key, kind, pk):
+            del _entries[index]
+
+
+def _add(kind, pk, item):
+    _remove(kind, pk)
+    _items[(kind, pk)] = item
+    for key in item[1]:
+        insort(_entries, (key, kind, pk))
+
+
+def rebuild():
+    """Load the whole index from the database (two queries) and swap it in"""
+    global _entries, _items, _built_at
+    items = {}
+    for pk, name, serial_number in Asset.objects.filter(status='AVAILABLE').values_list('pk', 'name', 'serial_number').iterator():
+        items[('asset', pk)] = _asset_item(pk, name, serial_number)
+    for pk, name in Category.objects.values_list('pk', 'name'):
+        items[('category', pk)] = _category_item(pk, name)
+    entries = sorted((key, kind, pk) for (kind, pk), (_, keys) in items.items() for key in keys)
+    with _lock:
+        _entries, _items, _built_at = entries, items, time.monotonic()
+    return len(items)
+
+
+def warm():
+    """Build the index at startup; a database that is not ready yet is retried in the background on first use"""
+    try:
+        rebuild()
+    except DatabaseError:
+        logger.warning('Autocomplete index not built at startup', exc_info=True)
+
+
+def _refresh_in_background():
+    global _rebuilding
+    try:
+        rebuild()
+    except Exception:
+        logger.exception('Autocomplete index rebuild failed')
+    finally:
+        _rebuilding = False
+        connection.close()
+
+
+def _ensure_fresh():
+    """Start a background rebuild if the index is missing or old; never queries in the caller's thread"""
+    global _rebuilding
+    stale = _built_at is None or time.monotonic() - _built_at > getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 300)
+    with _lock:
+        if not stale or _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_refresh_in_background, daemon=True).start()
+
+
+def suggest(prefix, limit=10):
+    """Up to `limit` suggestion dicts whose name, serial or a word in them starts with `prefix`
+    
+    Until the index has been built (see warm()) this returns no suggestions.
+    """
+    prefix = ' '.join(prefix.lower().split())
+    if not prefix:
+        return []
+    _ensure_fresh()
+    if _built_at is None:
+        return []
+    results, seen = [], set()
+    with _lock:
+        index = bisect_left(_entries, (prefix,))
+        while index < len(_entries) and len(results) < limit:
+            key, kind, pk = _entries[index]
+            if not key.startswith(prefix):
+                break
+            if (kind, pk) not in seen:
+                seen.add((kind, pk))
+                results.append(_items[(kind, pk)][0])
+            index += 1
+    return results
+
+
+def asset_changed(pk, name, serial_number, status):
+    if _built_at is None:
+        return  # Built from the database on first use
+    with _lock:
+        if status == 'AVAILABLE':
+            _add('asset', pk, _asset_item(pk, name, serial_number))
+        else:
+            _remove('asset', pk)
+
+
+def category_changed(pk, name):
+    if _built_at is None:
+        return
+    with _lock:
+        _add('category', pk, _category_item(pk, name))
+
+
+def removed(kind, pk):
+    with _lock:
+        _remove(kind, pk)
@@ -0,0 +1,125 @@
+"""
+Reservation availability.
+
+Overlapping reservations are fetched with one range query on the
+(asset, status, starts_at, ends_at) index and then swept in time order, so
+answering "how many units are free between t1 and t2" only looks at the
+reservations that actually touch the window.
+
+Capacity for future windows is today's availability: approved borrows have no
+due date and are assumed to stay out until they are returned.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Asset, Reservation
+
+
+def overlapping(asset_ids, start, end, exclude_user=None):
+    """(asset_id, starts_at, ends_at, quantity) for active reservations overlapping [start, end)"""
+    reservations = Reservation.objects.filter(
+        asset_id__in=asset_ids, status='ACTIVE', starts_at__lt=end, ends_at__gt=start,
+    )
+    if exclude_user is not None:
+        reservations = reservations.exclude(user=exclude_user)
+    return reservations.values_list('asset_id', 'starts_at', 'ends_at', 'quantity')
+
+
+def peak_usage(intervals, start, end):
+    """Maximum number of units reserved at the same time within [start, end)"""
+    events = []
+    for starts_at, ends_at, quantity in intervals:
+        events.append((max(starts_at, start), quantity))
+        events.append((min(ends_at, end), -quantity))
+    # Ends sort before starts at the same instant: windows are half-open
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    peak = current = 0
+    for _, change in events:
+        current += change
+        peak = max(peak, current)
+    return peak
+
+
+def daily_peaks(intervals, first_day, days):
+    """Peak reserved units for each of `days` consecutive days starting at `first_day`"""
+    tz = timezone.get_current_timezone()
+    bounds = [
+        timezone.make_aware(datetime.combine(first_day + timedelta(days=offset), time.min), tz)
+        for offset in range(days + 1)
+    ]
+    events = []
+    for starts_at, ends_at, quantity in intervals:
+        events.append((starts_at, quantity))
+        events.append((ends_at, -quantity))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    # One pass over the sorted events: carry the running total across day boundaries
+    peaks = []
+    current = 0
+    index = 0
+    for day in range(days):
+        day_start, day_end = bounds[day], bounds[day + 1]
+        while index < len(events) and events[index][0] <= day_start:
+            current += events[index][1]
+            index += 1
+        peak = current
+        while index < len(events) and events[index][0] < day_end:
+            current += events[index][1]
+            index += 1
+            peak = max(peak, current)
+        peaks.append(peak)
+    return peaks
+
+
+def free_units(asset, start, end, exclude_user=None):
+    """How many units of `asset` can still be booked for the whole window [start, end)"""
+    capacity = max(asset.get_available_quantity(), 0)
+    intervals = [row[1:] for row in overlapping([asset.pk], start, end, exclude_user)]
+    return max(capacity - peak_usage(intervals, start, end), 0)
+
+
+def reserved_now(asset, exclude_user=None):
+    """Units held by reservations that are running right now"""
+    return reserved_now_by_asset([asset.pk], exclude_user)[asset.pk]
+
+
+def reserved_now_by_asset(asset_ids, exclude_user=None):
+    """Units held right now by running reservations, per asset id (one query for all of them)"""
+    now = timezone.now()
+    reserved = dict.fromkeys(asset_ids, 0)
+    for asset_id, _, _, quantity in overlapping(asset_ids, now, now + timedelta(seconds=1), exclude_user):
+        reserved[asset_id] += quantity
+    return reserved
+
+
+def category_calendar(category_id, first_day, days=30):
+    """Free units per day for every asset in a category, using two queries in total"""
+    assets = list(
+        Asset.objects.with_stock().filter(category_id=category_id).order_by('name').values(
+            'pk', 'name', 'serial_number', 'available_qty'
+        )
+    )
+    tz = timezone.get_current_timezone()
+    window_start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    window_end = window_start + timedelta(days=days)
+
+    by_asset = {}
+    for asset_id, starts_at, ends_at, quantity in overlapping([a['pk'] for a in assets], window_start, window_end):
+        by_asset.setdefault(asset_id, []).append((starts_at, ends_at, quantity))
+
+    rows = []
+    for asset in assets:
+        capacity = max(asset['available_qty'], 0)
+        peaks = daily_peaks(by_asset.get(asset['pk'], []), first_day, days)
+        rows.append({
+            'id': asset['pk'],
+            'name': asset['name'],
+            'serial_number': asset['serial_number'],
+            'free': [max(capacity - peak, 0) for peak in peaks],
+        })
+    return {
+        'days': [(first_day + timedelta(days=offset)).isoformat() for offset in range(days)],
+        'assets': rows,
+    }
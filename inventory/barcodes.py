@@ -0,0 +1,73 @@
+"""
+Printable codes for asset serial numbers.
+
+``asset_code_svg()`` returns an SVG QR code when the optional ``qrcode``
+package is installed, and a Code 128 barcode (drawn here, no dependencies)
+otherwise. Both encode the bare serial number, which is what a keyboard-
+wedge scanner types into the counter page.
+"""
+from xml.sax.saxutils import escape
+
+# Code 128 bar/space widths for symbol values 0-106 (103-105 are the start codes, 106 is stop)
+CODE128_PATTERNS = [
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+]
+START_B = 104
+STOP = 106
+QUIET_ZONE = 10
+
+
+def code128_values(text):
+    """Symbol values (start B, data, checksum, stop) for printable ASCII text"""
+    data = []
+    for char in text:
+        if not 32 <= ord(char) <= 126:
+            raise ValueError(f'Code 128 set B cannot encode {char!r}')
+        data.append(ord(char) - 32)
+    checksum = (START_B + sum(position * value for position, value in enumerate(data, start=1))) % 103
+    return [START_B, *data, checksum, STOP]
+
+
+def code128_svg(text, module=2, height=60):
+    """Code 128 barcode with the text printed underneath"""
+    x = QUIET_ZONE
+    bars = []
+    for value in code128_values(text):
+        for index, width in enumerate(CODE128_PATTERNS[value]):
+            width = int(width)
+            if index % 2 == 0:  # bars and spaces alternate, starting with a bar
+                bars.append(f'<rect x="{x * module}" y="0" width="{width * module}" height="{height}"/>')
+            x += width
+    total_width = (x + QUIET_ZONE) * module
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{total_width}" height="{height + 20}" '
+        f'viewBox="0 0 {total_width} {height + 20}">'
+        f'<rect width="100%" height="100%" fill="#fff"/><g fill="#000">{"".join(bars)}</g>'
+        f'<text x="{total_width / 2}" y="{height + 15}" font-family="monospace" font-size="14" '
+        f'text-anchor="middle">{escape(text)}</text></svg>'
+    )
+
+
+def qr_svg(text):
+    """QR code SVG, or None if the qrcode package is not installed"""
+    try:
+        import qrcode
+        import qrcode.image.svg
+    except ImportError:
+        return None
+    image = qrcode.make(text, image_factory=qrcode.image.svg.SvgPathImage, box_size=10, border=2)
+    return image.to_string(encoding='unicode')
+
+
+def asset_code_svg(serial_number):
+    return qr_svg(serial_number) or code128_svg(serial_number)
@@ -0,0 +1,90 @@
+"""
+Full-page cache for anonymous visitors.
+
+Anonymous visitors all get the same HTML for a given path and query, so the
+rendered page is stored in the ``PAGE_CACHE_ALIAS`` cache under a key built
+from the path, the normalized query parameters and the catalog version. Any
+stock change bumps the version, which retires every cached page at once;
+entries also expire after ``PAGE_CACHE_SECONDS``.
+
+Logged-in users, visitors with pending flash messages and responses that set
+cookies (e.g. a CSRF token) always bypass the cache.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .facets import AVAILABILITY_BANDS, CREATED_RANGES
+from .versioning import CATALOG, get_cached_version
+
+# Query parameters that change the rendered page, with their normalizers
+PAGE_PARAMS = {
+    'search': lambda value: ' '.join(value.split()),
+    # isdigit() alone also accepts digits like '²' that int() rejects
+    'page': lambda value: value if value.isascii() and value.isdigit() and int(value) > 0 else '1',
+    'category': lambda value: value if value.isascii() and value.isdigit() else '',
+    'availability': lambda value: value if value in AVAILABILITY_BANDS else '',
+    'created': lambda value: value if value in CREATED_RANGES else '',
+}
+
+
+def _page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def _is_anonymous_visitor(request):
+    """True if the page would render identically for every anonymous visitor"""
+    if 'messages' in request.COOKIES:
+        return False
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        # No session: anonymous without touching the session store
+        return True
+    return not request.user.is_authenticated and '_messages' not in request.session
+
+
+def page_cache_key(request):
+    params = '&'.join(
+        f'{name}={normalize(request.GET.get(name, ""))}' for name, normalize in sorted(PAGE_PARAMS.items())
+    )
+    version, _ = get_cached_version(CATALOG)
+    digest = hashlib.sha1(f'{request.path}?{params}'.encode()).hexdigest()
+    return f'page:{version}:{digest}'
+
+
+def cache_anonymous_page(view):
+    """Serve the view from the page cache for anonymous GET/HEAD requests"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not _is_anonymous_visitor(request):
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+
+        cache = _page_cache()
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'HIT'
+        else:
+            response = view(request, *args, **kwargs)
+            cacheable = (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            )
+            if cacheable:
+                cache.set(key, (response.content, response['Content-Type']),
+                          getattr(settings, 'PAGE_CACHE_SECONDS', 60))
+            response['X-Page-Cache'] = 'MISS'
+
+        # Logged-in users get a different page for the same URL
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapped
@@ -0,0 +1,163 @@
+"""
+Faceted filtering for the asset catalog.
+
+The catalog can be narrowed by category, availability band and creation
+date range. Facet counts come from one grouped query over the searched set::
+
+    SELECT category_id, category.name, band, age, COUNT(*) ... GROUP BY 1, 2, 3, 4
+
+Every facet's counts (each facet ignoring its own selection, as usual for
+facets) are sums over those few rows, so all filter combinations for a
+search share one cached result. The cache key includes the catalog version,
+so any stock change retires it.
+"""
+import hashlib
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import Asset
+from .versioning import CATALOG, get_cached_version
+
+LOW_STOCK = 3
+
+AVAILABILITY_BANDS = {
+    'in_stock': 'In stock now',
+    'low': f'Only {LOW_STOCK} or fewer left',
+    'out': 'Out of stock',
+}
+
+# Disjoint age buckets by upper bound in days; each created range is a run of buckets
+AGE_BUCKETS = [7, 30, 365, None]
+
+CREATED_RANGES = {
+    '7d': ('Last 7 days', range(0, 1)),
+    '30d': ('Last 30 days', range(0, 2)),
+    '1y': ('Last year', range(0, 3)),
+    'older': ('Over a year ago', range(3, 4)),
+}
+
+
+def parse_filters(params):
+    """Normalized facet selections from a query dict; unknown values are dropped"""
+    category = params.get('category', '')
+    availability = params.get('availability', '')
+    created = params.get('created', '')
+    return {
+        # isdigit() alone also accepts digits like '²' that int() rejects
+        'category': int(category) if category.isascii() and category.isdigit() else None,
+        'availability': availability if availability in AVAILABILITY_BANDS else '',
+        'created': created if created in CREATED_RANGES else '',
+    }
+
+
+def searched_assets(search_query):
+    """AVAILABLE assets matching the free-text search, with stock annotations"""
+    assets = Asset.objects.filter(status='AVAILABLE')
+    if search_query:
+        assets = assets.filter(
+            Q(name__icontains=search_query) |
+            Q(serial_number__icontains=search_query) |
+            Q(category__name__icontains=search_query)
+        )
+    return assets.with_stock()
+
+
+def apply_filters(assets, filters):
+    if filters['category']:
+        assets = assets.filter(category_id=filters['category'])
+    band = filters['availability']
+    if band == 'in_stock':
+        assets = assets.filter(available_qty__gt=0)
+    elif band == 'low':
+        assets = assets.filter(available_qty__gt=0, available_qty__lte=LOW_STOCK)
+    elif band == 'out':
+        assets = assets.filter(available_qty__lte=0)
+    if filters['created']:
+        now = timezone.now()
+        ages = CREATED_RANGES[filters['created']][1]
+        if AGE_BUCKETS[ages[-1]] is not None:
+            assets = assets.filter(created_at__gte=now - timedelta(days=AGE_BUCKETS[ages[-1]]))
+        if ages[0] > 0:
+            assets = assets.filter(created_at__lt=now - timedelta(days=AGE_BUCKETS[ages[0] - 1]))
+    return assets
+
+
+def _grouped_counts(assets):
+    """[(category_id, category name, band, age bucket, count)] from one grouped query"""
+    now = timezone.now()
+    age = Case(
+        *[When(created_at__gte=now - timedelta(days=days), then=Value(index))
+          for index, days in enumerate(AGE_BUCKETS[:-1])],
+        default=Value(len(AGE_BUCKETS) - 1), output_field=IntegerField(),
+    )
+    # Disjoint bands; 'in_stock' is the sum of 'low' and 'plenty'
+    band = Case(
+        When(available_qty__lte=0, then=Value('out')),
+        When(available_qty__lte=LOW_STOCK, then=Value('low')),
+        default=Value('plenty'),
+    )
+    rows = assets.annotate(band=band, age=age).order_by().values(
+        'category_id', 'category__name', 'band', 'age'
+    ).annotate(count=Count('pk'))
+    return [(row['category_id'], row['category__name'], row['band'], row['age'], row['count']) for row in rows]
+
+
+def _cached_grouped_counts(search_query):
+    version, _ = get_cached_version(CATALOG)
+    key = f'facets:{version}:{hashlib.sha1(search_query.encode()).hexdigest()}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = _grouped_counts(searched_assets(search_query))
+        cache.set(key, rows, getattr(settings, 'FACET_CACHE_SECONDS', 300))
+    return rows
+
+
+def _link(search_query, filters, **changes):
+    params = {'search': search_query, **filters, **changes}
+    return '?' + urlencode({name: value for name, value in params.items() if value})
+
+
+def facets(search_query, filters):
+    """Facet options with counts and toggle links for the catalog template"""
+    rows = _cached_grouped_counts(search_query)
+
+    def count(category, availability, created):
+        ages = CREATED_RANGES[created][1] if created else None
+        return sum(
+            number for category_id, _, band, age, number in rows
+            if (not category or category_id == category)
+            and (not availability or band == availability or (availability == 'in_stock' and band != 'out'))
+            and (ages is None or age in ages)
+        )
+
+    def option(name, value, label, number):
+        selected = filters[name] == value
+        return {
+            'value': value, 'label': label, 'count': number, 'selected': selected,
+            'url': _link(search_query, filters, **{name: '' if selected else value}),
+        }
+
+    names = sorted({(name, category_id) for category_id, name, _, _, _ in rows})
+    return {
+        'category': [
+            option('category', category_id, name, count(category_id, filters['availability'], filters['created']))
+            for name, category_id in names
+        ],
+        'availability': [
+            option('availability', key, label, count(filters['category'], key, filters['created']))
+            for key, label in AVAILABILITY_BANDS.items()
+        ],
+        'created': [
+            option('created', key, label, count(filters['category'], filters['availability'], key))
+            for key, (label, _) in CREATED_RANGES.items()
+        ],
+        'total': count(filters['category'], filters['availability'], filters['created']),
+        'clear_url': _link(search_query, {}),
+        # Current search and filters, for pagination links
+        'query': _link(search_query, filters)[1:],
+    }
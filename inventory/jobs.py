@@ -0,0 +1,191 @@
+"""
+Database-backed background job queue.
+
+Producers call ``enqueue()`` inside their normal request transaction, so a job
+only becomes visible once the write that caused it is committed. Workers
+(``manage.py run_worker``) claim jobs with a conditional UPDATE, which lets any
+number of worker processes share the table without an external broker.
+"""
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# kind -> (handler, batch, max_attempts)
+_registry = {}
+
+
+def task(kind, batch=False, max_attempts=5):
+    """Register a job handler.
+
+    Plain handlers receive one payload dict. Batch handlers receive a list of
+    payloads for every claimed job of the same kind, so similar work (e.g. many
+    status refreshes) is done in a single pass.
+    """
+    def decorator(func):
+        _registry[kind] = (func, batch, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, dedupe_key='', delay=0, priority=0):
+    """Queue a job; returns the Job, or None if it was deduplicated or run inline"""
+    from .models import Job
+
+    if kind not in _registry:
+        raise ValueError(f'Unknown job kind: {kind}')
+    payload = payload or {}
+
+    if getattr(settings, 'JOBS_RUN_EAGERLY', False):
+        transaction.on_commit(lambda: _run_handler(kind, [payload]))
+        return None
+
+    # An identical job that has not started yet will pick up the latest state anyway
+    if dedupe_key and Job.objects.filter(kind=kind, dedupe_key=dedupe_key, status='QUEUED').exists():
+        return None
+
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        dedupe_key=dedupe_key,
+        priority=priority,
+        max_attempts=_registry[kind][2],
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker_id, limit=50):
+    """Atomically claim up to `limit` due jobs for this worker"""
+    from .models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(status='QUEUED', run_at__lte=now)
+    ids = list(due.order_by('-priority', 'run_at', 'id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+
+    # The status condition makes the UPDATE the arbiter: if another worker
+    # claimed some of these rows in the meantime, they simply don't match.
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    due.filter(id__in=ids).update(
+        status='RUNNING',
+        locked_by=token,
+        locked_at=now,
+        started_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return list(Job.objects.filter(locked_by=token, status='RUNNING'))
+
+
+def run_jobs(jobs):
+    """Run claimed jobs grouped by kind; returns a dict of counters"""
+    from .models import Job
+
+    result = {'done': 0, 'retried': 0, 'failed': 0, 'batches': 0}
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+
+    for kind, group in by_kind.items():
+        entry = _registry.get(kind)
+        if entry is None:
+            _fail(group, f'No handler registered for {kind}', result)
+            continue
+
+        batch = entry[1]
+        chunks = [group] if batch else [[job] for job in group]
+        for chunk in chunks:
+            result['batches'] += 1
+            try:
+                _run_handler(kind, [job.payload for job in chunk])
+            except Exception:
+                logger.exception('Job %s failed', kind)
+                _fail(chunk, traceback.format_exc(), result)
+            else:
+                Job.objects.filter(id__in=[job.id for job in chunk]).update(
+                    status='DONE', finished_at=timezone.now(), locked_by='', last_error=''
+                )
+                result['done'] += len(chunk)
+    return result
+
+
+def requeue_stale(timeout):
+    """Put back jobs whose worker died while running them"""
+    from .models import Job
+
+    now = timezone.now()
+    stale = Job.objects.filter(status='RUNNING', locked_at__lt=now - timedelta(seconds=timeout))
+    # A job that keeps killing its worker (OOM, segfault) must not be retried forever
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status='FAILED', finished_at=now, locked_by='', last_error='Worker died while running the job'
+    )
+    return stale.update(status='QUEUED', locked_by='', locked_at=None)
+
+
+def purge(older_than_days):
+    """Delete finished jobs older than the given number of days"""
+    from .models import Job
+
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = Job.objects.filter(status='DONE', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def queue_stats(window_hours=1):
+    """Counts per kind/status plus average wait and run time of recent jobs"""
+    from .models import Job
+
+    counts = {}
+    for row in Job.objects.values('kind', 'status').annotate(total=Count('id')):
+        counts.setdefault(row['kind'], {})[row['status']] = row['total']
+
+    since = timezone.now() - timedelta(hours=window_hours)
+    timings = Job.objects.filter(status='DONE', finished_at__gte=since).aggregate(
+        finished=Count('id'),
+        avg_wait=Avg(F('started_at') - F('created_at')),
+        avg_run=Avg(F('finished_at') - F('started_at')),
+    )
+    return {'counts': counts, **timings}
+
+
+def _run_handler(kind, payloads):
+    func, batch, _ = _registry[kind]
+    if batch:
+        func(payloads)
+    else:
+        for payload in payloads:
+            func(payload)
+
+
+def _fail(jobs, error, result):
+    from .models import Job
+
+    now = timezone.now()
+    base = getattr(settings, 'JOBS_RETRY_BASE_SECONDS', 30)
+    for job in jobs:
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(id=job.id).update(
+                status='FAILED', finished_at=now, locked_by='', last_error=error
+            )
+            result['failed'] += 1
+        else:
+            # Exponential backoff, capped at one hour
+            delay = min(base * 2 ** (job.attempts - 1), 3600)
+            Job.objects.filter(id=job.id).update(
+                status='QUEUED', run_at=now + timedelta(seconds=delay),
+                locked_by='', locked_at=None, last_error=error
+            )
+            result['retried'] += 1
@@ -0,0 +1,75 @@
+"""
+Inventory movement ledger.
+
+Every stock-changing write path appends an ``InventoryMovement``. Balances are
+never updated in place: ``StockSnapshot`` rows checkpoint the running on-hand
+total per asset, so the balance at any moment is the latest snapshot before it
+plus a short indexed range scan of later movements.
+"""
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryMovement, StockSnapshot
+
+
+def record_movement(asset_id, kind, quantity, delta=None, user=None, borrow_record_id=None, note=''):
+    """Append one ledger row; `delta` defaults to quantity times the kind's direction"""
+    if delta is None:
+        delta = InventoryMovement.DIRECTIONS[kind] * quantity
+    return InventoryMovement.objects.create(
+        asset_id=asset_id,
+        kind=kind,
+        quantity=quantity,
+        delta=delta,
+        user=user,
+        borrow_record_id=borrow_record_id,
+        note=note[:255],
+    )
+
+
+def on_hand_at(asset_id, when=None):
+    """Serviceable units on hand for an asset at `when` (defaults to now)"""
+    when = when or timezone.now()
+    snapshot = StockSnapshot.objects.filter(asset_id=asset_id, taken_at__lte=when).order_by('-movement_id').first()
+
+    movements = InventoryMovement.objects.filter(asset_id=asset_id, created_at__lte=when)
+    balance = 0
+    if snapshot is not None:
+        movements = movements.filter(id__gt=snapshot.movement_id)
+        balance = snapshot.on_hand
+    return balance + (movements.aggregate(total=Sum('delta'))['total'] or 0)
+
+
+def checkpoint(asset_ids=None, min_movements=1):
+    """Snapshot assets with at least `min_movements` new movements; returns the number written"""
+    last_snapshot = StockSnapshot.objects.filter(asset_id=OuterRef('asset_id')).order_by('-movement_id')
+    movements = InventoryMovement.objects.annotate(
+        since=Coalesce(Subquery(last_snapshot.values('movement_id')[:1]), 0),
+    ).filter(id__gt=F('since'))
+    if asset_ids is not None:
+        movements = movements.filter(asset_id__in=list(asset_ids))
+
+    pending = movements.order_by().values('asset_id').annotate(
+        delta=Sum('delta'), last_id=Max('id'), last_at=Max('created_at'), count=Count('id'),
+    )
+    rows = [row for row in pending if row['count'] >= min_movements]
+    if not rows:
+        return 0
+
+    previous = dict(
+        StockSnapshot.objects.filter(
+            asset_id__in=[row['asset_id'] for row in rows],
+            movement_id=Subquery(last_snapshot.values('movement_id')[:1]),
+        ).values_list('asset_id', 'on_hand')
+    )
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(
+            asset_id=row['asset_id'],
+            movement_id=row['last_id'],
+            on_hand=previous.get(row['asset_id'], 0) + row['delta'],
+            taken_at=row['last_at'],
+        )
+        for row in rows
+    ])
+    return len(rows)
@@ -0,0 +1,288 @@
+"""
+Load-test harness for the borrow lifecycle (``manage.py loadtest``).
+
+Worker threads replay a weighted mix of scenarios with authenticated sessions:
+
+* browse  - GET the asset list (random page / search)
+* borrow  - POST a borrow request for an available asset
+* approve - staff approves a pending request
+* return  - a user returns one of their approved borrowings
+* process - staff processes a return
+
+Requests go either through the WSGI app in-process (django.test.Client, one
+per thread) or over HTTP to a running server (``--url``). Work items such as
+pending request ids are looked up in the local database and are not timed.
+Every request is timed; the summary has throughput, latency percentiles,
+error rates and the number of "database is locked" failures.
+
+The harness writes real borrow records: run it against a copy of the database.
+"""
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.contrib.auth.models import Group, User
+from django.db import OperationalError, close_old_connections
+from django.urls import reverse
+
+from .models import Asset, BorrowRecord
+
+SCENARIOS = ('browse', 'borrow', 'approve', 'return', 'process')
+DEFAULT_MIX = 'browse=60,borrow=15,approve=10,return=10,process=5'
+USER_PREFIX = 'loadtest-user-'
+STAFF_USERNAME = 'loadtest-staff'
+SEARCH_TERMS = ['', '', '', 'a', 'e', 'cable', 'laptop', 'projector']
+
+
+def parse_mix(value):
+    """'browse=60,borrow=15' -> {'browse': 60, 'borrow': 15}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario: {name!r} (choose from {", ".join(SCENARIOS)})')
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('The scenario mix needs at least one positive weight')
+    return mix
+
+
+def ensure_users(count, password):
+    """Create (or reset) the load-test borrowers and one staff account"""
+    staff_group, _ = Group.objects.get_or_create(name='Staff')
+    usernames = [f'{USER_PREFIX}{index}' for index in range(count)] + [STAFF_USERNAME]
+    for username in usernames:
+        user, _ = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.invalid'})
+        user.set_password(password)
+        user.is_staff = username == STAFF_USERNAME
+        user.save()
+        if user.is_staff:
+            user.groups.add(staff_group)
+    return usernames[:-1], STAFF_USERNAME
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Stats:
+    """Thread-safe collector of request timings"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.lock_timeouts = 0
+        self.skipped = 0
+
+    def record(self, scenario, seconds, ok, locked=False):
+        with self.lock:
+            self.latencies.setdefault(scenario, []).append(seconds)
+            if not ok:
+                self.errors[scenario] = self.errors.get(scenario, 0) + 1
+            if locked:
+                self.lock_timeouts += 1
+
+    def skip(self):
+        with self.lock:
+            self.skipped += 1
+
+    def summary(self, elapsed):
+        rows = {}
+        everything = []
+        for scenario, values in self.latencies.items():
+            values = sorted(values)
+            everything.extend(values)
+            rows[scenario] = self._row(values, self.errors.get(scenario, 0))
+        everything.sort()
+        total = self._row(everything, sum(self.errors.values()))
+        return {
+            'elapsed': elapsed,
+            'requests': len(everything),
+            'throughput': len(everything) / elapsed if elapsed else 0.0,
+            'lock_timeouts': self.lock_timeouts,
+            'skipped': self.skipped,
+            'scenarios': rows,
+            'total': total,
+        }
+
+    @staticmethod
+    def _row(values, errors):
+        return {
+            'count': len(values),
+            'errors': errors,
+            'error_rate': errors / len(values) if values else 0.0,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'max_ms': (values[-1] if values else 0.0) * 1000,
+        }
+
+
+class InProcessSession:
+    """Requests through the WSGI app in this process"""
+
+    def __init__(self, host):
+        from django.test import Client
+        self.client = Client(SERVER_NAME=host)
+
+    def login(self, username, password):
+        self.client.force_login(User.objects.get(username=username))
+
+    def request(self, method, path, data=None):
+        """Returns (status, locked)"""
+        try:
+            if method == 'POST':
+                response = self.client.post(path, data or {})
+            else:
+                response = self.client.get(path, data or {})
+        except Exception as exc:
+            # The test client re-raises view exceptions; a real server would answer 500
+            return 500, isinstance(exc, OperationalError) and 'locked' in str(exc)
+        return response.status_code, False
+
+
+class HttpSession:
+    """Requests over HTTP to a running server, with its own cookie jar"""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), self._NoRedirect
+        )
+
+    def _csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def login(self, username, password):
+        path = reverse('login')
+        self.request('GET', path)
+        status, _ = self.request('POST', path, {'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f'Login as {username} failed (HTTP {status})')
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {'Referer': url}
+        if method == 'POST':
+            body = urllib.parse.urlencode({**(data or {}), 'csrfmiddlewaretoken': self._csrf_token()}).encode()
+            headers['X-CSRFToken'] = self._csrf_token()
+        elif data:
+            url += '?' + urllib.parse.urlencode(data)
+        try:
+            with self.opener.open(urllib.request.Request(url, body, headers, method=method), timeout=self.timeout) as response:
+                response.read()
+                return response.status, False
+        except urllib.error.HTTPError as exc:
+            text = exc.read(65536).decode(errors='replace')
+            return exc.code, 'database is locked' in text
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            return 599, False
+
+
+class LoadTest:
+    """Runs `workers` threads for `duration` seconds (or until `max_requests`)"""
+
+    def __init__(self, session_factory, usernames, staff_username, password, mix,
+                 workers=8, duration=30.0, max_requests=0, think_time=0.0):
+        self.session_factory = session_factory
+        self.usernames = usernames
+        self.staff_username = staff_username
+        self.password = password
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+        self.workers = workers
+        self.duration = duration
+        self.max_requests = max_requests
+        self.think_time = think_time
+        self.stats = Stats()
+        self.issued = 0
+        self.counter_lock = threading.Lock()
+        self.asset_ids = []
+
+    def run(self):
+        self.asset_ids = list(Asset.objects.filter(status='AVAILABLE').values_list('pk', flat=True))
+        self.deadline = time.monotonic() + self.duration
+        started = time.monotonic()
+        threads = [threading.Thread(target=self._worker, args=(index,), daemon=True) for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.stats.summary(time.monotonic() - started)
+
+    def _next_ticket(self):
+        with self.counter_lock:
+            if self.max_requests and self.issued >= self.max_requests:
+                return False
+            self.issued += 1
+            return True
+
+    def _worker(self, index):
+        rng = random.Random(index)
+        username = self.usernames[index % len(self.usernames)]
+        user_id = User.objects.filter(username=username).values_list('pk', flat=True).get()
+        user = self.session_factory()
+        user.login(username, self.password)
+        staff = self.session_factory()
+        staff.login(self.staff_username, self.password)
+        try:
+            while time.monotonic() < self.deadline and self._next_ticket():
+                scenario = rng.choices(self.scenarios, self.weights)[0]
+                step = self._plan(scenario, user_id, rng)
+                if step is None:
+                    # Nothing to approve/return right now: browse instead
+                    self.stats.skip()
+                    scenario, step = 'browse', self._plan('browse', user_id, rng)
+                as_staff, method, path, data = step
+                begin = time.perf_counter()
+                status, locked = (staff if as_staff else user).request(method, path, data)
+                self.stats.record(scenario, time.perf_counter() - begin, ok=status < 400, locked=locked)
+                if self.think_time:
+                    time.sleep(rng.uniform(0, self.think_time))
+        finally:
+            close_old_connections()
+
+    def _plan(self, scenario, user_id, rng):
+        """(as_staff, method, path, data) for one step, or None if there is no work for it"""
+        if scenario == 'browse':
+            data = {'page': rng.randint(1, 3)}
+            term = rng.choice(SEARCH_TERMS)
+            if term:
+                data['search'] = term
+            return False, 'GET', reverse('asset_list'), data
+        if scenario == 'borrow':
+            if not self.asset_ids:
+                return None
+            return False, 'POST', reverse('borrow_asset', args=[rng.choice(self.asset_ids)]), {'quantity': 1}
+        if scenario == 'approve':
+            pk = self._pick(BorrowRecord.objects.filter(status='PENDING'), rng)
+            return pk and (True, 'POST', reverse('staff_approve_request', args=[pk]), {})
+        if scenario == 'return':
+            pk = self._pick(BorrowRecord.objects.filter(user_id=user_id, status='APPROVED', is_returned=False), rng)
+            return pk and (False, 'POST', reverse('return_asset', args=[pk]), {})
+        if scenario == 'process':
+            pk = self._pick(BorrowRecord.objects.filter(status='APPROVED', is_returned=False), rng)
+            return pk and (True, 'POST', reverse('staff_process_return', args=[pk]), {'condition': 'good'})
+        raise ValueError(scenario)
+
+    @staticmethod
+    def _pick(queryset, rng):
+        ids = list(queryset.order_by('-pk').values_list('pk', flat=True)[:20])
+        return rng.choice(ids) if ids else None
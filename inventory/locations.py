@@ -0,0 +1,156 @@
+"""
+Per-location stock counters.
+
+Every (asset, location) pair has one ``StockLevel`` row with on-hand,
+borrowed, pending and damaged counters. Write paths change them with a single
+``UPDATE ... SET borrowed = borrowed + n`` on the row of the storeroom
+involved. The counters say where units are and cap what one storeroom can
+lend; whether the asset as a whole has units free is still decided by the
+records (``Asset.get_available_quantity()``), so a checkout also touches the
+asset's own row and version stamps.
+
+The on-hand counters always add up to ``Asset.total_quantity``: edits of the
+total land in the default storeroom, disposals take units out of the
+storeroom they leave from, and ``transfer_stock()`` moves units between
+storerooms without changing the total.
+
+Records created before locations existed, or without one, count against the
+default location. ``rebuild_counters()`` recomputes the activity counters from
+the records if they ever drift (``manage.py rebuild_stock_levels``).
+"""
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Asset, BorrowRecord, DamagedItem, Location, StockLevel
+
+COUNTERS = ('on_hand', 'borrowed', 'pending', 'damaged')
+
+
+def default_location_id():
+    """Primary key of the default storeroom (created on first use)"""
+    pk = Location.objects.filter(is_default=True).values_list('pk', flat=True).first()
+    if pk is None:
+        pk = Location.objects.get_or_create(
+            code='MAIN', defaults={'name': 'Main storeroom', 'is_default': True}
+        )[0].pk
+    return pk
+
+
+def adjust_stock(asset_id, location_id=None, **deltas):
+    """Add deltas to one (asset, location) counter row, e.g. adjust_stock(1, 2, pending=-1, borrowed=1)"""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    location_id = location_id or default_location_id()
+    rows = StockLevel.objects.filter(asset_id=asset_id, location_id=location_id)
+    if not rows.update(**changes):
+        StockLevel.objects.get_or_create(asset_id=asset_id, location_id=location_id)
+        rows.update(**changes)
+
+
+def transfer_stock(asset_id, from_location_id, to_location_id, quantity):
+    """Move `quantity` free units of an asset from one storeroom to another (the total stays the same)"""
+    if quantity <= 0 or from_location_id == to_location_id:
+        raise ValueError('Transfer a positive quantity between two different storerooms')
+    free = available_at(asset_id, from_location_id)
+    if quantity > free:
+        raise ValueError(f'Only {free} unit(s) are free to move')
+    adjust_stock(asset_id, from_location_id, on_hand=-quantity)
+    adjust_stock(asset_id, to_location_id, on_hand=quantity)
+
+
+def stock_levels(asset_id):
+    """The asset's StockLevel rows with their locations, default storeroom first"""
+    return list(
+        StockLevel.objects.filter(asset_id=asset_id).select_related('location').order_by('-location__is_default', 'location__name')
+    )
+
+
+def available_at(asset_id, location_id):
+    """Units free to lend at one storeroom"""
+    row = StockLevel.objects.filter(asset_id=asset_id, location_id=location_id).values_list(
+        'on_hand', 'borrowed', 'pending', 'damaged'
+    ).first()
+    if row is None:
+        return 0
+    on_hand, borrowed, pending, damaged = row
+    return on_hand - borrowed - pending - damaged
+
+
+def best_location_id(asset_id):
+    """Storeroom with the most free units of an asset"""
+    levels = stock_levels(asset_id)
+    if not levels:
+        return default_location_id()
+    return max(levels, key=lambda level: level.available).location_id
+
+
+def rollup(asset_ids=None):
+    """{asset_id: {'on_hand': .., 'borrowed': .., 'pending': .., 'damaged': .., 'available': ..}} summed over locations"""
+    levels = StockLevel.objects.all()
+    if asset_ids is not None:
+        levels = levels.filter(asset_id__in=list(asset_ids))
+    totals = {}
+    for row in levels.order_by().values('asset_id').annotate(**{name: Sum(name) for name in COUNTERS}):
+        asset_id = row.pop('asset_id')
+        row['available'] = row['on_hand'] - row['borrowed'] - row['pending'] - row['damaged']
+        totals[asset_id] = row
+    return totals
+
+
+def rebuild_counters(asset_ids=None):
+    """Recompute borrowed/pending/damaged from the records and the default storeroom's on-hand
+    from total_quantity; returns the number of rows corrected"""
+    default_id = default_location_id()
+    expected = {}
+
+    def entry(key):
+        return expected.setdefault(key, dict.fromkeys(('borrowed', 'pending', 'damaged'), 0))
+
+    def collect(queryset, **counters):
+        if asset_ids is not None:
+            queryset = queryset.filter(asset_id__in=list(asset_ids))
+        rows = queryset.annotate(loc=Coalesce('location_id', default_id)).order_by().values('asset_id', 'loc').annotate(
+            **{name: Coalesce(Sum('quantity', filter=condition), 0) for name, condition in counters.items()}
+        )
+        for row in rows:
+            counts = entry((row['asset_id'], row['loc']))
+            for name in counters:
+                counts[name] += row[name]
+
+    collect(BorrowRecord.objects.all(),
+            borrowed=Q(status='APPROVED', is_returned=False),
+            pending=Q(status='PENDING'))
+    collect(DamagedItem.objects.all(), damaged=Q(is_repaired=False))
+
+    levels = StockLevel.objects.all()
+    assets = Asset.objects.all()
+    if asset_ids is not None:
+        levels = levels.filter(asset_id__in=list(asset_ids))
+        assets = assets.filter(pk__in=list(asset_ids))
+    existing = {(level.asset_id, level.location_id): level for level in levels}
+
+    # On-hand counters must add up to total_quantity; the default storeroom absorbs any difference
+    # (assets created without Asset.save() have no rows yet, so all their stock starts there)
+    elsewhere = {}
+    for (asset_id, location_id), level in existing.items():
+        if location_id != default_id:
+            elsewhere[asset_id] = elsewhere.get(asset_id, 0) + level.on_hand
+    for asset_id, total in assets.values_list('pk', 'total_quantity'):
+        entry((asset_id, default_id))['on_hand'] = total - elsewhere.get(asset_id, 0)
+
+    corrected = 0
+    for key, counts in expected.items():
+        level = existing.get(key)
+        if level is None:
+            StockLevel.objects.create(asset_id=key[0], location_id=key[1], **counts)
+            corrected += 1
+        elif any(getattr(level, name) != value for name, value in counts.items()):
+            StockLevel.objects.filter(pk=level.pk).update(**counts)
+            corrected += 1
+    for key, level in existing.items():
+        # Rows no record points at any more
+        if key not in expected and (level.borrowed or level.pending or level.damaged):
+            StockLevel.objects.filter(pk=level.pk).update(borrowed=0, pending=0, damaged=0)
+            corrected += 1
+    return corrected
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.archive import archivable, archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Move returned and rejected borrow records into the archive table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True,
+                            help='Archive records closed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Records moved per transaction')
+        parser.add_argument('--max-batches', type=int, default=0, help='Stop after this many batches (0 = all)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches so other writers get the lock')
+        parser.add_argument('--dry-run', action='store_true', help='Only count archivable records')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError('--older-than must be zero or positive')
+
+        if options['dry_run']:
+            count = archivable(options['older_than']).count()
+            self.stdout.write(f'{count} record(s) would be archived')
+            return
+
+        moved = batches = 0
+        while True:
+            count = archive_batch(options['older_than'], options['batch_size'])
+            if not count:
+                break
+            moved += count
+            batches += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Batch {batches}: archived {count} record(s)')
+            if options['max_batches'] and batches >= options['max_batches']:
+                break
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} record(s) in {batches} batch(es)'))
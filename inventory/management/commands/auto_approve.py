@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.approvals import auto_approve, evaluate
+from inventory.models import BorrowRecord
+
+
+class Command(BaseCommand):
+    help = 'Approve pending borrow requests that are within the auto-approval rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep running and evaluate the pending requests every N seconds')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only list each pending request with the reason it needs staff review')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pending = BorrowRecord.objects.filter(status='PENDING').select_related('user', 'asset').order_by('borrow_date', 'pk')
+            for record, reason in evaluate(list(pending)):
+                self.stdout.write(f'#{record.pk} {record.user.username}: {record.quantity} x {record.asset.name} - '
+                                  f'{reason or "would be approved"}')
+            return
+
+        try:
+            while True:
+                approved = auto_approve()
+                left = BorrowRecord.objects.filter(status='PENDING').count()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Approved {len(approved)} request(s); {left} left for staff review'
+                ))
+                if not options['every']:
+                    break
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import checkpoint
+from inventory.models import Asset
+
+
+class Command(BaseCommand):
+    help = 'Write stock snapshot checkpoints for assets with new ledger movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Assets checkpointed per query')
+        parser.add_argument('--min-movements', type=int, default=1,
+                            help='Only snapshot assets with at least this many new movements')
+
+    def handle(self, *args, **options):
+        written = 0
+        last_pk = 0
+        while True:
+            ids = list(
+                Asset.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            written += checkpoint(ids, min_movements=options['min_movements'])
+            last_pk = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} stock snapshot(s)'))
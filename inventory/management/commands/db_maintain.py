@@ -0,0 +1,97 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+
+from rezo import maintenance
+
+
+class Command(BaseCommand):
+    help = ('Purge expired sessions, refresh query planner statistics, release free pages and check the '
+            'SQLite database, in time-boxed steps that are safe to run during business hours')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to maintain')
+        parser.add_argument('--step-seconds', type=float, default=10.0,
+                            help='Time box of each step; a statement still running then is interrupted')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Expired sessions deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches so other writers get the lock')
+        parser.add_argument('--analysis-limit', type=int, default=1000,
+                            help='Rows sampled per index by ANALYZE (0 = all rows)')
+        parser.add_argument('--vacuum-pages', type=int, default=256, help='Free pages released per incremental vacuum')
+        parser.add_argument('--full-check', action='store_true',
+                            help='Run integrity_check instead of the faster quick_check')
+        parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                            help='Switch the file to auto_vacuum=INCREMENTAL with one full VACUUM '
+                                 '(locks the database while it runs; do this out of hours)')
+        parser.add_argument('--skip', action='append', default=[],
+                            choices=['sessions', 'analyze', 'vacuum', 'check', 'sizes'], help='Leave out a step')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        problems = []
+        try:
+            if options['enable_incremental_vacuum']:
+                started = time.monotonic()
+                mode = maintenance.enable_incremental_vacuum(using)
+                self.stdout.write(f'auto_vacuum is now {mode} (VACUUM took {time.monotonic() - started:.1f}s)')
+
+            if 'sessions' not in options['skip']:
+                self.step('Expired sessions', options, lambda ends: '{} deleted'.format(
+                    maintenance.purge_sessions(ends, options['batch_size'], options['pause'], using)))
+            if 'analyze' not in options['skip']:
+                self.step('Statistics', options, lambda ends: '{} tables analyzed'.format(
+                    len(maintenance.analyze(ends, options['analysis_limit'], using))))
+            if 'vacuum' not in options['skip']:
+                if maintenance.auto_vacuum_mode(using) == 'incremental':
+                    self.step('Incremental vacuum', options, lambda ends: '{} pages released, {} left'.format(
+                        maintenance.incremental_vacuum(ends, options['vacuum_pages'], options['pause'], using),
+                        maintenance.free_pages(using)))
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        f'Incremental vacuum: skipped, auto_vacuum is {maintenance.auto_vacuum_mode(using)} '
+                        f'({maintenance.free_pages(using)} free pages); run once with --enable-incremental-vacuum'
+                    ))
+            if 'check' not in options['skip']:
+                integrity = self.step('Integrity', options, lambda ends: maintenance.integrity_problems(
+                    options['full_check'], using))
+                foreign_keys = self.step('Foreign keys', options, lambda ends: maintenance.foreign_key_problems(using))
+                for table, rowid, parent in foreign_keys or []:
+                    problems.append(f'{table} row {rowid} points to a missing {parent} row')
+                problems.extend(integrity or [])
+            if 'sizes' not in options['skip']:
+                self.report_sizes(using, options['verbosity'])
+        except OperationalError as exc:
+            raise CommandError(str(exc))
+
+        for problem in problems[:50]:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'{len(problems)} integrity problem(s) found')
+        self.stdout.write(self.style.SUCCESS('Database maintenance finished'))
+
+    def step(self, name, options, run):
+        """Run one time-boxed step and print its outcome; returns its result (None if it timed out)"""
+        started = time.monotonic()
+        try:
+            with maintenance.deadline(options['database'], options['step_seconds']) as ends:
+                result = run(ends)
+        except maintenance.TimedOut as exc:
+            detail = f': {exc}' if str(exc) else ''
+            self.stdout.write(self.style.WARNING(
+                f'{name}: stopped after {time.monotonic() - started:.1f}s{detail}; the rest is left for the next run'
+            ))
+            return None
+        if isinstance(result, list):
+            message = 'ok' if not result else f'{len(result)} problem(s)'
+        else:
+            message = result
+        self.stdout.write(f'{name}: {message} ({time.monotonic() - started:.2f}s)')
+        return result
+
+    def report_sizes(self, using, verbosity):
+        total, free = maintenance.file_size(using)
+        self.stdout.write(f'Database: {total // 1024} KiB, {free // 1024} KiB in free pages')
+        for name, size in maintenance.table_sizes(using)[:None if verbosity > 1 else 15]:
+            self.stdout.write(f'  {size // 1024:>8} KiB  {name}')
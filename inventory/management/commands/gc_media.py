@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from inventory.storage import INCOMING_DIR
+
+
+class Command(BaseCommand):
+    help = 'Delete uploaded media files that no database row refers to any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=getattr(settings, 'MEDIA_GC_GRACE_HOURS', 24),
+                            help='Keep unreferenced files modified more recently than this')
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options['grace_hours'] * 3600
+        referenced, directories = set(), set()
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField) and field.storage is default_storage:
+                    names = model._default_manager.exclude(**{field.name: ''}).exclude(
+                        **{f'{field.name}__isnull': True}
+                    ).values_list(field.name, flat=True).distinct()
+                    referenced.update(names.iterator())
+                    if isinstance(field.upload_to, str) and field.upload_to:
+                        directories.add(field.upload_to.split('%')[0].rstrip('/'))
+        directories.add(INCOMING_DIR)  # Uploads interrupted half-way
+
+        root = default_storage.location
+        deleted = freed = 0
+        for directory in sorted(directories):
+            for dirpath, _, filenames in os.walk(os.path.join(root, directory), topdown=False):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    name = os.path.relpath(full_path, root).replace(os.sep, '/')
+                    if name in referenced or os.path.getmtime(full_path) > cutoff:
+                        continue
+                    size = os.path.getsize(full_path)
+                    if options['dry_run']:
+                        self.stdout.write(f'Would delete {name} ({size} bytes)')
+                    else:
+                        os.remove(full_path)
+                    deleted += 1
+                    freed += size
+                if not options['dry_run'] and dirpath != os.path.join(root, directory) and not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} orphaned file(s), {freed / 1048576:.1f} MB; {len(referenced)} file(s) referenced'
+        ))
@@ -0,0 +1,91 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.loadtest import DEFAULT_MIX, HttpSession, InProcessSession, LoadTest, ensure_users, parse_mix
+
+
+class Command(BaseCommand):
+    help = 'Load-test the borrow/approve/return workflow (writes real records: use a copy of the database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='', help='Base URL of a running server; default is the in-process WSGI app')
+        parser.add_argument('--host', default='', help='Host name for in-process requests (default: first ALLOWED_HOSTS entry)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent worker threads')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+        parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Scenario weights, e.g. "browse=60,borrow=15"')
+        parser.add_argument('--users', type=int, default=0, help='Borrower accounts to use (default: one per worker)')
+        parser.add_argument('--password', default='loadtest-Passw0rd', help='Password set on the load-test accounts')
+        parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between requests (seconds)')
+        parser.add_argument('--json', default='', help='Also write the summary to this file')
+        # Thresholds: the command fails if any is exceeded
+        parser.add_argument('--max-p95', type=float, help='Max overall p95 latency (ms)')
+        parser.add_argument('--max-p99', type=float, help='Max overall p99 latency (ms)')
+        parser.add_argument('--max-error-rate', type=float, help='Max overall error rate (0-1)')
+        parser.add_argument('--max-lock-timeouts', type=int, help='Max "database is locked" failures')
+        parser.add_argument('--min-throughput', type=float, help='Min requests per second')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        usernames, staff_username = ensure_users(options['users'] or options['workers'], options['password'])
+        if options['url']:
+            session_factory = lambda: HttpSession(options['url'])
+            target = options['url']
+        else:
+            host = options['host'] or next((h for h in settings.ALLOWED_HOSTS if h not in ('*', '')), 'localhost')
+            session_factory = lambda: InProcessSession(host.lstrip('.'))
+            target = 'in-process WSGI app'
+
+        self.stdout.write(f'Load-testing {target} with {options["workers"]} worker(s) for {options["duration"]:.0f}s')
+        summary = LoadTest(
+            session_factory, usernames, staff_username, options['password'], mix,
+            workers=options['workers'], duration=options['duration'],
+            max_requests=options['requests'], think_time=options['think_time'],
+        ).run()
+
+        self.print_summary(summary)
+        if options['json']:
+            with open(options['json'], 'w') as handle:
+                json.dump(summary, handle, indent=2)
+
+        failures = self.check_thresholds(summary, options)
+        if failures:
+            raise CommandError('Thresholds exceeded: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All thresholds met'))
+
+    def print_summary(self, summary):
+        self.stdout.write(f"{'scenario':<10} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        rows = list(summary['scenarios'].items()) + [('TOTAL', summary['total'])]
+        for name, row in rows:
+            self.stdout.write(
+                f"{name:<10} {row['count']:>7} {row['errors']:>7} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}"
+            )
+        self.stdout.write(
+            f"{summary['requests']} request(s) in {summary['elapsed']:.1f}s = {summary['throughput']:.1f} req/s, "
+            f"error rate {summary['total']['error_rate']:.2%}, {summary['lock_timeouts']} lock timeout(s), "
+            f"{summary['skipped']} step(s) without work fell back to browsing"
+        )
+
+    def check_thresholds(self, summary, options):
+        total = summary['total']
+        checks = [
+            ('max_p95', total['p95_ms'], 'p95 {:.1f} ms > {} ms'),
+            ('max_p99', total['p99_ms'], 'p99 {:.1f} ms > {} ms'),
+            ('max_error_rate', total['error_rate'], 'error rate {:.4f} > {}'),
+            ('max_lock_timeouts', summary['lock_timeouts'], '{} lock timeout(s) > {}'),
+        ]
+        failures = [
+            message.format(value, options[name])
+            for name, value, message in checks
+            if options[name] is not None and value > options[name]
+        ]
+        if options['min_throughput'] is not None and summary['throughput'] < options['min_throughput']:
+            failures.append(f"throughput {summary['throughput']:.1f} req/s < {options['min_throughput']}")
+        return failures
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from inventory.locations import rebuild_counters
+from inventory.models import Asset
+
+
+class Command(BaseCommand):
+    help = ('Recompute per-location borrowed/pending/damaged counters from the borrow and damage records, '
+            'and the default storeroom\'s on-hand count from total_quantity')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Assets rebuilt per batch')
+
+    def handle(self, *args, **options):
+        pks = list(Asset.objects.order_by('pk').values_list('pk', flat=True))
+        corrected = 0
+        for start in range(0, len(pks), options['chunk_size']):
+            corrected += rebuild_counters(pks[start:start + options['chunk_size']])
+        self.stdout.write(self.style.SUCCESS(f'Corrected {corrected} stock level row(s)'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from inventory.reconcile import reconcile_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute Asset.status from stock for the whole catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Assets reconciled per query')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+
+    def handle(self, *args, **options):
+        changed = 0
+        for changes in reconcile_all(options['chunk_size'], dry_run=options['dry_run']):
+            for pk, (old, new) in sorted(changes.items()):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Asset {pk}: {old} -> {new}')
+            changed += len(changes)
+
+        verb = 'would change' if options['dry_run'] else 'updated'
+        self.stdout.write(self.style.SUCCESS(f'Reconciliation {verb} {changed} asset(s)'))
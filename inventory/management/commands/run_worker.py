@@ -0,0 +1,83 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed per poll')
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain due jobs once and exit')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Exit after processing this many jobs')
+        parser.add_argument('--worker-id', default='', help='Identifier recorded on claimed jobs')
+        parser.add_argument('--stats', action='store_true', help='Print queue metrics and exit')
+        parser.add_argument('--purge-days', type=int, default=0, help='Delete finished jobs older than N days and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats()
+        if options['purge_days']:
+            deleted = jobs.purge(options['purge_days'])
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} finished job(s)'))
+            return
+
+        worker_id = options['worker_id'] or jobs.default_worker_id()
+        stale_after = getattr(settings, 'JOBS_STALE_AFTER_SECONDS', 300)
+        totals = {'done': 0, 'retried': 0, 'failed': 0, 'batches': 0}
+        started = time.monotonic()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        self.stdout.write(f'Worker {worker_id} started')
+        last_report = started
+        while not self.stopping:
+            jobs.requeue_stale(stale_after)
+            claimed = jobs.claim(worker_id, options['batch_size'])
+            if claimed:
+                for key, value in jobs.run_jobs(claimed).items():
+                    totals[key] += value
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['idle_sleep'])
+
+            processed = totals['done'] + totals['failed']
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
+            if time.monotonic() - last_report >= 60:
+                self.report(totals, started)
+                last_report = time.monotonic()
+
+        self.report(totals, started)
+
+    def request_stop(self, signum, frame):
+        # Finish the current batch, then exit
+        self.stopping = True
+
+    def report(self, totals, started):
+        elapsed = max(time.monotonic() - started, 0.001)
+        rate = (totals['done'] + totals['failed']) / elapsed
+        self.stdout.write(
+            f"done={totals['done']} retried={totals['retried']} failed={totals['failed']} "
+            f"batches={totals['batches']} rate={rate:.1f} jobs/s"
+        )
+
+    def print_stats(self):
+        stats = jobs.queue_stats()
+        if not stats['counts']:
+            self.stdout.write('Queue is empty')
+        for kind, counts in sorted(stats['counts'].items()):
+            summary = ' '.join(f'{status.lower()}={total}' for status, total in sorted(counts.items()))
+            self.stdout.write(f'{kind}: {summary}')
+        self.stdout.write(f"finished in last hour: {stats['finished']}")
+        if stats['avg_wait'] is not None:
+            self.stdout.write(f"avg wait: {stats['avg_wait'].total_seconds():.2f}s")
+        if stats['avg_run'] is not None:
+            self.stdout.write(f"avg run: {stats['avg_run'].total_seconds():.2f}s")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from rezo.replicas import sync_replica
+
+
+class Command(BaseCommand):
+    help = 'Refresh the read replica with a consistent copy of the primary database (SQLite online backup)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep running and refresh every N seconds (keep below REPLICA_MAX_LAG_SECONDS)')
+        parser.add_argument('--pages', type=int, default=-1,
+                            help='Pages copied per backup step; smaller steps let writers in between')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    size = sync_replica(options['pages'])
+                except ImproperlyConfigured as exc:
+                    raise CommandError(str(exc))
+                self.stdout.write(self.style.SUCCESS(
+                    f'Replica refreshed: {size // 1024} KiB in {time.monotonic() - started:.2f}s'
+                ))
+                if not options['every']:
+                    break
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
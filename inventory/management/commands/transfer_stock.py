@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory.locations import available_at, transfer_stock
+from inventory.models import Asset, Location
+
+
+class Command(BaseCommand):
+    help = 'Move free units of an asset from one storeroom to another (the asset total stays the same)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('serial_number', help='Serial number of the asset')
+        parser.add_argument('from_code', help='Code of the storeroom the units leave')
+        parser.add_argument('to_code', help='Code of the storeroom that receives them')
+        parser.add_argument('quantity', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            asset = Asset.objects.get(serial_number=options['serial_number'])
+            source = Location.objects.get(code=options['from_code'])
+            target = Location.objects.get(code=options['to_code'])
+        except (Asset.DoesNotExist, Location.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+
+        try:
+            with transaction.atomic():
+                transfer_stock(asset.pk, source.pk, target.pk, options['quantity'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {options["quantity"]} x {asset.name} from {source.name} to {target.name} '
+            f'({available_at(asset.pk, target.pk)} free there now)'
+        ))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RECEIVE', 'Received'), ('ADJUST', 'Adjustment'), ('REQUEST', 'Borrow Requested'), ('REJECT', 'Request Rejected'), ('CHECKOUT', 'Checked Out'), ('RETURN', 'Returned'), ('DAMAGE', 'Reported Damaged'), ('REPAIR', 'Repaired'), ('MAINT_OUT', 'Sent to Maintenance'), ('MAINT_IN', 'Back from Maintenance'), ('DISPOSE', 'Disposed')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('delta', models.IntegerField()),
+                ('borrow_record_id', models.IntegerField(blank=True, null=True)),
+                ('note', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.asset')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['asset', 'created_at'], name='movement_asset_created_idx'), models.Index(fields=['asset', 'id'], name='movement_asset_id_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_id', models.BigIntegerField()),
+                ('on_hand', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.asset')),
+            ],
+            options={
+                'ordering': ['-taken_at'],
+                'indexes': [models.Index(fields=['asset', 'taken_at'], name='snapshot_asset_taken_idx'), models.Index(fields=['asset', 'movement_id'], name='snapshot_asset_movement_idx')],
+            },
+        ),
+    ]
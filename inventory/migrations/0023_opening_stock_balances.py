@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def _totals(queryset):
+    return dict(queryset.values('asset').annotate(total=Sum('quantity')).values_list('asset', 'total'))
+
+
+def create_opening_balances(apps, schema_editor):
+    """Seed the ledger with each existing asset's current on-hand stock"""
+    Asset = apps.get_model('inventory', 'Asset')
+    BorrowRecord = apps.get_model('inventory', 'BorrowRecord')
+    DamagedItem = apps.get_model('inventory', 'DamagedItem')
+    MaintenanceRecord = apps.get_model('inventory', 'MaintenanceRecord')
+    InventoryMovement = apps.get_model('inventory', 'InventoryMovement')
+
+    borrowed = _totals(BorrowRecord.objects.filter(status='APPROVED', is_returned=False))
+    damaged = _totals(DamagedItem.objects.filter(is_repaired=False))
+    maintenance = _totals(MaintenanceRecord.objects.filter(status__in=['PENDING', 'IN_PROGRESS']))
+
+    movements = []
+    for pk, total in Asset.objects.values_list('pk', 'total_quantity'):
+        on_hand = total - borrowed.get(pk, 0) - damaged.get(pk, 0) - maintenance.get(pk, 0)
+        movements.append(InventoryMovement(
+            asset_id=pk, kind='ADJUST', quantity=abs(on_hand), delta=on_hand, note='Opening balance',
+        ))
+    InventoryMovement.objects.bulk_create(movements, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_inventorymovement_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0026_admin_lookup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrowRecord',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField(default=1)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending Approval'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('borrow_date', models.DateField()),
+                ('approved_date', models.DateField(blank=True, null=True)),
+                ('return_date', models.DateField(blank=True, null=True)),
+                ('is_returned', models.BooleanField(default=False)),
+                ('rejection_reason', models.TextField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_approved_borrow_records', to=settings.AUTH_USER_MODEL)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrow_records', to='inventory.asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrow_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'borrow_date'], name='archived_borrow_user_idx'), models.Index(fields=['asset', 'status'], name='archived_borrow_asset_idx'), models.Index(fields=['status', 'is_returned', 'return_date'], name='archived_borrow_return_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0027_archivedborrowrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('is_default', models.BooleanField(default=False, help_text='Receives new stock and records without a location')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedborrowrecord',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_borrow_records', to='inventory.location'),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='borrow_records', to='inventory.location'),
+        ),
+        migrations.AddField(
+            model_name='damageditem',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='damaged_items', to='inventory.location'),
+        ),
+        migrations.AddField(
+            model_name='disposalrecord',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='disposal_records', to='inventory.location'),
+        ),
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand', models.IntegerField(default=0)),
+                ('borrowed', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('damaged', models.IntegerField(default=0)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='inventory.asset')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='inventory.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', 'asset'], name='stock_location_asset_idx')],
+                'constraints': [models.UniqueConstraint(fields=('asset', 'location'), name='unique_stock_level')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def _totals(queryset):
+    return dict(queryset.values('asset').annotate(total=Sum('quantity')).values_list('asset', 'total'))
+
+
+def create_default_location(apps, schema_editor):
+    """Put all existing stock and records in a default storeroom"""
+    Location = apps.get_model('inventory', 'Location')
+    StockLevel = apps.get_model('inventory', 'StockLevel')
+    Asset = apps.get_model('inventory', 'Asset')
+    BorrowRecord = apps.get_model('inventory', 'BorrowRecord')
+    DamagedItem = apps.get_model('inventory', 'DamagedItem')
+
+    location, _ = Location.objects.get_or_create(code='MAIN', defaults={'name': 'Main storeroom', 'is_default': True})
+    for model_name in ('BorrowRecord', 'ArchivedBorrowRecord', 'DamagedItem', 'DisposalRecord'):
+        apps.get_model('inventory', model_name).objects.filter(location__isnull=True).update(location=location)
+
+    borrowed = _totals(BorrowRecord.objects.filter(status='APPROVED', is_returned=False))
+    pending = _totals(BorrowRecord.objects.filter(status='PENDING'))
+    damaged = _totals(DamagedItem.objects.filter(is_repaired=False))
+    StockLevel.objects.bulk_create([
+        StockLevel(
+            asset_id=pk, location=location, on_hand=total,
+            borrowed=borrowed.get(pk, 0), pending=pending.get(pk, 0), damaged=damaged.get(pk, 0),
+        )
+        for pk, total in Asset.objects.values_list('pk', 'total_quantity')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0028_location_stocklevel'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_location, migrations.RunPython.noop),
+    ]
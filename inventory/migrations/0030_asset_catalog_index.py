@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0029_default_location_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asset',
+            index=models.Index(fields=['status', 'category', 'created_at'], name='asset_status_category_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0031_serialcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_quantity', models.PositiveIntegerField(default=1, help_text='Largest quantity approved automatically per request')),
+                ('max_open_per_user', models.PositiveIntegerField(default=3, help_text='Open borrowings a user may hold, including the approved one')),
+                ('min_headroom', models.PositiveIntegerField(default=1, help_text='Units that must stay available after approval')),
+                ('is_active', models.BooleanField(default=True)),
+                ('category', models.OneToOneField(blank=True, help_text='Leave empty for the rule covering every category without its own rule', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='approval_rule', to='inventory.category')),
+            ],
+        ),
+    ]
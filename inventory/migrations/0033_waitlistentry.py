@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0032_approvalrule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1)),
+                ('priority', models.IntegerField(default=0, help_text='Higher priorities are served first; equal ones in joining order')),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('ALLOCATED', 'Allocated'), ('CANCELLED', 'Cancelled')], default='WAITING', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('allocated_at', models.DateTimeField(blank=True, null=True)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='inventory.asset')),
+                ('borrow_record', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='inventory.borrowrecord')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-priority', 'created_at'],
+                'indexes': [models.Index(fields=['asset', 'status'], name='waitlist_asset_status_idx'), models.Index(fields=['user', 'status'], name='waitlist_user_status_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='waitlist_quantity_positive')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0033_waitlistentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor_name', models.CharField(blank=True, help_text='Username at the time; kept if the user is deleted', max_length=150)),
+                ('action', models.CharField(choices=[('APPROVE', 'Approved request'), ('AUTO_APPROVE', 'Auto-approved request'), ('REJECT', 'Rejected request'), ('CHECKOUT', 'Checked out at the counter'), ('RETURN', 'Processed return'), ('DISPOSE', 'Disposed units'), ('MAINTENANCE', 'Created maintenance'), ('MAINTENANCE_UPDATE', 'Updated maintenance'), ('REPAIR', 'Marked repaired'), ('ASSET_CREATE', 'Created asset'), ('ASSET_EDIT', 'Edited asset'), ('STAFF_SAVE', 'Saved staff record')], max_length=30)),
+                ('object_type', models.CharField(blank=True, max_length=50)),
+                ('object_id', models.CharField(blank=True, max_length=50)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_entries', to=settings.AUTH_USER_MODEL)),
+                ('asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_entries', to='inventory.asset')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['actor', 'created_at'], name='audit_actor_time_idx'), models.Index(fields=['asset', 'created_at'], name='audit_asset_time_idx'), models.Index(fields=['created_at'], name='audit_time_idx')],
+            },
+        ),
+    ]
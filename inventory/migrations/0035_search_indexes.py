@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:14
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0034_auditlog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asset',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(django.db.models.functions.comparison.Collate('name', 'NOCASE'), name='category_name_nocase_idx'),
+        ),
+    ]
@@ -1,13 +1,93 @@
+import itertools
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce, Collate
 from django.utils import timezone  # Add this import
-import uuid
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
+    
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix search (admin, category autocomplete): SQLite only
+            # uses an index for LIKE 'abc%' when it is NOCASE-collated
+            models.Index(Collate('name', 'NOCASE'), name='category_name_nocase_idx'),
+        ]
+    
     def __str__(self): 
         return self.name
 
+class Location(models.Model):
+    """A storeroom that holds and lends stock"""
+    name = models.CharField(max_length=100, unique=True)
+    code = models.CharField(max_length=20, unique=True)
+    is_default = models.BooleanField(default=False, help_text='Receives new stock and records without a location')
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+def _open_quantity(model, **filters):
+    """Correlated SUM(quantity) of related records for the outer Asset row"""
+    totals = model.objects.filter(asset=models.OuterRef('pk'), **filters).order_by().values('asset').annotate(
+        total=models.Sum('quantity')
+    ).values('total')
+    return Coalesce(models.Subquery(totals), 0)
+
+# Open quantities memoized on Asset instances (see Asset._stock), in with_stock() annotation names
+STOCK_FIELDS = ('borrowed_qty', 'pending_qty', 'damaged_qty', 'maintenance_qty')
+
+# Write generation per asset id in this process; a memo taken before the last write is stale
+_stock_generations = itertools.count(1)
+_stock_written = {}
+
+def stock_written(asset_ids):
+    """Invalidate the memoized stock of every loaded instance of these assets"""
+    generation = next(_stock_generations)
+    for pk in asset_ids:
+        _stock_written[pk] = generation
+
+def prefetch_stock(assets):
+    """Memoize the stock of a list of Asset instances with one query"""
+    assets = [asset for asset in assets if asset.pk is not None]
+    if not assets:
+        return assets
+    # Generations are read before the query so a write racing with it is not missed
+    generations = {asset.pk: _stock_written.get(asset.pk, 0) for asset in assets}
+    rows = {row[0]: row[1:] for row in Asset.objects.filter(
+        pk__in=generations
+    ).with_stock().values_list('pk', *STOCK_FIELDS)}
+    for asset in assets:
+        asset._stock_memo = (generations[asset.pk], dict(zip(STOCK_FIELDS, rows.get(asset.pk, (0,) * 4))))
+    return assets
+
+class AssetQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Serials for the whole batch come from one block reservation
+        objs = list(objs)
+        missing = [obj for obj in objs if not obj.serial_number]
+        if missing:
+            from .serials import allocate
+            for obj, serial in zip(missing, allocate(len(missing))):
+                obj.serial_number = serial
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def with_stock(self):
+        """Annotate borrowed/pending/damaged/maintenance/available quantities in a single query"""
+        return self.annotate(
+            borrowed_qty=_open_quantity(BorrowRecord, status='APPROVED', is_returned=False),
+            pending_qty=_open_quantity(BorrowRecord, status='PENDING'),
+            damaged_qty=_open_quantity(DamagedItem, is_repaired=False),
+            maintenance_qty=_open_quantity(MaintenanceRecord, status__in=MaintenanceRecord.OPEN_STATUSES),
+        ).annotate(
+            available_qty=models.F('total_quantity') - (
+                models.F('borrowed_qty') + models.F('pending_qty') + models.F('damaged_qty') + models.F('maintenance_qty')
+            )
+        )
+
 class Asset(models.Model):
     STATUS_CHOICES = [
         ('AVAILABLE', 'Available'),
@@ -24,44 +104,127 @@ class Asset(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='AVAILABLE')
     image = models.ImageField(upload_to='media/assets/upload', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the asset or its stock changes; drives API ETags
+    stock_version = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    objects = AssetQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Catalog browsing: AVAILABLE assets by category, newest first
+            models.Index(fields=['status', 'category', 'created_at'], name='asset_status_category_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so manual edits can be written to the ledger
+        instance._loaded_total_quantity = instance.__dict__.get('total_quantity')
+        # with_stock() annotations are set after from_db; _stock() adopts them if nothing was written since
+        instance._stock_loaded = _stock_written.get(instance.pk, 0)
+        return instance
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('_stock_memo', None)
+    
+    def __getstate__(self):
+        # Generations are per process, so a memo must not travel with a pickled instance
+        state = super().__getstate__()
+        for key in ('_stock_memo', '_stock_loaded', *STOCK_FIELDS):
+            state.pop(key, None)
+        return state
     
     def save(self, *args, **kwargs):
         if not self.serial_number:
-            self.serial_number = f"AST-{uuid.uuid4().hex[:8].upper()}"
+            from .serials import allocate
+            self.serial_number = allocate()[0]
+        adding = self._state.adding
+        self.updated_at = timezone.now()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
         super().save(*args, **kwargs)
+        
+        from .ledger import record_movement
+        from .locations import adjust_stock, default_location_id
+        if adding:
+            record_movement(self.pk, 'RECEIVE', self.total_quantity, note='Asset created')
+            adjust_stock(self.pk, default_location_id(), on_hand=self.total_quantity)
+        else:
+            loaded = getattr(self, '_loaded_total_quantity', None)
+            if loaded is not None and loaded != self.total_quantity:
+                change = self.total_quantity - loaded
+                record_movement(self.pk, 'ADJUST', abs(change), delta=change, note='Total quantity edited')
+                # Manual edits of the global total land in the default storeroom
+                adjust_stock(self.pk, default_location_id(), on_hand=change)
+        self._loaded_total_quantity = self.total_quantity
     
     def __str__(self):
         return f"{self.name} ({self.serial_number})"
     
+    def _stock(self):
+        """Open borrowed/pending/damaged/maintenance quantities, loaded with one query and memoized
+        
+        Saving or deleting a borrow, damage or maintenance record of this asset
+        (in this process) makes the memo stale; bulk_create()/update() send no
+        signals, so call refresh_from_db() after those.
+        """
+        written = _stock_written.get(self.pk, 0)
+        memo = self.__dict__.get('_stock_memo')
+        if memo is None and all(field in self.__dict__ for field in STOCK_FIELDS):
+            memo = (self.__dict__.get('_stock_loaded', written), {field: self.__dict__[field] for field in STOCK_FIELDS})
+        if memo is None or memo[0] != written:
+            prefetch_stock([self])
+            memo = self._stock_memo
+        self._stock_memo = memo
+        return memo[1]
+    
     def get_borrowed_quantity(self):
         """Get total quantity currently borrowed (APPROVED and NOT returned only)"""
-        borrowed = BorrowRecord.objects.filter(
-            asset=self,
-            is_returned=False,
-            status='APPROVED'
-        ).aggregate(total=models.Sum('quantity'))['total'] or 0
-        return borrowed
+        return self._stock()['borrowed_qty']
     
     def get_pending_quantity(self):
         """Get total quantity in PENDING requests (for staff view only)"""
-        pending = BorrowRecord.objects.filter(
-            asset=self,
-            status='PENDING'
-        ).aggregate(total=models.Sum('quantity'))['total'] or 0
-        return pending
+        return self._stock()['pending_qty']
+    
+    def get_maintenance_quantity(self):
+        """Get total quantity in open (pending or in-progress) maintenance"""
+        return self._stock()['maintenance_qty']
     
     def get_available_quantity(self):
-        """Get available quantity for borrowing (deduct both APPROVED and PENDING requests, plus damaged items)"""
-        borrowed = self.get_borrowed_quantity()  # APPROVED only
-        pending = self.get_pending_quantity()     # PENDING only
-        damaged = self.damaged_items.filter(is_repaired=False).aggregate(total=models.Sum('quantity'))['total'] or 0
-        available = self.total_quantity - (borrowed + pending + damaged)
-        return available
+        """Get available quantity for borrowing (deduct APPROVED and PENDING requests, damaged items and open maintenance)"""
+        stock = self._stock()
+        return self.total_quantity - (stock['borrowed_qty'] + stock['pending_qty'] + stock['damaged_qty'] + stock['maintenance_qty'])
     
     def is_stock_available(self):
         """Check if any stock is available"""
         return self.get_available_quantity() > 0
 
+class StockLevel(models.Model):
+    """Per-location stock counters for one asset, updated with F() expressions"""
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_levels')
+    on_hand = models.IntegerField(default=0)
+    borrowed = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    damaged = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['asset', 'location'], name='unique_stock_level'),
+        ]
+        indexes = [
+            models.Index(fields=['location', 'asset'], name='stock_location_asset_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.asset.name} @ {self.location.name}: {self.available}/{self.on_hand}"
+    
+    @property
+    def available(self):
+        return self.on_hand - self.borrowed - self.pending - self.damaged
+
 class BorrowRecord(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending Approval'),
@@ -72,6 +235,7 @@ class BorrowRecord(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='borrow_records')
     asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='borrow_records')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='borrow_records')
     quantity = models.IntegerField(default=1)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     borrow_date = models.DateField(auto_now_add=True)
@@ -81,9 +245,45 @@ class BorrowRecord(models.Model):
     approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_borrow_records')
     rejection_reason = models.TextField(blank=True, null=True)
     
+    class Meta:
+        indexes = [
+            # Stock aggregates filter by asset and status/is_returned
+            models.Index(fields=['asset', 'status', 'is_returned'], name='borrow_asset_status_idx'),
+            models.Index(fields=['status', 'is_returned', 'borrow_date'], name='borrow_status_date_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - {self.asset.name} ({self.status})"
 
+class ArchivedBorrowRecord(models.Model):
+    """Closed (returned or rejected) BorrowRecord moved out of the hot table by `manage.py archive_borrows`"""
+    STATUS_CHOICES = BorrowRecord.STATUS_CHOICES
+    
+    # Keeps the original BorrowRecord id
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_borrow_records')
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='archived_borrow_records')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_borrow_records')
+    quantity = models.IntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    borrow_date = models.DateField()
+    approved_date = models.DateField(null=True, blank=True)
+    return_date = models.DateField(null=True, blank=True)
+    is_returned = models.BooleanField(default=False)
+    approved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_approved_borrow_records')
+    rejection_reason = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'borrow_date'], name='archived_borrow_user_idx'),
+            models.Index(fields=['asset', 'status'], name='archived_borrow_asset_idx'),
+            models.Index(fields=['status', 'is_returned', 'return_date'], name='archived_borrow_return_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.asset.name} ({self.status}, archived)"
+
 class DisposalRecord(models.Model):
     DISPOSAL_REASON_CHOICES = [
         ('DAMAGED', 'Damaged Beyond Repair'),
@@ -95,6 +295,7 @@ class DisposalRecord(models.Model):
     
     id = models.AutoField(primary_key=True)
     asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='disposal_records')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='disposal_records')
     quantity = models.IntegerField(default=1)
     reason = models.CharField(max_length=50, choices=DISPOSAL_REASON_CHOICES)
     description = models.TextField(blank=True, null=True)
@@ -123,6 +324,9 @@ class MaintenanceRecord(models.Model):
         ('CANCELLED', 'Cancelled'),
     ]
     
+    # Units in these states are out of service and not available for borrowing
+    OPEN_STATUSES = ['PENDING', 'IN_PROGRESS']
+    
     id = models.AutoField(primary_key=True)
     asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='maintenance_records')
     maintenance_type = models.CharField(max_length=20, choices=MAINTENANCE_TYPE_CHOICES)
@@ -161,6 +365,7 @@ class MaintenanceRecord(models.Model):
 class DamagedItem(models.Model):
     """Track items reported as damaged during returns"""
     asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='damaged_items')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='damaged_items')
     quantity = models.IntegerField(default=1)
     reported_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='damaged_items_reported')
     borrow_record = models.ForeignKey(BorrowRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='damaged_items')
@@ -174,4 +379,235 @@ class DamagedItem(models.Model):
         ordering = ['-reported_date']
     
     def __str__(self):
-        return f"{self.asset.name} - {self.quantity} units damaged on {self.reported_date}"
\ No newline at end of file
+        return f"{self.asset.name} - {self.quantity} units damaged on {self.reported_date}"
+
+class Job(models.Model):
+    """Background job stored in the database and executed by `manage.py run_worker`"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=200, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    priority = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            models.Index(fields=['kind', 'dedupe_key', 'status'], name='job_dedupe_idx'),
+            models.Index(fields=['locked_by'], name='job_locked_by_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class InventoryMovement(models.Model):
+    """Append-only ledger of every stock change; `delta` is the change in serviceable units on hand"""
+    KIND_CHOICES = [
+        ('RECEIVE', 'Received'),
+        ('ADJUST', 'Adjustment'),
+        ('REQUEST', 'Borrow Requested'),
+        ('REJECT', 'Request Rejected'),
+        ('CHECKOUT', 'Checked Out'),
+        ('RETURN', 'Returned'),
+        ('DAMAGE', 'Reported Damaged'),
+        ('REPAIR', 'Repaired'),
+        ('MAINT_OUT', 'Sent to Maintenance'),
+        ('MAINT_IN', 'Back from Maintenance'),
+        ('DISPOSE', 'Disposed'),
+    ]
+    
+    # Sign of the on-hand change per unit; requests only reserve, they don't move stock
+    DIRECTIONS = {
+        'RECEIVE': 1, 'ADJUST': 1, 'REQUEST': 0, 'REJECT': 0, 'CHECKOUT': -1, 'RETURN': 1,
+        'DAMAGE': -1, 'REPAIR': 1, 'MAINT_OUT': -1, 'MAINT_IN': 1, 'DISPOSE': -1,
+    }
+    
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    delta = models.IntegerField()
+    # Plain id rather than a ForeignKey so ledger rows never change when records are archived or deleted
+    borrow_record_id = models.IntegerField(null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory_movements')
+    note = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['asset', 'created_at'], name='movement_asset_created_idx'),
+            models.Index(fields=['asset', 'id'], name='movement_asset_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.asset_id} {self.kind} {self.delta:+d}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Inventory movements are append-only.')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError('Inventory movements are append-only.')
+
+class StockSnapshot(models.Model):
+    """Checkpoint of an asset's on-hand balance up to and including `movement_id`"""
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='stock_snapshots')
+    movement_id = models.BigIntegerField()
+    on_hand = models.IntegerField()
+    taken_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['asset', 'taken_at'], name='snapshot_asset_taken_idx'),
+            models.Index(fields=['asset', 'movement_id'], name='snapshot_asset_movement_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.asset_id} on hand {self.on_hand} at {self.taken_at}"
+
+class Reservation(models.Model):
+    """Booking of asset units for a future window [starts_at, ends_at)"""
+    STATUS_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('FULFILLED', 'Fulfilled'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField(default=1)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['starts_at']
+        indexes = [
+            # Overlap lookups: asset + status equality, then a range on starts_at
+            models.Index(fields=['asset', 'status', 'starts_at', 'ends_at'], name='reservation_window_idx'),
+            models.Index(fields=['user', 'status'], name='reservation_user_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(ends_at__gt=models.F('starts_at')), name='reservation_ends_after_start'),
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name='reservation_quantity_positive'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.asset.name} x{self.quantity} ({self.starts_at:%Y-%m-%d} to {self.ends_at:%Y-%m-%d})"
+
+
+class WaitlistEntry(models.Model):
+    """A user waiting for units of an asset; turned into a borrow request when stock frees up"""
+    STATUS_CHOICES = [
+        ('WAITING', 'Waiting'),
+        ('ALLOCATED', 'Allocated'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='waitlist_entries')
+    quantity = models.IntegerField(default=1)
+    priority = models.IntegerField(default=0, help_text='Higher priorities are served first; equal ones in joining order')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='WAITING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    allocated_at = models.DateTimeField(null=True, blank=True)
+    borrow_record = models.OneToOneField(BorrowRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry')
+    
+    class Meta:
+        ordering = ['-priority', 'created_at']
+        indexes = [
+            models.Index(fields=['asset', 'status'], name='waitlist_asset_status_idx'),
+            models.Index(fields=['user', 'status'], name='waitlist_user_status_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name='waitlist_quantity_positive'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.asset.name} x{self.quantity} ({self.status})"
+
+class ApprovalRule(models.Model):
+    """Limits within which borrow requests are approved without staff review; see inventory/approvals.py"""
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='approval_rule',
+                                    help_text='Leave empty for the rule covering every category without its own rule')
+    max_quantity = models.PositiveIntegerField(default=1, help_text='Largest quantity approved automatically per request')
+    max_open_per_user = models.PositiveIntegerField(default=3, help_text="Open borrowings a user may hold, including the approved one")
+    min_headroom = models.PositiveIntegerField(default=1, help_text='Units that must stay available after approval')
+    is_active = models.BooleanField(default=True)
+    
+    def __str__(self):
+        return f"Auto-approve {self.category.name if self.category else 'any category'}: up to {self.max_quantity}"
+
+class AuditLog(models.Model):
+    """One staff (or automatic) action; written in batches by inventory/audit.py"""
+    ACTION_CHOICES = [
+        ('APPROVE', 'Approved request'),
+        ('AUTO_APPROVE', 'Auto-approved request'),
+        ('REJECT', 'Rejected request'),
+        ('CHECKOUT', 'Checked out at the counter'),
+        ('RETURN', 'Processed return'),
+        ('DISPOSE', 'Disposed units'),
+        ('MAINTENANCE', 'Created maintenance'),
+        ('MAINTENANCE_UPDATE', 'Updated maintenance'),
+        ('REPAIR', 'Marked repaired'),
+        ('ASSET_CREATE', 'Created asset'),
+        ('ASSET_EDIT', 'Edited asset'),
+        ('STAFF_SAVE', 'Saved staff record'),
+    ]
+    
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_entries')
+    actor_name = models.CharField(max_length=150, blank=True, help_text='Username at the time; kept if the user is deleted')
+    action = models.CharField(max_length=30, choices=ACTION_CHOICES)
+    asset = models.ForeignKey(Asset, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_entries')
+    object_type = models.CharField(max_length=50, blank=True)
+    object_id = models.CharField(max_length=50, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['actor', 'created_at'], name='audit_actor_time_idx'),
+            models.Index(fields=['asset', 'created_at'], name='audit_asset_time_idx'),
+            models.Index(fields=['created_at'], name='audit_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} {self.actor_name or 'system'}: {self.get_action_display()}"
+
+class SerialCounter(models.Model):
+    """Next free number of a serial series (AST, or a legacy prefix such as TV); see inventory/serials.py"""
+    name = models.CharField(max_length=20, unique=True)
+    next_value = models.BigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.name} -> {self.next_value}"
+
+class CatalogVersion(models.Model):
+    """Monotonic version stamp for a slice of data (e.g. the whole catalog), used for HTTP validators and caches"""
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,73 @@
+"""
+Asset.status reconciliation.
+
+The status shown in the catalog is derived from stock, never set by hand:
+
+* DISPOSED  - no units left on the books (total_quantity <= 0)
+* AVAILABLE - at least one unit can be borrowed
+* REPAIR    - every remaining unit is damaged or in open maintenance
+* BORROWED  - otherwise (all in-service units are borrowed or requested)
+
+``reconcile_assets()`` computes this for any set of assets with one annotated
+query (``Asset.objects.with_stock()``) and writes all changes with one UPDATE.
+"""
+from django.db.models import Case, Value, When
+
+from .models import Asset
+from .versioning import bump_assets
+
+
+def expected_status(total, available, out_of_service):
+    """Status an asset should have for the given stock figures"""
+    if total <= 0:
+        return 'DISPOSED'
+    if available > 0:
+        return 'AVAILABLE'
+    if total - out_of_service <= 0:
+        return 'REPAIR'
+    return 'BORROWED'
+
+
+def reconcile_assets(asset_ids=None, dry_run=False):
+    """Bring Asset.status in line with stock; returns {asset_id: (old, new)} for changed rows"""
+    assets = Asset.objects.with_stock()
+    if asset_ids is not None:
+        asset_ids = list(asset_ids)
+        if not asset_ids:
+            return {}
+        assets = assets.filter(pk__in=asset_ids)
+
+    rows = assets.order_by().values_list(
+        'pk', 'status', 'total_quantity', 'available_qty', 'damaged_qty', 'maintenance_qty'
+    )
+    changes = {}
+    for pk, status, total, available, damaged, maintenance in rows:
+        new_status = expected_status(total, available, damaged + maintenance)
+        if new_status != status:
+            changes[pk] = (status, new_status)
+
+    if changes and not dry_run:
+        by_status = {}
+        for pk, (_, new_status) in changes.items():
+            by_status.setdefault(new_status, []).append(pk)
+        Asset.objects.filter(pk__in=changes.keys()).update(
+            status=Case(
+                *[When(pk__in=pks, then=Value(new_status)) for new_status, pks in by_status.items()],
+                default='status',
+            )
+        )
+        bump_assets(changes.keys())
+    return changes
+
+
+def reconcile_all(chunk_size=500, dry_run=False):
+    """Reconcile the whole catalog in primary-key chunks; yields each chunk's changes"""
+    last_pk = 0
+    while True:
+        ids = list(
+            Asset.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        yield reconcile_assets(ids, dry_run=dry_run)
+        last_pk = ids[-1]
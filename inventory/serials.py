@@ -0,0 +1,115 @@
+"""
+Serial number allocation.
+
+New assets get serials like ``AST-0000042-2``: a sequence number from a
+``SerialCounter`` row plus a Luhn check digit, so a mistyped serial is
+recognised as invalid instead of matching another asset. Each process
+reserves a block of ``SERIAL_BLOCK_SIZE`` numbers with one UPDATE and hands
+them out from memory; bulk creation reserves the whole batch at once. A
+block reserved inside a transaction only joins the pool once it commits
+(on rollback the counter rolls back too, so the block must not be reused).
+Numbers left in a pool when a process exits are simply never used.
+
+Legacy serials stay valid and cannot collide with the new shape: the random
+``AST-1A2B3C4D`` values assigned before, and prefix-numbered ones such as
+``TV001`` or ``CHAIR001`` from update_assets.py. ``allocate(prefix='CHAIR')``
+continues such a series (``CHAIR002``); every series is seeded from the
+highest number already in use.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Asset, SerialCounter
+
+DEFAULT_PREFIX = 'AST'
+
+SERIAL_RE = re.compile(r'^AST-(\d{7,})-(\d)$')
+LEGACY_RANDOM_RE = re.compile(r'^AST-[0-9A-F]{8}$')
+LEGACY_PREFIXED_RE = re.compile(r'^([A-Z]+)(\d+)$')
+
+_pools = {}  # prefix -> (next number, end of block)
+_lock = threading.Lock()
+
+
+def check_digit(number):
+    """Luhn check digit for a sequence number"""
+    total = 0
+    for index, digit in enumerate(reversed(str(number))):
+        value = int(digit)
+        if index % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return (10 - total % 10) % 10
+
+
+def format_serial(prefix, number):
+    if prefix == DEFAULT_PREFIX:
+        return f'AST-{number:07d}-{check_digit(number)}'
+    return f'{prefix}{number:03d}'
+
+
+def is_valid_serial(serial):
+    """True for well-formed serials: current ones with a correct check digit, or a legacy format"""
+    match = SERIAL_RE.match(serial)
+    if match:
+        return check_digit(int(match[1])) == int(match[2])
+    return bool(LEGACY_RANDOM_RE.match(serial) or LEGACY_PREFIXED_RE.match(serial))
+
+
+def sequence_number(serial, prefix=DEFAULT_PREFIX):
+    """Position of a serial within a series, or None if it is not part of it"""
+    if prefix == DEFAULT_PREFIX:
+        match = SERIAL_RE.match(serial)
+        return int(match[1]) if match else None
+    match = LEGACY_PREFIXED_RE.match(serial)
+    return int(match[2]) if match and match[1] == prefix else None
+
+
+def _highest_in_use(prefix):
+    serials = Asset.objects.filter(serial_number__startswith=prefix).values_list('serial_number', flat=True)
+    return max(filter(None, (sequence_number(serial, prefix) for serial in serials.iterator())), default=0)
+
+
+def reserve(prefix, size):
+    """Reserve `size` consecutive numbers of a series; returns the first one"""
+    with transaction.atomic():
+        if not SerialCounter.objects.filter(name=prefix).update(next_value=F('next_value') + size):
+            SerialCounter.objects.get_or_create(name=prefix, defaults={'next_value': _highest_in_use(prefix) + 1})
+            SerialCounter.objects.filter(name=prefix).update(next_value=F('next_value') + size)
+        end = SerialCounter.objects.filter(name=prefix).values_list('next_value', flat=True).get()
+    return end - size
+
+
+def _release(prefix, block):
+    """Make the unused rest of a block available to this process"""
+    with _lock:
+        start, end = _pools.get(prefix, (0, 0))
+        if start >= end:
+            _pools[prefix] = block
+
+
+def allocate(count=1, prefix=DEFAULT_PREFIX):
+    """`count` new serial numbers of a series"""
+    with _lock:
+        start, end = _pools.get(prefix, (0, 0))
+        taken = min(count, max(end - start, 0))
+        numbers = list(range(start, start + taken))
+        _pools[prefix] = (start + taken, end)
+
+    missing = count - taken
+    if missing:
+        size = max(missing, getattr(settings, 'SERIAL_BLOCK_SIZE', 50))
+        first = reserve(prefix, size)
+        numbers.extend(range(first, first + missing))
+        rest = (first + missing, first + size)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: _release(prefix, rest))
+        else:
+            _release(prefix, rest)
+    return [format_serial(prefix, number) for number in numbers]
@@ -0,0 +1,215 @@
+"""
+Borrow lifecycle operations shared by the staff pages and the counter.
+
+``approve()`` and ``mark_returned()`` change one record together with its
+ledger movement and storeroom counters; callers own the transaction.
+
+The counter (``checkout_basket()`` / ``return_basket()``) takes a basket of
+scanned serial numbers - one scan per unit - resolves them with a single
+query on the unique serial index, validates the whole basket and then writes
+it in one transaction, so either every item is processed or none is.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import waitlist
+from .availability import reserved_now_by_asset
+from .jobs import enqueue
+from .ledger import record_movement
+from .locations import adjust_stock, available_at, best_location_id
+from .models import Asset, BorrowRecord, DamagedItem, stock_written
+from .reconcile import reconcile_assets
+from .serials import is_valid_serial
+from .versioning import bump_assets, deferred_bumps
+
+
+class BasketError(Exception):
+    """The basket cannot be processed as a whole; `errors` lists every problem"""
+
+    def __init__(self, errors, unknown=()):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+        self.unknown = list(unknown)
+
+
+def approve(record, staff):
+    """Turn a PENDING request into a checkout"""
+    record.status = 'APPROVED'
+    record.approved_by = staff
+    record.approved_date = timezone.now().date()
+    record.save()
+    record_movement(record.asset_id, 'CHECKOUT', record.quantity, user=staff, borrow_record_id=record.pk)
+    adjust_stock(record.asset_id, record.location_id, pending=-record.quantity, borrowed=record.quantity)
+
+
+class AlreadyReturned(BasketError):
+    """The borrowing is not open (any more), e.g. a repeated or concurrent return"""
+
+    def __init__(self, record):
+        super().__init__([f'Borrowing #{record.pk} is not open; it was already returned.'])
+
+
+def mark_returned(record, user, damaged=0, notes=''):
+    """Close an open borrowing; `damaged` units come back as a DamagedItem (returned)
+
+    Raises AlreadyReturned unless the record is still an open borrowing.
+    """
+    return_date = timezone.now().date()
+    # A conditional UPDATE claims the record, so a second return of it cannot write anything
+    claimed = BorrowRecord.objects.filter(pk=record.pk, status='APPROVED', is_returned=False).update(
+        is_returned=True, return_date=return_date
+    )
+    if not claimed:
+        raise AlreadyReturned(record)
+    record.is_returned = True
+    record.return_date = return_date
+    # update() sends no post_save: invalidate what the stock signal would have
+    stock_written([record.asset_id])
+    bump_assets([record.asset_id])
+    record_movement(record.asset_id, 'RETURN', record.quantity, user=user, borrow_record_id=record.pk)
+    adjust_stock(record.asset_id, record.location_id, borrowed=-record.quantity, damaged=damaged)
+
+    damage = None
+    if damaged:
+        damage = DamagedItem.objects.create(
+            asset_id=record.asset_id,
+            location_id=record.location_id,
+            quantity=damaged,
+            reported_by=user,
+            borrow_record=record,
+            description=notes,
+        )
+        record_movement(record.asset_id, 'DAMAGE', damaged, user=user, borrow_record_id=record.pk, note=notes)
+
+    # Asset status is refreshed by the background worker
+    enqueue('inventory.refresh_asset_status', {'asset_id': record.asset_id}, dedupe_key=f'asset:{record.asset_id}')
+    return damage
+
+
+def resolve_serials(serials):
+    """{serial: asset} for the scanned serials (one query) and the list of unknown serials"""
+    wanted = {serial.strip() for serial in serials if serial.strip()}
+    assets = {
+        asset.serial_number: asset
+        for asset in Asset.objects.with_stock().select_related('category').filter(serial_number__in=wanted)
+    }
+    return assets, sorted(wanted - set(assets))
+
+
+def _scans(items):
+    """Normalize items ("SERIAL" or {"serial": .., "damaged": ..}) to [(serial, damaged)]"""
+    scans = []
+    for item in items:
+        if isinstance(item, dict):
+            scans.append((str(item.get('serial', '')).strip(), bool(item.get('damaged'))))
+        else:
+            scans.append((str(item).strip(), False))
+    return [(serial, damaged) for serial, damaged in scans if serial]
+
+
+def _resolve_basket(items):
+    scans = _scans(items)
+    if not scans:
+        raise BasketError(['The basket is empty.'])
+    assets, unknown = resolve_serials(serial for serial, _ in scans)
+    if unknown:
+        raise BasketError([
+            f'Unknown serial number: {serial}' if is_valid_serial(serial) else f'Misread or mistyped serial number: {serial}'
+            for serial in unknown
+        ], unknown)
+    units = Counter(serial for serial, _ in scans)
+    damaged = Counter(serial for serial, is_damaged in scans if is_damaged)
+    return assets, units, damaged
+
+
+def checkout_basket(borrower, items, staff):
+    """Hand every scanned unit to `borrower`; returns the approved records
+
+    The borrower's pending requests for a scanned asset are approved first
+    (if they fit the scanned units); the rest becomes a new checkout.
+    """
+    with transaction.atomic():
+        assets, units, _ = _resolve_basket(items)
+        pending = {}
+        for record in (BorrowRecord.objects.select_for_update()
+                       .filter(user=borrower, status='PENDING', asset__in=assets.values())
+                       .select_related('user', 'asset').order_by('borrow_date', 'pk')):
+            pending.setdefault(record.asset_id, []).append(record)
+        # Units booked by someone else for right now are not available, as in borrow_asset
+        reserved = reserved_now_by_asset([asset.pk for asset in assets.values()], exclude_user=borrower)
+
+        plan, errors = [], []
+        for serial, count in units.items():
+            asset = assets[serial]
+            to_approve = []
+            for record in pending.get(asset.pk, []):
+                if record.quantity <= count:
+                    to_approve.append(record)
+                    count -= record.quantity
+            location_id = best_location_id(asset.pk) if count else None
+            available = asset.available_qty - reserved[asset.pk]
+            if count and (count > available or count > available_at(asset.pk, location_id)):
+                errors.append(f'{asset.name} ({serial}): only {max(available, 0)} unit(s) available')
+            plan.append((asset, to_approve, count, location_id))
+        if errors:
+            raise BasketError(errors)
+
+        records = []
+        with deferred_bumps():
+            for asset, to_approve, count, location_id in plan:
+                for record in to_approve:
+                    approve(record, staff)
+                    records.append(record)
+                if count:
+                    record = BorrowRecord.objects.create(
+                        user=borrower, asset=asset, location_id=location_id, quantity=count,
+                        status='APPROVED', approved_by=staff, approved_date=timezone.now().date(),
+                    )
+                    record_movement(asset.pk, 'CHECKOUT', count, user=staff, borrow_record_id=record.pk)
+                    adjust_stock(asset.pk, location_id, borrowed=count)
+                    records.append(record)
+        reconcile_assets([asset.pk for asset in assets.values()])
+    return records
+
+
+def return_basket(items, staff, borrower=None, notes=''):
+    """Close the open borrowings covering every scanned unit; returns the returned records
+
+    Scanned units are matched to open borrowings oldest first (only
+    `borrower`'s if given). A borrowing is returned as a whole, so the scans
+    must add up to complete borrowings. Units scanned as damaged are
+    recorded as damaged on the returned borrowings.
+    """
+    with transaction.atomic():
+        assets, units, damaged = _resolve_basket(items)
+        open_records = BorrowRecord.objects.select_for_update().filter(
+            status='APPROVED', is_returned=False, asset__in=assets.values()
+        ).select_related('user', 'asset').order_by('borrow_date', 'pk')
+        if borrower is not None:
+            open_records = open_records.filter(user=borrower)
+        by_asset = {}
+        for record in open_records:
+            by_asset.setdefault(record.asset_id, []).append(record)
+
+        plan, errors = [], []
+        for serial, count in units.items():
+            asset = assets[serial]
+            remaining = count
+            for record in by_asset.get(asset.pk, []):
+                if record.quantity <= remaining:
+                    plan.append((record, serial))
+                    remaining -= record.quantity
+            if remaining:
+                errors.append(f'{asset.name} ({serial}): {remaining} scanned unit(s) do not match a whole open borrowing')
+        if errors:
+            raise BasketError(errors)
+
+        with deferred_bumps():
+            for record, serial in plan:
+                units_damaged = min(damaged[serial], record.quantity)
+                damaged[serial] -= units_damaged
+                mark_returned(record, staff, damaged=units_damaged, notes=notes)
+        waitlist.allocate([asset.pk for asset in assets.values()])
+    return [record for record, _ in plan]
@@ -0,0 +1,65 @@
+"""Keep version stamps (and the autocomplete index) current whenever catalog or stock data is written"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete
+from .approvals import RULES
+from .models import ApprovalRule, Asset, BorrowRecord, Category, DamagedItem, DisposalRecord, MaintenanceRecord, Reservation, stock_written
+from .versioning import bump, bump_assets
+
+
+@receiver([post_save, post_delete], sender=BorrowRecord)
+@receiver([post_save, post_delete], sender=DamagedItem)
+@receiver([post_save, post_delete], sender=DisposalRecord)
+@receiver([post_save, post_delete], sender=MaintenanceRecord)
+@receiver([post_save, post_delete], sender=Reservation)
+def stock_record_changed(sender, instance, **kwargs):
+    stock_written([instance.asset_id])
+    bump_assets([instance.asset_id])
+
+
+@receiver([post_save, post_delete], sender=Asset)
+def asset_changed(sender, instance, **kwargs):
+    # Asset.save() refreshes its own updated_at, so only the catalog stamp needs a bump
+    bump()
+
+
+@receiver(post_save, sender=Category)
+def category_changed(sender, instance, created, **kwargs):
+    if created:
+        bump()
+    else:
+        # Asset representations embed the category name
+        bump_assets(Asset.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    bump()
+
+
+@receiver([post_save, post_delete], sender=ApprovalRule)
+def approval_rule_changed(sender, instance, **kwargs):
+    # Processes recompile their rules once they see the new stamp
+    bump(RULES)
+
+
+@receiver(post_save, sender=Asset)
+def index_asset(sender, instance, **kwargs):
+    values = (instance.pk, instance.name, instance.serial_number, instance.status)
+    transaction.on_commit(lambda: autocomplete.asset_changed(*values))
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    values = (instance.pk, instance.name)
+    transaction.on_commit(lambda: autocomplete.category_changed(*values))
+
+
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=Category)
+def unindex(sender, instance, **kwargs):
+    kind = 'asset' if sender is Asset else 'category'
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.removed(kind, pk))
@@ -0,0 +1,74 @@
+"""
+Content-addressed media storage.
+
+Uploaded files are stored as ``<upload_to>/<sha[:2]>/<sha256><ext>``, so the
+same photo uploaded for many assets exists on disk once and a stored name
+never changes meaning. That makes hashed names safe to serve with far-future
+cache headers (see ``views.serve_media``).
+
+Uploads are streamed chunk by chunk into a temporary file under
+``<MEDIA_ROOT>/.incoming`` while being hashed, then moved into place with an
+atomic rename. Files are never deleted when a model row goes away; run
+``manage.py gc_media`` to remove files nothing refers to any more.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+INCOMING_DIR = '.incoming'
+HASHED_NAME = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})(\.[A-Za-z0-9]+)?$')
+
+
+def is_hashed_name(name):
+    """True for names produced by ContentAddressedStorage (immutable content)"""
+    return bool(HASHED_NAME.search(name or ''))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save(); identical
+        # content means an identical file, so there is nothing to avoid.
+        return name
+
+    def _save(self, name, content):
+        incoming = os.path.join(self.location, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek') and content.seekable():
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            sha = digest.hexdigest()
+            directory, filename = posixpath.split(name.replace('\\', '/'))
+            extension = os.path.splitext(filename)[1].lower()
+            name = posixpath.join(directory, sha[:2], sha + extension)
+            full_path = self.path(name)
+
+            if os.path.exists(full_path):
+                os.remove(temp_path)  # Already stored: deduplicated
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
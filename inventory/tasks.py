@@ -0,0 +1,59 @@
+"""Background job handlers for the inventory app (see inventory/jobs.py)"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .approvals import auto_approve
+from .jobs import task
+from .models import Asset
+from .reconcile import reconcile_assets
+from .versioning import bump_assets
+
+
+@task('inventory.refresh_asset_status', batch=True)
+def refresh_asset_status(payloads):
+    """Reconcile Asset.status for every asset touched by the batched jobs"""
+    reconcile_assets({payload['asset_id'] for payload in payloads})
+
+
+@task('inventory.auto_approve', batch=True)
+def auto_approve_requests(payloads):
+    """Apply the auto-approval rules to the newly submitted borrow requests"""
+    auto_approve([payload['record_id'] for payload in payloads])
+
+
+@task('inventory.process_asset_image')
+def process_asset_image(payload):
+    """Normalize orientation and downscale oversized asset photos"""
+    from PIL import Image, ImageOps
+
+    asset = Asset.objects.filter(pk=payload['asset_id']).first()
+    if asset is None or not asset.image:
+        return
+
+    max_size = getattr(settings, 'ASSET_IMAGE_MAX_SIZE', 1600)
+    with asset.image.open('rb') as source:
+        image = Image.open(source)
+        image_format = image.format or 'JPEG'
+        image.load()
+
+    transposed = ImageOps.exif_transpose(image)
+    if transposed is image and max(image.size) <= max_size:
+        return  # Nothing to do
+
+    transposed.thumbnail((max_size, max_size))
+    if image_format == 'JPEG' and transposed.mode not in ('RGB', 'L'):
+        transposed = transposed.convert('RGB')
+
+    buffer = BytesIO()
+    transposed.save(buffer, format=image_format, quality=85, optimize=True)
+
+    old_name = asset.image.name
+    asset.image.save(os.path.basename(old_name), ContentFile(buffer.getvalue()), save=False)
+    Asset.objects.filter(pk=asset.pk).update(image=asset.image.name)
+    bump_assets([asset.pk])
+
+    if old_name != asset.image.name and not Asset.objects.filter(image=old_name).exists():
+        asset.image.storage.delete(old_name)
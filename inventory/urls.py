@@ -1,23 +1,44 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('assets/', views.asset_list, name='asset_list'),
     path('borrow/<int:pk>/', views.borrow_asset, name='borrow_asset'),
     path('return/<int:pk>/', views.return_asset, name='return_asset'),
     path('my-borrowings/', views.my_borrowings, name='my_borrowings'),
+    path('reserve/<int:pk>/', views.reserve_asset, name='reserve_asset'),
+    path('reservations/<int:pk>/cancel/', views.cancel_reservation, name='cancel_reservation'),
+    path('waitlist/<int:pk>/join/', views.join_waitlist, name='join_waitlist'),
+    path('waitlist/<int:pk>/leave/', views.leave_waitlist, name='leave_waitlist'),
+    
+    # Read-only JSON API
+    path('api/assets/', api.asset_list, name='api_asset_list'),
+    path('api/assets/<int:pk>/', api.asset_detail, name='api_asset_detail'),
+    path('api/assets/<int:pk>/availability/', api.asset_availability, name='api_asset_availability'),
+    path('api/categories/', api.category_list, name='api_category_list'),
+    path('api/categories/<int:category_id>/calendar/', api.category_availability_calendar, name='api_category_calendar'),
+    path('api/autocomplete/', api.autocomplete, name='api_autocomplete'),
     
     # Staff URLs
     path('staff/dashboard/', views.staff_dashboard, name='staff_dashboard'),
     path('staff/manage-assets/', views.staff_manage_assets, name='staff_manage_assets'),
     path('staff/reports/', views.staff_reports, name='staff_reports'),
+    path('staff/reports/export/', views.staff_export_borrows, name='staff_export_borrows'),
+    path('staff/reports/analytics/', views.staff_analytics, name='staff_analytics'),
+    path('staff/reports/audit/', views.staff_audit_log, name='staff_audit_log'),
     path('staff/manage-requests/', views.staff_manage_requests, name='staff_manage_requests'),
     path('staff/approve/<int:pk>/', views.staff_approve_request, name='staff_approve_request'),
     path('staff/reject/<int:pk>/', views.staff_reject_request, name='staff_reject_request'),
     path('staff/manage-returns/', views.staff_manage_returns, name='staff_manage_returns'),
     path('staff/process-return/<int:pk>/', views.staff_process_return, name='staff_process_return'),
+    path('staff/counter/', views.staff_counter, name='staff_counter'),
+    path('staff/counter/api/', views.staff_counter_api, name='staff_counter_api'),
+    path('staff/assets/<int:pk>/code.svg', views.staff_asset_code, name='staff_asset_code'),
+    path('staff/assets/labels/', views.staff_asset_labels, name='staff_asset_labels'),
     path('staff/disposal/<int:asset_id>/', views.staff_dispose_asset, name='staff_dispose_asset'),
     path('staff/disposal/list/', views.staff_disposal_list, name='staff_disposal_list'),
+    path('staff/profiles/', views.staff_profiles, name='staff_profiles'),
+    path('staff/profiles/<str:filename>', views.staff_profile_file, name='staff_profile_file'),
     # Maintenance URLs
     path('staff/maintenance/', views.staff_maintenance_list, name='staff_maintenance_list'),
     path('staff/maintenance/create/<int:asset_id>/', views.staff_create_maintenance, name='staff_create_maintenance'),
@@ -0,0 +1,84 @@
+"""
+Cheap version stamps for conditional GETs and caches.
+
+Writes bump a single CatalogVersion row (and the touched assets'
+``stock_version``) in the same transaction, so readers can tell whether
+anything changed with one indexed lookup instead of re-running the query.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Asset, CatalogVersion
+
+CATALOG = 'catalog'
+
+_deferred = threading.local()
+
+
+def _cache_key(name):
+    return f'version:{name}'
+
+
+def bump(name=CATALOG):
+    """Increment a named version stamp"""
+    now = timezone.now()
+    if not CatalogVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=now):
+        CatalogVersion.objects.get_or_create(name=name, defaults={'version': 1, 'updated_at': now})
+    # Readers of the cached stamp see the new version as soon as the write is visible
+    transaction.on_commit(lambda: cache.delete(_cache_key(name)))
+
+
+@contextmanager
+def deferred_bumps():
+    """Collect asset bumps made inside the block and apply them as one UPDATE at the end"""
+    if getattr(_deferred, 'asset_ids', None) is not None:
+        yield  # Already deferring in an outer block
+        return
+    _deferred.asset_ids = set()
+    try:
+        yield
+    finally:
+        asset_ids, _deferred.asset_ids = _deferred.asset_ids, None
+    if asset_ids:
+        bump_assets(asset_ids)
+
+
+def bump_assets(asset_ids):
+    """Increment the per-asset stamp of every given asset, plus the catalog stamp"""
+    asset_ids = [pk for pk in asset_ids if pk is not None]
+    pending = getattr(_deferred, 'asset_ids', None)
+    if pending is not None:
+        pending.update(asset_ids)
+        return
+    if asset_ids:
+        Asset.objects.filter(pk__in=asset_ids).update(
+            stock_version=F('stock_version') + 1, updated_at=timezone.now()
+        )
+    bump(CATALOG)
+
+
+def get_version(name=CATALOG):
+    """(version, updated_at) for a named stamp; (0, None) if it was never bumped"""
+    # Always the primary: a lagging replica stamp would be cached for every page, facet and ETag
+    row = CatalogVersion.objects.using(DEFAULT_DB_ALIAS).filter(name=name).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def get_cached_version(name=CATALOG):
+    """Like get_version() but served from the cache for up to VERSION_CACHE_SECONDS.
+
+    With a shared cache a bump is visible everywhere immediately; with a
+    per-process cache other processes notice it within the timeout.
+    """
+    key = _cache_key(name)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = get_version(name)
+        cache.set(key, stamp, getattr(settings, 'VERSION_CACHE_SECONDS', 5))
+    return stamp
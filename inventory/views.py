@@ -1,27 +1,44 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Asset, BorrowRecord, DisposalRecord, MaintenanceRecord, DamagedItem
+from .models import Asset, BorrowRecord, DisposalRecord, MaintenanceRecord, DamagedItem, Reservation, Category, ArchivedBorrowRecord, WaitlistEntry, AuditLog, prefetch_stock
+from .cache import cache_anonymous_page
+from .reconcile import reconcile_assets
+from .ledger import record_movement
+from .locations import adjust_stock, available_at, best_location_id, stock_levels
+from .archive import borrow_count_subquery, count_both, merged
+from .availability import free_units, reserved_now
+from . import analytics, approvals, audit, services, waitlist
+from .barcodes import asset_code_svg
+from .facets import apply_filters, facets, parse_filters, searched_assets
+from .storage import INCOMING_DIR, is_hashed_name
+from rezo.profiling import profile_dir, recent_profiles
+from rezo.replicas import read_alias, replica_reads
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, Q, Count
-from datetime import timedelta
-from django.http import HttpResponseForbidden 
+from django.db import transaction
+from django.db.models import Sum, Q, Count, F
+from datetime import datetime, timedelta
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+import csv
+import json
+import mimetypes
+import os
 import uuid
 
 # 1. READ: List all available assets
+@cache_anonymous_page
 def asset_list(request):
-    """Display available assets with pagination"""
-    assets = Asset.objects.filter(status='AVAILABLE').order_by('-created_at')
-    
-    # Search functionality
+    """Display available assets with facet filters and pagination"""
     search_query = request.GET.get('search', '')
-    if search_query:
-        assets = assets.filter(
-            Q(name__icontains=search_query) | 
-            Q(serial_number__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+    filters = parse_filters(request.GET)
+    assets = apply_filters(searched_assets(search_query), filters).select_related('category').order_by('-created_at')
     
     # Pagination - 6 assets per page
     paginator = Paginator(assets, 6)
@@ -37,6 +54,8 @@ def asset_list(request):
     context = {
         'assets': assets_page,
         'search_query': search_query,
+        'filters': filters,
+        'facets': facets(search_query, filters),
     }
     return render(request, 'inventory/asset_list.html', context)
 
@@ -45,47 +64,77 @@ def asset_list(request):
 def borrow_asset(request, pk):
     asset = get_object_or_404(Asset, pk=pk)
     
+    context = {'asset': asset, 'stock_levels': stock_levels(asset.pk)}
+    
     if request.method == 'POST':
         quantity = int(request.POST.get('quantity', 1))
+        location_id = int(request.POST.get('location') or best_location_id(asset.pk))
         
         # Validate quantity
         if quantity < 1:
             messages.error(request, 'Quantity must be at least 1.')
-            return render(request, 'inventory/confirm_borrow.html', {'asset': asset})
+            return render(request, 'inventory/confirm_borrow.html', context)
         
-        # Check available stock
-        available_qty = asset.get_available_quantity()
+        # Check available stock (units booked by other users right now are not available)
+        available_qty = asset.get_available_quantity() - reserved_now(asset, exclude_user=request.user)
         if quantity > available_qty:
             messages.error(request, f'Not enough stock. Only {available_qty} item(s) available.')
-            return render(request, 'inventory/confirm_borrow.html', {'asset': asset})
+            # Offer a place on the waitlist instead
+            context['waitlist_quantity'] = quantity if quantity <= asset.total_quantity else None
+            return render(request, 'inventory/confirm_borrow.html', context)
+        
+        # ...and the chosen storeroom must hold enough of it
+        location_qty = available_at(asset.pk, location_id)
+        if quantity > location_qty:
+            messages.error(request, f'Only {location_qty} item(s) available at that location.')
+            return render(request, 'inventory/confirm_borrow.html', context)
         
         # Create borrow REQUEST (PENDING status) - NOT automatically approved
-        BorrowRecord.objects.create(
-            user=request.user,
-            asset=asset,
-            quantity=quantity,
-            status='PENDING',  # This is the key - must be PENDING
-            is_returned=False
-        )
+        with transaction.atomic():
+            borrow_record = BorrowRecord.objects.create(
+                user=request.user,
+                asset=asset,
+                location_id=location_id,
+                quantity=quantity,
+                status='PENDING',  # This is the key - must be PENDING
+                is_returned=False
+            )
+            record_movement(asset.pk, 'REQUEST', quantity, user=request.user, borrow_record_id=borrow_record.pk)
+            adjust_stock(asset.pk, location_id, pending=quantity)
+            reconcile_assets([asset.pk])
+            approvals.queue_evaluation(borrow_record)
+            
+            # A running reservation is picked up by this request
+            now = timezone.now()
+            Reservation.objects.filter(
+                user=request.user, asset=asset, status='ACTIVE', starts_at__lte=now, ends_at__gt=now
+            ).update(status='FULFILLED')
         
         messages.success(request, f'Your request to borrow {quantity} x {asset.name} has been submitted. Please wait for staff approval.')
         return redirect('my_borrowings')  # Redirect to my_borrowings so user can see their pending request
 
-    return render(request, 'inventory/confirm_borrow.html', {'asset': asset})
+    return render(request, 'inventory/confirm_borrow.html', context)
 
 # 3. READ: List user's borrowings
 @login_required
 def my_borrowings(request):
     # Get ALL borrow records for this user
-    all_borrowings = BorrowRecord.objects.filter(user=request.user).order_by('-borrow_date')
+    all_borrowings = BorrowRecord.objects.filter(user=request.user).select_related('asset').order_by('-borrow_date')
     
     # Separate by status
     pending_borrowings = all_borrowings.filter(status='PENDING')
     approved_borrowings = all_borrowings.filter(status='APPROVED', is_returned=False)
-    rejected_borrowings = all_borrowings.filter(status='REJECTED')
-    returned_borrowings = all_borrowings.filter(status='APPROVED', is_returned=True)
+    # Closed records may already have been moved to the archive table
+    rejected_borrowings = merged({'user': request.user, 'status': 'REJECTED'}, '-borrow_date')
+    returned_borrowings = merged({'user': request.user, 'status': 'APPROVED', 'is_returned': True}, '-borrow_date')
+    reservations = Reservation.objects.filter(
+        user=request.user, status='ACTIVE', ends_at__gt=timezone.now()
+    ).select_related('asset')
+    waiting = WaitlistEntry.objects.filter(user=request.user, status='WAITING').select_related('asset')
     
     context = {
+        'reservations': reservations,
+        'waitlist_entries': waiting,
         'borrowings': all_borrowings,  # All records
         'pending_borrowings': pending_borrowings,
         'approved_borrowings': approved_borrowings,
@@ -97,23 +146,126 @@ def my_borrowings(request):
 # 4. UPDATE: Return an item
 @login_required
 def return_asset(request, pk):
-    borrow_record = get_object_or_404(BorrowRecord, pk=pk, user=request.user, status='APPROVED')
+    borrow_record = get_object_or_404(BorrowRecord, pk=pk, user=request.user, status='APPROVED', is_returned=False)
     
     if request.method == 'POST':
-        borrow_record.is_returned = True
-        borrow_record.return_date = timezone.now().date()
-        borrow_record.save()
-        
-        # Update asset status if stock becomes available
-        if borrow_record.asset.get_available_quantity() > 0:
-            borrow_record.asset.status = 'AVAILABLE'
-            borrow_record.asset.save()
+        try:
+            with transaction.atomic():
+                services.mark_returned(borrow_record, request.user)
+                waitlist.allocate([borrow_record.asset_id])
+        except services.AlreadyReturned:
+            messages.info(request, 'This item has already been returned.')
+            return redirect('my_borrowings')
         
         messages.success(request, f'You have successfully returned {borrow_record.quantity} x {borrow_record.asset.name}')
         return redirect('my_borrowings')
     
     return render(request, 'inventory/confirm_return.html', {'borrow_record': borrow_record})
 
+def parse_moment(value, end_of_day=False):
+    """Parse an ISO date or datetime from a form/query string into an aware datetime"""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        return None
+    if day is not None:
+        # A bare date covers the whole day
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, datetime.min.time())
+    elif moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+# 5. CREATE: Reserve an item for a future window
+@login_required
+def reserve_asset(request, pk):
+    asset = get_object_or_404(Asset, pk=pk)
+    
+    if request.method == 'POST':
+        quantity = int(request.POST.get('quantity', 1))
+        starts_at = parse_moment(request.POST.get('starts_at'))
+        ends_at = parse_moment(request.POST.get('ends_at'), end_of_day=True)
+        
+        if not starts_at or not ends_at or ends_at <= starts_at:
+            messages.error(request, 'Please choose a valid start and end.')
+            return render(request, 'inventory/reserve_asset.html', {'asset': asset})
+        if starts_at < timezone.now() - timedelta(minutes=5):
+            messages.error(request, 'Reservations must start in the future.')
+            return render(request, 'inventory/reserve_asset.html', {'asset': asset})
+        if quantity < 1:
+            messages.error(request, 'Quantity must be at least 1.')
+            return render(request, 'inventory/reserve_asset.html', {'asset': asset})
+        
+        with transaction.atomic():
+            # Lock the asset row so two bookings for the same window can't both pass the check
+            asset = Asset.objects.select_for_update().get(pk=asset.pk)
+            free_qty = free_units(asset, starts_at, ends_at)
+            if quantity > free_qty:
+                messages.error(request, f'Only {free_qty} item(s) are free for that period.')
+                return render(request, 'inventory/reserve_asset.html', {'asset': asset})
+            
+            Reservation.objects.create(
+                user=request.user,
+                asset=asset,
+                quantity=quantity,
+                starts_at=starts_at,
+                ends_at=ends_at,
+            )
+        
+        messages.success(request, f'Reserved {quantity} x {asset.name} from {starts_at:%b %d, %Y %H:%M} to {ends_at:%b %d, %Y %H:%M}.')
+        return redirect('my_borrowings')
+    
+    return render(request, 'inventory/reserve_asset.html', {'asset': asset})
+
+# 6. UPDATE: Cancel a reservation
+@login_required
+@require_POST
+def cancel_reservation(request, pk):
+    reservation = get_object_or_404(Reservation, pk=pk, user=request.user, status='ACTIVE')
+    reservation.status = 'CANCELLED'
+    reservation.save(update_fields=['status'])
+    messages.success(request, f'Cancelled your reservation of {reservation.asset.name}.')
+    return redirect('my_borrowings')
+
+# 7. CREATE: Wait for an item that is out of stock
+@login_required
+@require_POST
+def join_waitlist(request, pk):
+    asset = get_object_or_404(Asset, pk=pk)
+    quantity = int(request.POST.get('quantity', 1))
+    if not 1 <= quantity <= asset.total_quantity:
+        messages.error(request, f'Quantity must be between 1 and {asset.total_quantity}.')
+        return redirect('borrow_asset', pk=asset.pk)
+    
+    with transaction.atomic():
+        entry = waitlist.join(request.user, asset, quantity)
+        # Units may have come back in the meantime
+        if waitlist.allocate([asset.pk]):
+            reconcile_assets([asset.pk])
+    
+    entry.refresh_from_db()
+    if entry.status == 'ALLOCATED':
+        messages.success(request, f'{quantity} x {asset.name} became available and was requested for you. Please wait for staff approval.')
+    else:
+        messages.success(request, f'You are number {waitlist.position(entry)} on the waitlist for {asset.name}. '
+                                  f'A borrow request is submitted for you as soon as {quantity} item(s) are free.')
+    return redirect('my_borrowings')
+
+# 8. UPDATE: Leave a waitlist
+@login_required
+@require_POST
+def leave_waitlist(request, pk):
+    entry = get_object_or_404(WaitlistEntry, pk=pk, user=request.user, status='WAITING')
+    entry.status = 'CANCELLED'
+    entry.save(update_fields=['status'])
+    messages.success(request, f'Left the waitlist for {entry.asset.name}.')
+    return redirect('my_borrowings')
+
+@cache_anonymous_page
 def home(request):
     """Homepage view"""
     return render(request, 'index.html')
@@ -127,16 +279,17 @@ def profile(request):
     # Active borrowings (approved but not returned)
     active_borrowings = borrowings.filter(status='APPROVED', is_returned=False)
 
-    # Returned borrowings (approved and returned)
-    returned_borrowings = borrowings.filter(status='APPROVED', is_returned=True)
+    # Returned borrowings (approved and returned) may already live in the archive table
+    returned_borrowings = merged({'user': request.user, 'status': 'APPROVED', 'is_returned': True}, '-return_date',
+                                 select_related=('asset__category',))
 
     # Pending requests
     pending_requests = borrowings.filter(status='PENDING')
 
     # Statistics
-    total_borrowed = borrowings.filter(status='APPROVED').count()
+    total_borrowed = count_both(user=request.user, status='APPROVED')
     active_count = active_borrowings.count()
-    returned_count = returned_borrowings.count()
+    returned_count = len(returned_borrowings)
 
     context = {
         'total_borrowed': total_borrowed,
@@ -153,6 +306,7 @@ def profile(request):
 # ============================================
 
 @login_required
+@replica_reads
 def staff_dashboard(request):
     """Staff dashboard - only accessible to staff/admin"""
     if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
@@ -162,15 +316,14 @@ def staff_dashboard(request):
     # Statistics
     total_assets = Asset.objects.count()
     total_borrowed = BorrowRecord.objects.filter(is_returned=False, status='APPROVED').count()
-    total_returned = BorrowRecord.objects.filter(is_returned=True).count()
+    total_returned = count_both(is_returned=True)
     pending_requests = BorrowRecord.objects.filter(status='PENDING').count()
-    available_assets = sum(1 for asset in Asset.objects.all() if asset.is_stock_available())
+    available_assets = Asset.objects.with_stock().filter(available_qty__gt=0).count()
     
     # Recent borrowings (approved only)
     recent_borrowings = BorrowRecord.objects.filter(status='APPROVED').select_related('user', 'asset').order_by('-borrow_date')[:10]
     
     # Assets by category
-    from .models import Category
     categories = Category.objects.all()
     
     context = {
@@ -191,7 +344,8 @@ def staff_manage_assets(request):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('asset_list')
     
-    assets = Asset.objects.all()
+    # Stock columns come annotated with the list, not from queries per row
+    assets = Asset.objects.with_stock().select_related('category')
     
     # Handle search
     search_query = request.GET.get('search', '')
@@ -209,25 +363,26 @@ def staff_manage_assets(request):
     return render(request, 'inventory/staff/asset_management.html', context)  # Use the existing filename
 
 @login_required
+@replica_reads
 def staff_reports(request):
     """View reports - only for staff"""
     if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('asset_list')
     
-    # Statistics
-    total_borrows = BorrowRecord.objects.filter(status='APPROVED').count()
+    # Statistics (returned history spans the hot and archived tables)
     active_borrows = BorrowRecord.objects.filter(status='APPROVED', is_returned=False).count()
-    returned_borrows = BorrowRecord.objects.filter(status='APPROVED', is_returned=True).count()
+    returned_borrows = count_both(status='APPROVED', is_returned=True)
+    total_borrows = active_borrows + returned_borrows
     
     # Most borrowed assets
     most_borrowed = Asset.objects.annotate(
-        borrow_count=Count('borrow_records', filter=Q(borrow_records__status='APPROVED'))
-    ).order_by('-borrow_count')[:5]
+        borrow_count=borrow_count_subquery(status='APPROVED')
+    ).select_related('category').order_by('-borrow_count')[:5]
     
     # Separate active and returned borrowings
     active_borrowings = BorrowRecord.objects.filter(status='APPROVED', is_returned=False).select_related('user', 'asset').order_by('-borrow_date')[:10]
-    returned_items = BorrowRecord.objects.filter(status='APPROVED', is_returned=True).select_related('user', 'asset').order_by('-return_date')[:10]
+    returned_items = merged({'status': 'APPROVED', 'is_returned': True}, '-return_date', limit=10)
     
     # Damaged items (only non-repaired)
     damaged_items = DamagedItem.objects.filter(is_repaired=False).select_related('asset', 'reported_by').order_by('-reported_date')
@@ -243,6 +398,110 @@ def staff_reports(request):
     }
     return render(request, 'inventory/staff/reports.html', context)
 
+@login_required
+def staff_export_borrows(request):
+    """Download the full borrow history (hot and archived records) as CSV - only for staff"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('asset_list')
+    
+    columns = ['id', 'user__username', 'asset__name', 'asset__serial_number', 'quantity', 'status',
+               'borrow_date', 'approved_date', 'return_date', 'is_returned', 'approved_by__username']
+    
+    # Rows are produced while the response streams, so pick the database up front
+    alias = read_alias(request)
+    
+    def rows():
+        writer = csv.writer(Echo())
+        yield writer.writerow([column.replace('__username', '').replace('__', '_') for column in columns] + ['archived'])
+        for model, archived in ((BorrowRecord, 'no'), (ArchivedBorrowRecord, 'yes')):
+            for values in model.objects.using(alias).order_by('pk').values_list(*columns).iterator(chunk_size=2000):
+                yield writer.writerow(list(values) + [archived])
+    
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="borrow-history-{timezone.now():%Y%m%d}.csv"'
+    return response
+
+ANALYTICS_WINDOWS = (30, 90, 365)
+
+@login_required
+@replica_reads
+def staff_analytics(request):
+    """Utilization, idle stock and weekly demand per asset and category - only for staff"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('asset_list')
+    
+    days = request.GET.get('days', '')
+    days = int(days) if days.isascii() and days.isdigit() and int(days) in ANALYTICS_WINDOWS else 90
+    result = analytics.cached(days)
+    
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="utilization-{days}d-{result["last_day"]:%Y%m%d}.csv"'
+        writer = csv.writer(response)
+        columns = ['id', 'name', 'serial_number', 'category', 'total_quantity', 'utilization', 'peak', 'idle']
+        writer.writerow(columns)
+        for asset in result['assets']:
+            writer.writerow([asset[column] for column in columns])
+        return response
+    
+    busiest_week = max([week['units'] for week in result['weekly_demand']], default=0) or 1
+    context = {
+        'analytics': result,
+        'windows': ANALYTICS_WINDOWS,
+        'busiest': result['assets'][:20],
+        # Right-sizing candidates: the most units that were never needed at once
+        'idlest': sorted(result['assets'], key=lambda asset: (-asset['idle'], asset['utilization']))[:20],
+        'weeks': [dict(week, percent=week['units'] * 100 // busiest_week) for week in result['weekly_demand']],
+    }
+    return render(request, 'inventory/staff/analytics.html', context)
+
+AUDIT_PAGE_SIZE = 50
+
+@login_required
+def staff_audit_log(request):
+    """Staff actions, filtered by actor, asset, action and date range - only for staff"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('asset_list')
+    
+    filters = {key: request.GET.get(key, '').strip() for key in ('actor', 'asset', 'action', 'since', 'until')}
+    # Impossible dates (2024-02-30) are ignored like unparseable ones
+    since, until = parse_moment(filters['since']), parse_moment(filters['until'], end_of_day=True)
+    # Unknown names still filter: they match nothing
+    actor = asset = None
+    if filters['actor']:
+        actor = User.objects.filter(username=filters['actor']).first() or User(pk=0)
+    if filters['asset']:
+        asset = Asset.objects.filter(serial_number=filters['asset']).first() or Asset(pk=0)
+    log = audit.entries(
+        actor=actor, asset=asset, action=filters['action'],
+        since=since, until=until,
+    )
+    
+    # No COUNT(*) over the whole log: fetch one extra row to know if there is a next page
+    page = request.GET.get('page', '')
+    page = int(page) if page.isascii() and page.isdigit() and int(page) > 0 else 1
+    offset = (page - 1) * AUDIT_PAGE_SIZE
+    rows = list(log[offset:offset + AUDIT_PAGE_SIZE + 1])
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'entries': rows[:AUDIT_PAGE_SIZE],
+        'filters': filters,
+        'actions': AuditLog.ACTION_CHOICES,
+        'page': page,
+        'has_next': len(rows) > AUDIT_PAGE_SIZE,
+        'query': query.urlencode(),
+    }
+    return render(request, 'inventory/staff/audit_log.html', context)
+
+class Echo:
+    """File-like object whose write() just returns the line, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
 @login_required
 def staff_manage_requests(request):
     """Manage borrow requests - only for staff"""
@@ -251,7 +510,8 @@ def staff_manage_requests(request):
         return redirect('asset_list')
     
     # Get pending requests
-    pending_requests = BorrowRecord.objects.filter(status='PENDING').select_related('user', 'asset').order_by('-borrow_date')
+    pending_requests = list(BorrowRecord.objects.filter(status='PENDING').select_related('user', 'asset').order_by('-borrow_date'))
+    prefetch_stock([record.asset for record in pending_requests])
     
     context = {
         'pending_requests': pending_requests,
@@ -274,15 +534,11 @@ def staff_approve_request(request, pk):
         return redirect('staff_manage_requests')
     
     # APPROVE the request
-    borrow_record.status = 'APPROVED'
-    borrow_record.approved_by = request.user
-    borrow_record.approved_date = timezone.now().date()
-    borrow_record.save()
-    
-    # Update asset status if all stock is borrowed
-    if borrow_record.asset.get_available_quantity() <= 0:
-        borrow_record.asset.status = 'BORROWED'
-        borrow_record.asset.save()
+    with transaction.atomic():
+        services.approve(borrow_record, request.user)
+        reconcile_assets([borrow_record.asset_id])
+        audit.record(request.user, 'APPROVE', borrow_record.asset_id, borrow_record,
+                     borrower=borrow_record.user.username, quantity=borrow_record.quantity)
     
     messages.success(request, f'Approved borrow request for {borrow_record.user.username} - {borrow_record.quantity} x {borrow_record.asset.name}')
     return redirect('staff_manage_requests')
@@ -298,10 +554,18 @@ def staff_reject_request(request, pk):
     
     if request.method == 'POST':
         reason = request.POST.get('reason', '')
-        borrow_record.status = 'REJECTED'
-        borrow_record.rejection_reason = reason
-        borrow_record.approved_by = request.user  # Track who rejected it
-        borrow_record.save()
+        with transaction.atomic():
+            borrow_record.status = 'REJECTED'
+            borrow_record.rejection_reason = reason
+            borrow_record.approved_by = request.user  # Track who rejected it
+            borrow_record.save()
+            record_movement(borrow_record.asset_id, 'REJECT', borrow_record.quantity,
+                            user=request.user, borrow_record_id=borrow_record.pk, note=reason)
+            adjust_stock(borrow_record.asset_id, borrow_record.location_id, pending=-borrow_record.quantity)
+            waitlist.allocate([borrow_record.asset_id])
+            reconcile_assets([borrow_record.asset_id])
+            audit.record(request.user, 'REJECT', borrow_record.asset_id, borrow_record,
+                         borrower=borrow_record.user.username, quantity=borrow_record.quantity, reason=reason)
         
         messages.success(request, f'Rejected borrow request for {borrow_record.user.username}')
         return redirect('staff_manage_requests')
@@ -328,11 +592,10 @@ def staff_manage_returns(request):
     
     # Recently returned items (last 30 days)
     thirty_days_ago = timezone.now().date() - timedelta(days=30)
-    recent_returns = BorrowRecord.objects.filter(
-        status='APPROVED',
-        is_returned=True,
-        return_date__gte=thirty_days_ago
-    ).select_related('user', 'asset').order_by('-return_date')
+    recent_returns = merged(
+        {'status': 'APPROVED', 'is_returned': True, 'return_date__gte': thirty_days_ago},
+        '-return_date'
+    )
     
     # Add duration to each record
     for record in recent_returns:
@@ -358,32 +621,126 @@ def staff_process_return(request, pk):
         condition = request.POST.get('condition', 'good')
         notes = request.POST.get('notes', '')
         
-        # Mark as returned
-        borrow_record.is_returned = True
-        borrow_record.return_date = timezone.now().date()
-        borrow_record.save()
-        
-        # If damaged, create a DamagedItem record
-        if condition == 'damaged':
-            DamagedItem.objects.create(
-                asset=borrow_record.asset,
-                quantity=borrow_record.quantity,
-                reported_by=request.user,
-                borrow_record=borrow_record,
-                description=notes
-            )
+        damaged_qty = borrow_record.quantity if condition == 'damaged' else 0
+        try:
+            with transaction.atomic():
+                services.mark_returned(borrow_record, request.user, damaged=damaged_qty, notes=notes)
+                waitlist.allocate([borrow_record.asset_id])
+                audit.record(request.user, 'RETURN', borrow_record.asset_id, borrow_record,
+                             borrower=borrow_record.user.username, quantity=borrow_record.quantity, damaged=damaged_qty)
+        except services.AlreadyReturned:
+            messages.info(request, 'This return has already been processed.')
+            return redirect('staff_manage_returns')
+        if damaged_qty:
             messages.warning(request, f'Recorded {borrow_record.quantity}x {borrow_record.asset.name} as damaged.')
         
-        # Update asset status if all stock is available again
-        if borrow_record.asset.get_available_quantity() >= borrow_record.asset.total_quantity:
-            borrow_record.asset.status = 'AVAILABLE'
-            borrow_record.asset.save()
-        
         messages.success(request, f'Successfully processed return of {borrow_record.quantity}x {borrow_record.asset.name} from {borrow_record.user.username}')
         return redirect('staff_manage_returns')
     
     return render(request, 'inventory/staff/process_return.html', {'borrow_record': borrow_record})
 
+@login_required
+def staff_counter(request):
+    """Counter mode: scan serial numbers to check out or return a whole basket"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('asset_list')
+    
+    return render(request, 'inventory/staff/counter.html')
+
+def _counter_item(asset):
+    return {
+        'serial': asset.serial_number,
+        'name': asset.name,
+        'category': asset.category.name,
+        'available': asset.available_qty,
+    }
+
+def _counter_record(record):
+    return {
+        'id': record.pk,
+        'serial': record.asset.serial_number,
+        'asset': record.asset.name,
+        'user': record.user.username,
+        'quantity': record.quantity,
+    }
+
+@login_required
+@require_POST
+def staff_counter_api(request):
+    """JSON endpoint behind the counter page: lookup, checkout or return a basket of scans"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        return JsonResponse({'ok': False, 'errors': ['Staff only.']}, status=403)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'ok': False, 'errors': ['Invalid JSON.']}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'ok': False, 'errors': ['Expected a JSON object.']}, status=400)
+    action = payload.get('action')
+    items = payload.get('items') or []
+    if not isinstance(items, list):
+        return JsonResponse({'ok': False, 'errors': ['"items" must be a list of scans.']}, status=400)
+    
+    if action == 'lookup':
+        assets, unknown = services.resolve_serials(
+            str(item.get('serial', '') if isinstance(item, dict) else item) for item in items
+        )
+        return JsonResponse({'ok': True, 'items': [_counter_item(asset) for asset in assets.values()], 'unknown': unknown})
+    
+    borrower = None
+    name = str(payload.get('borrower') or '').strip()
+    if name:
+        borrower = User.objects.filter(Q(username=name) | Q(email__iexact=name)).first()
+        if borrower is None:
+            return JsonResponse({'ok': False, 'errors': [f'No user "{name}".']}, status=400)
+    
+    try:
+        if action == 'checkout':
+            if borrower is None:
+                return JsonResponse({'ok': False, 'errors': ['Enter who is borrowing the items.']}, status=400)
+            records = services.checkout_basket(borrower, items, request.user)
+        elif action == 'return':
+            records = services.return_basket(items, request.user, borrower=borrower, notes=str(payload.get('notes', '')))
+        else:
+            return JsonResponse({'ok': False, 'errors': ['Unknown action.']}, status=400)
+    except services.BasketError as exc:
+        return JsonResponse({'ok': False, 'errors': exc.errors, 'unknown': exc.unknown}, status=400)
+    
+    for record in records:
+        audit.record(request.user, action.upper(), record.asset_id, record,
+                     borrower=record.user.username, quantity=record.quantity, counter=True)
+    return JsonResponse({'ok': True, 'records': [_counter_record(record) for record in records]})
+
+@login_required
+def staff_asset_code(request, pk):
+    """QR code (or Code 128 barcode without the qrcode package) for an asset's serial number"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        return HttpResponseForbidden('Forbidden')
+    
+    serial_number = get_object_or_404(Asset.objects.values_list('serial_number', flat=True), pk=pk)
+    response = HttpResponse(asset_code_svg(serial_number), content_type='image/svg+xml')
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+@login_required
+def staff_asset_labels(request):
+    """Printable sheet of asset labels (?ids=1,2,3 or ?category=<id>)"""
+    if not (request.user.is_staff or request.user.groups.filter(name='Staff').exists()):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('asset_list')
+    
+    assets = Asset.objects.exclude(status='DISPOSED').select_related('category').order_by('name')
+    ids = [value for value in request.GET.get('ids', '').split(',') if value.isascii() and value.isdigit()]
+    category = request.GET.get('category', '')
+    if ids:
+        assets = assets.filter(pk__in=ids)
+    elif category.isascii() and category.isdigit():
+        assets = assets.filter(category_id=category)
+    
+    return render(request, 'inventory/staff/asset_labels.html', {'assets': assets[:200]})
+
 @login_required
 def staff_dispose_asset(request, asset_id):
     """Staff/Admin can directly dispose assets"""
@@ -392,32 +749,39 @@ def staff_dispose_asset(request, asset_id):
     if request.method == 'POST':
         quantity = int(request.POST.get('quantity', 1))
         reason = request.POST.get('reason')
+        location_id = int(request.POST.get('location') or best_location_id(asset.pk))
         
-        if quantity > asset.get_available_quantity():
+        if quantity > asset.get_available_quantity() or quantity > available_at(asset.pk, location_id):
             messages.error(request, 'Quantity exceeds available stock')
             return redirect('staff_manage_assets')
         
-        disposal = DisposalRecord.objects.create(
-            asset=asset,
-            quantity=quantity,
-            reason=reason,
-            disposed_by=request.user
-        )
-        
-        # Update asset immediately
-        asset.total_quantity -= quantity
-        asset.save()
+        with transaction.atomic():
+            disposal = DisposalRecord.objects.create(
+                asset=asset,
+                location_id=location_id,
+                quantity=quantity,
+                reason=reason,
+                disposed_by=request.user
+            )
+            
+            # Update asset immediately (the ledger gets a DISPOSE row, not an ADJUST from save())
+            Asset.objects.filter(pk=asset.pk).update(total_quantity=F('total_quantity') - quantity)
+            adjust_stock(asset.pk, location_id, on_hand=-quantity)
+            record_movement(asset.pk, 'DISPOSE', quantity, user=request.user, note=disposal.get_reason_display())
+            reconcile_assets([asset.pk])
+            audit.record(request.user, 'DISPOSE', asset.pk, disposal, quantity=quantity, reason=reason, location_id=location_id)
         
         messages.success(request, f'Disposed {quantity} units of {asset.name}')
         return redirect('staff_manage_assets')
     
-    return render(request, 'inventory/staff/dispose_asset.html', {'asset': asset})
+    return render(request, 'inventory/staff/dispose_asset.html', {'asset': asset, 'stock_levels': stock_levels(asset.pk)})
 
 def is_staff_or_admin(user):
     """Check if user is staff or admin"""
     return user.groups.filter(name='Staff').exists() or user.is_superuser
 
 @login_required
+@replica_reads
 def staff_disposal_list(request):
     """View all disposal records"""
     if not is_staff_or_admin(request.user):
@@ -431,6 +795,26 @@ def staff_disposal_list(request):
     }
     return render(request, 'inventory/staff/disposal_list.html', context)
 
+@login_required
+def staff_profiles(request):
+    """Recent request profiles with their top functions - only for staff"""
+    if not is_staff_or_admin(request.user):
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('asset_list')
+    
+    return render(request, 'inventory/staff/profiles.html', {'profiles': recent_profiles()})
+
+@login_required
+def staff_profile_file(request, filename):
+    """Download a .prof / .collapsed file of a recent profile"""
+    if not is_staff_or_admin(request.user):
+        return HttpResponseForbidden()
+    
+    path = os.path.join(profile_dir(), os.path.basename(filename))
+    if not filename.endswith(('.prof', '.collapsed')) or not os.path.isfile(path):
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
 @login_required
 def staff_maintenance_list(request):
     """View all maintenance records"""
@@ -474,18 +858,18 @@ def staff_create_maintenance(request, asset_id):
             messages.error(request, f'Quantity must be between 1 and {available_qty} (currently available).')
             return render(request, 'inventory/staff/create_maintenance.html', {'asset': asset})
         
-        MaintenanceRecord.objects.create(
-            asset=asset,
-            maintenance_type=maintenance_type,
-            description=description,
-            quantity=quantity,
-            requested_by=request.user,
-            status='PENDING'
-        )
-        
-        # Update asset status to REPAIR
-        asset.status = 'REPAIR'
-        asset.save()
+        with transaction.atomic():
+            maintenance = MaintenanceRecord.objects.create(
+                asset=asset,
+                maintenance_type=maintenance_type,
+                description=description,
+                quantity=quantity,
+                requested_by=request.user,
+                status='PENDING'
+            )
+            record_movement(asset.pk, 'MAINT_OUT', quantity, user=request.user, note=maintenance_type or '')
+            reconcile_assets([asset.pk])
+            audit.record(request.user, 'MAINTENANCE', asset.pk, maintenance, quantity=quantity, type=maintenance_type)
         
         messages.success(request, f'Maintenance request created for {asset.name}')
         return redirect('staff_maintenance_list')
@@ -503,6 +887,7 @@ def staff_update_maintenance(request, maintenance_id):
     
     if request.method == 'POST':
         action = request.POST.get('action')
+        was_open = maintenance.status in MaintenanceRecord.OPEN_STATUSES
         
         if action == 'start':
             maintenance.status = 'IN_PROGRESS'
@@ -519,10 +904,6 @@ def staff_update_maintenance(request, maintenance_id):
             maintenance.cost = cost if cost else None
             maintenance.notes = notes
             
-            # Update asset status back to AVAILABLE
-            maintenance.asset.status = 'AVAILABLE'
-            maintenance.asset.save()
-            
             messages.success(request, 'Maintenance completed.')
             
         elif action == 'cancel':
@@ -530,13 +911,18 @@ def staff_update_maintenance(request, maintenance_id):
             maintenance.status = 'CANCELLED'
             maintenance.notes = f"Cancelled: {reason}"
             
-            # Update asset status back to AVAILABLE
-            maintenance.asset.status = 'AVAILABLE'
-            maintenance.asset.save()
-            
             messages.warning(request, 'Maintenance cancelled.')
         
-        maintenance.save()
+        with transaction.atomic():
+            maintenance.save()
+            # Units come back into service once the maintenance is closed
+            if was_open and maintenance.status not in MaintenanceRecord.OPEN_STATUSES:
+                record_movement(maintenance.asset_id, 'MAINT_IN', maintenance.quantity,
+                                user=request.user, note=maintenance.status)
+                waitlist.allocate([maintenance.asset_id])
+            reconcile_assets([maintenance.asset_id])
+            audit.record(request.user, 'MAINTENANCE_UPDATE', maintenance.asset_id, maintenance,
+                         action=action, status=maintenance.status)
         return redirect('staff_maintenance_list')
     
     return render(request, 'inventory/staff/update_maintenance.html', {'maintenance': maintenance})
@@ -550,11 +936,57 @@ def staff_mark_repaired(request, damage_id):
     
     if request.method == 'POST':
         damage = get_object_or_404(DamagedItem, pk=damage_id)
-        damage.is_repaired = True
-        damage.repaired_date = timezone.now().date()
-        damage.repaired_by = request.user
-        damage.save()
+        with transaction.atomic():
+            was_repaired = damage.is_repaired
+            damage.is_repaired = True
+            damage.repaired_date = timezone.now().date()
+            damage.repaired_by = request.user
+            damage.save()
+            if not was_repaired:
+                record_movement(damage.asset_id, 'REPAIR', damage.quantity, user=request.user,
+                                borrow_record_id=damage.borrow_record_id)
+                adjust_stock(damage.asset_id, damage.location_id, damaged=-damage.quantity)
+                waitlist.allocate([damage.asset_id])
+            reconcile_assets([damage.asset_id])
+            audit.record(request.user, 'REPAIR', damage.asset_id, damage, quantity=damage.quantity)
         
         messages.success(request, f'Marked {damage.quantity}x {damage.asset.name} as repaired.')
     
-    return redirect('staff_reports')
\ No newline at end of file
+    return redirect('staff_reports')
+
+def serve_media(request, path):
+    """Serve an uploaded file, handing the transfer to the front-end server when configured"""
+    storage = default_storage
+    try:
+        full_path = storage.path(path)
+        incoming = storage.path(INCOMING_DIR)
+    except (SuspiciousFileOperation, NotImplementedError):
+        raise Http404('File not found')
+    # Decide on the resolved path: "x/../.incoming/..." must not reach temporary uploads
+    if os.path.commonpath([full_path, incoming]) == incoming or not os.path.isfile(full_path):
+        raise Http404('File not found')
+    path = os.path.relpath(full_path, storage.path('')).replace(os.sep, '/')
+
+    immutable = is_hashed_name(path)
+    etag = f'"{os.path.splitext(os.path.basename(path))[0]}"' if immutable else None
+    if etag and etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+        if header == 'X-Accel-Redirect':
+            # nginx serves the file from an `internal` location mapped to MEDIA_ROOT
+            response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            response[header] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + path
+        elif header == 'X-Sendfile':
+            response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            response[header] = full_path
+        else:
+            response = FileResponse(open(full_path, 'rb'))
+
+    if immutable:
+        # The name is the content hash, so the bytes behind it can never change
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
@@ -0,0 +1,112 @@
+"""
+Waitlists for assets that are out of stock.
+
+Users who cannot borrow an asset right now join its waitlist. Whenever units
+come back (returns, repairs, finished maintenance, rejected requests)
+``allocate()`` runs in the same transaction and hands them out: the asset's
+WAITING entries go on a heap ordered by priority (highest first), then by
+joining time, and are popped while the head fits into the free units of a
+storeroom. An allocated entry becomes a PENDING borrow request, exactly as if
+the user had just asked for it, so staff approval (or the auto-approval
+rules) applies as usual. Entries behind a head that does not fit keep
+waiting, so a large request is not starved by smaller ones.
+
+An entry must fit both the free units of one storeroom (StockLevel counters)
+and the asset's overall available quantity from the records minus running
+reservations - the same figure borrow_asset checks - so drifted counters can
+never hand out more than the asset has. Allocation reads the touched assets'
+StockLevel rows, their with_stock() aggregates, running reservations and
+waiting entries, all through indexed asset lookups.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import approvals
+from .availability import overlapping
+from .ledger import record_movement
+from .locations import adjust_stock
+from .models import Asset, BorrowRecord, StockLevel, WaitlistEntry
+from .versioning import deferred_bumps
+
+
+def join(user, asset, quantity, priority=0):
+    """Put `user` on the asset's waitlist (or update the quantity of their existing entry)"""
+    entry, created = WaitlistEntry.objects.get_or_create(
+        user=user, asset=asset, status='WAITING', defaults={'quantity': quantity, 'priority': priority}
+    )
+    if not created and entry.quantity != quantity:
+        entry.quantity = quantity
+        entry.save(update_fields=['quantity'])
+    return entry
+
+
+def position(entry):
+    """1-based place of a waiting entry in its asset's queue"""
+    ahead = WaitlistEntry.objects.filter(asset_id=entry.asset_id, status='WAITING').filter(
+        Q(priority__gt=entry.priority) | Q(priority=entry.priority, created_at__lt=entry.created_at)
+    )
+    return ahead.count() + 1
+
+
+def _free_units(asset_ids):
+    """({asset_id: {location_id: free units}}, {asset_id: units free overall})
+
+    The overall figure is the record-based available quantity (as checked by
+    borrow_asset) minus running reservations; the storeroom counters only
+    decide where the units are handed out.
+    """
+    by_location = {}
+    for asset_id, location_id, on_hand, borrowed, pending, damaged in StockLevel.objects.filter(
+        asset_id__in=asset_ids
+    ).values_list('asset_id', 'location_id', 'on_hand', 'borrowed', 'pending', 'damaged'):
+        by_location.setdefault(asset_id, {})[location_id] = on_hand - borrowed - pending - damaged
+
+    overall = dict(Asset.objects.filter(pk__in=asset_ids).with_stock().values_list('pk', 'available_qty'))
+    now = timezone.now()
+    for asset_id, _, _, quantity in overlapping(asset_ids, now, now + timedelta(seconds=1)):
+        overall[asset_id] = overall.get(asset_id, 0) - quantity
+    return by_location, overall
+
+
+def allocate(asset_ids):
+    """Turn waiting entries into PENDING requests for the units free now; returns the new records"""
+    heaps = {}
+    for entry in WaitlistEntry.objects.select_for_update().filter(
+        asset_id__in=set(asset_ids), status='WAITING'
+    ).select_related('user'):
+        heaps.setdefault(entry.asset_id, []).append((-entry.priority, entry.created_at, entry.pk, entry))
+    if not heaps:
+        return []
+
+    by_location, overall = _free_units(list(heaps))
+    now = timezone.now()
+    allocated = []
+    with deferred_bumps():
+        for asset_id, heap in heaps.items():
+            heapq.heapify(heap)
+            free = by_location.get(asset_id, {})
+            while heap and free:
+                entry = heap[0][3]
+                location_id = max(free, key=free.get)
+                if entry.quantity > min(free[location_id], overall.get(asset_id, 0)):
+                    break
+                heapq.heappop(heap)
+                entry.borrow_record = BorrowRecord.objects.create(
+                    user=entry.user, asset_id=asset_id, location_id=location_id, quantity=entry.quantity, status='PENDING'
+                )
+                record_movement(asset_id, 'REQUEST', entry.quantity, user=entry.user, borrow_record_id=entry.borrow_record.pk,
+                                note='Waitlist')
+                adjust_stock(asset_id, location_id, pending=entry.quantity)
+                free[location_id] -= entry.quantity
+                overall[asset_id] -= entry.quantity
+                entry.status = 'ALLOCATED'
+                entry.allocated_at = now
+                allocated.append(entry)
+
+    WaitlistEntry.objects.bulk_update(allocated, ['status', 'allocated_at', 'borrow_record'])
+    for entry in allocated:
+        approvals.queue_evaluation(entry.borrow_record)
+    return [entry.borrow_record for entry in allocated]
@@ -0,0 +1,154 @@
+"""
+Routine SQLite upkeep, run by ``manage.py db_maintain``.
+
+Every step works in short pieces so the database stays usable while it runs:
+
+* expired sessions are deleted a batch per transaction;
+* statistics are gathered with ``ANALYZE`` one table at a time, each limited
+  to a sample of rows (``PRAGMA analysis_limit``), then ``PRAGMA optimize``;
+* free pages are returned to the file system with ``PRAGMA
+  incremental_vacuum`` a few hundred pages at a time. This needs
+  ``auto_vacuum=INCREMENTAL``; switching an existing file to it takes one
+  full ``VACUUM`` (``enable_incremental_vacuum()``), which locks the whole
+  database and belongs outside business hours;
+* ``quick_check`` (or the slower ``integrity_check``) and
+  ``foreign_key_check`` only read.
+
+All statements run under a SQLite progress handler that interrupts them once
+the step's deadline has passed, so no single statement holds a lock for
+longer than the time box. An interrupted step is reported, not retried.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.utils import timezone
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+class TimedOut(Exception):
+    """The step's deadline passed before it finished"""
+
+
+def _sqlite(using):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        raise OperationalError(f'Database "{using}" is not SQLite')
+    connection.ensure_connection()
+    return connection
+
+
+@contextmanager
+def deadline(using, seconds):
+    """Interrupt any statement on `using` still running `seconds` from now"""
+    raw = _sqlite(using).connection
+    ends = time.monotonic() + seconds
+    raw.set_progress_handler(lambda: time.monotonic() > ends, 10000)
+    try:
+        yield ends
+    except OperationalError as exc:
+        if 'interrupt' in str(exc):
+            raise TimedOut from exc
+        raise
+    finally:
+        raw.set_progress_handler(None, 0)
+
+
+def _pragma(connection, statement):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {statement}')
+        return cursor.fetchall()
+
+
+def purge_sessions(ends, batch_size=1000, pause=0.0, using=DEFAULT_DB_ALIAS):
+    """Delete expired sessions a batch at a time; returns the number deleted"""
+    from django.contrib.sessions.models import Session
+
+    deleted = 0
+    while time.monotonic() < ends:
+        keys = list(Session.objects.using(using).filter(expire_date__lt=timezone.now())
+                    .values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            break
+        deleted += Session.objects.using(using).filter(pk__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def analyze(ends, limit=1000, using=DEFAULT_DB_ALIAS):
+    """ANALYZE each table on a sample of `limit` rows, then PRAGMA optimize; returns the tables analyzed"""
+    connection = _sqlite(using)
+    _pragma(connection, f'analysis_limit = {int(limit)}')
+    tables = connection.introspection.table_names()
+    analyzed = []
+    for table in tables:
+        if time.monotonic() >= ends:
+            raise TimedOut(f'{len(analyzed)} of {len(tables)} tables analyzed')
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+        analyzed.append(table)
+    _pragma(connection, 'optimize')
+    return analyzed
+
+
+def auto_vacuum_mode(using=DEFAULT_DB_ALIAS):
+    return AUTO_VACUUM_MODES.get(_pragma(_sqlite(using), 'auto_vacuum')[0][0], 'unknown')
+
+
+def free_pages(using=DEFAULT_DB_ALIAS):
+    return _pragma(_sqlite(using), 'freelist_count')[0][0]
+
+
+def incremental_vacuum(ends, pages=256, pause=0.0, using=DEFAULT_DB_ALIAS):
+    """Release free pages `pages` at a time; returns the number released"""
+    connection = _sqlite(using)
+    released = 0
+    while time.monotonic() < ends:
+        before = free_pages(using)
+        if not before:
+            break
+        _pragma(connection, f'incremental_vacuum({int(pages)})')
+        released += before - free_pages(using)
+        if pause:
+            time.sleep(pause)
+    return released
+
+
+def enable_incremental_vacuum(using=DEFAULT_DB_ALIAS):
+    """Switch the file to auto_vacuum=INCREMENTAL (rewrites the whole database with VACUUM)"""
+    connection = _sqlite(using)
+    _pragma(connection, 'auto_vacuum = INCREMENTAL')
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+    return auto_vacuum_mode(using)
+
+
+def integrity_problems(full=False, using=DEFAULT_DB_ALIAS):
+    """Messages from quick_check (or integrity_check); empty when the file is sound"""
+    rows = _pragma(_sqlite(using), 'integrity_check' if full else 'quick_check')
+    return [row[0] for row in rows if row[0] != 'ok']
+
+
+def foreign_key_problems(using=DEFAULT_DB_ALIAS):
+    """(table, rowid, parent table) of every row whose foreign key points nowhere"""
+    return [tuple(row[:3]) for row in _pragma(_sqlite(using), 'foreign_key_check')]
+
+
+def table_sizes(using=DEFAULT_DB_ALIAS):
+    """[(name, bytes)] of every table and index, largest first (empty without the dbstat table)"""
+    connection = _sqlite(using)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC')
+            return cursor.fetchall()
+    except OperationalError:
+        return []
+
+
+def file_size(using=DEFAULT_DB_ALIAS):
+    """(page count x page size, bytes in free pages)"""
+    connection = _sqlite(using)
+    page_size = _pragma(connection, 'page_size')[0][0]
+    return _pragma(connection, 'page_count')[0][0] * page_size, free_pages(using) * page_size
@@ -0,0 +1,370 @@
+"""
+Prometheus metrics.
+
+Every WSGI worker process keeps its counters and histograms in memory (see
+``Registry``) and writes them to ``METRICS_DIR/<pid>-<token>.json`` at most
+every ``METRICS_FLUSH_SECONDS``; the random token keeps a reused pid from
+overwriting an older process's file. The ``/metrics`` view adds up the files
+of all processes, appends business gauges computed with a couple of aggregate
+queries, and renders Prometheus text.
+
+When a process exits (or, on POSIX, is found dead by ``/metrics``) its file
+is folded into ``retired.json`` and deleted, so counters never go backwards
+and the directory does not grow with every worker ever started. Folding
+takes a directory lock, so two folds never lose each other's totals, and
+``retired.json`` lists the files it already holds so a reader racing with a
+fold never counts one twice.
+
+``MetricsMiddleware`` records, per URL name:
+
+* request counts and latency histograms
+* query counts and DB time per request (session table time separately)
+* "database is locked" errors (session writes are labelled separately)
+* anonymous page cache hits and misses (from the ``X-Page-Cache`` header)
+
+``/metrics`` is only served to staff users or with
+``Authorization: Bearer <METRICS_TOKEN>``.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+HELP = {
+    'rezo_http_requests_total': ('counter', 'Requests by URL name, method and status class'),
+    'rezo_http_request_duration_seconds': ('histogram', 'Request latency by URL name'),
+    'rezo_db_queries_per_request': ('histogram', 'Database queries per request by URL name'),
+    'rezo_db_query_duration_seconds_total': ('counter', 'Time spent in database queries by URL name'),
+    'rezo_db_lock_errors_total': ('counter', '"database is locked" errors by table kind'),
+    'rezo_session_query_duration_seconds_total': ('counter', 'Time spent in session table queries by URL name'),
+    'rezo_page_cache_requests_total': ('counter', 'Anonymous page cache lookups by result'),
+    'rezo_borrow_requests_pending': ('gauge', 'Borrow requests waiting for approval'),
+    'rezo_borrows_open': ('gauge', 'Approved borrowings not yet returned'),
+    'rezo_damaged_items_unrepaired': ('gauge', 'Damage reports not yet repaired'),
+    'rezo_jobs_queued': ('gauge', 'Background jobs waiting to run'),
+}
+
+
+class Registry:
+    """In-process counters and histograms, keyed by (name, sorted label pairs)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex[:12]
+
+    def filename(self):
+        if self.pid != os.getpid():
+            # A forked child starts its own file with empty totals (the parent keeps reporting its own)
+            with self.lock:
+                self.counters, self.histograms = {}, {}
+            self.pid, self.token = os.getpid(), uuid.uuid4().hex[:12]
+        return f'{self.pid}-{self.token}.json'
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0, 'count': 0}
+            index = bisect_left(buckets, value)
+            if index < len(buckets):
+                entry['counts'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, dict(entry, counts=list(entry['counts']))]
+                               for (name, labels), entry in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """Write this process's snapshot for the /metrics view to merge"""
+        now = time.monotonic()
+        if not force and now - self.last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+            return
+        self.last_flush = now
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, self.filename()), self.snapshot())
+
+
+def _write_json(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, path)
+
+
+def _retire_at_exit():
+    if registry.counters or registry.histograms:
+        registry.flush(force=True)
+        retire([registry.filename()])
+
+
+registry = Registry()
+atexit.register(_retire_at_exit)
+
+RETIRED = 'retired.json'
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, '.metrics'))
+
+
+def _read(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(counters, histograms, snapshot):
+    for metric, labels, value in snapshot['counters']:
+        key = (metric, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, entry in snapshot['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, {'buckets': entry['buckets'], 'counts': [0] * len(entry['buckets']), 'sum': 0, 'count': 0})
+        total['counts'] = [a + b for a, b in zip(total['counts'], entry['counts'])]
+        total['sum'] += entry['sum']
+        total['count'] += entry['count']
+
+
+def _pid(name):
+    prefix = name.split('-', 1)[0]
+    return int(prefix) if prefix.isdigit() and name.endswith('.json') else None
+
+
+def _alive(pid):
+    if pid == os.getpid() or os.name != 'posix':
+        return True  # Without a cheap liveness check, files are only retired by their own process at exit
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _fold_lock(directory, stale_after=60):
+    """mkdir-based lock; yields False (skip folding) while another process holds it"""
+    path = os.path.join(directory, 'retire.lock')
+    try:
+        if os.path.isdir(path) and time.time() - os.path.getmtime(path) > stale_after:
+            os.rmdir(path)  # left behind by a process that died while folding
+        os.mkdir(path)
+    except OSError:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        os.rmdir(path)
+
+
+def retire(names):
+    """Fold the given process files into retired.json and delete them; returns the number folded"""
+    directory = metrics_dir()
+    if not names or not os.path.isdir(directory):
+        return 0
+    with _fold_lock(directory) as locked:
+        if not locked:
+            return 0
+        counters, histograms = {}, {}
+        retired = _read(os.path.join(directory, RETIRED)) or {'counters': [], 'histograms': [], 'folded': []}
+        _add(counters, histograms, retired)
+        folded = []
+        for name in names:
+            snapshot = _read(os.path.join(directory, name))
+            if snapshot is not None and name not in retired['folded']:
+                _add(counters, histograms, snapshot)
+                folded.append(name)
+        if not folded:
+            return 0
+        # Names folded earlier whose files are gone no longer need to be skipped by readers
+        remaining = [name for name in retired['folded'] if os.path.exists(os.path.join(directory, name))]
+        _write_json(os.path.join(directory, RETIRED), {
+            'counters': [[metric, labels, value] for (metric, labels), value in counters.items()],
+            'histograms': [[metric, labels, entry] for (metric, labels), entry in histograms.items()],
+            'folded': remaining + folded,
+        })
+        for name in folded:
+            os.remove(os.path.join(directory, name))
+    return len(folded)
+
+
+def merged_snapshots():
+    """Sum retired.json and the snapshots of every live process, retiring the files of dead ones first"""
+    directory = metrics_dir()
+    if not os.path.isdir(directory):
+        return {}, {}
+    retire([name for name in os.listdir(directory) if _pid(name) is not None and not _alive(_pid(name))])
+
+    # Process files first, retired.json last: a file folded in between is then skipped, not counted twice or lost
+    snapshots = {name: _read(os.path.join(directory, name)) for name in os.listdir(directory) if _pid(name) is not None}
+    retired = _read(os.path.join(directory, RETIRED)) or {'counters': [], 'histograms': [], 'folded': []}
+    counters, histograms = {}, {}
+    _add(counters, histograms, retired)
+    for name, snapshot in snapshots.items():
+        if snapshot is not None and name not in retired['folded']:
+            _add(counters, histograms, snapshot)
+    return counters, histograms
+
+
+def business_gauges():
+    """Workload gauges from one aggregate per table, cached briefly"""
+    gauges = cache.get('metrics:gauges')
+    if gauges is None:
+        from django.db.models import Count, Q
+
+        from inventory.models import BorrowRecord, DamagedItem, Job
+
+        borrows = BorrowRecord.objects.filter(is_returned=False).aggregate(
+            pending=Count('pk', filter=Q(status='PENDING')),
+            open=Count('pk', filter=Q(status='APPROVED')),
+        )
+        gauges = {
+            'rezo_borrow_requests_pending': borrows['pending'],
+            'rezo_borrows_open': borrows['open'],
+            'rezo_damaged_items_unrepaired': DamagedItem.objects.filter(is_repaired=False).count(),
+            'rezo_jobs_queued': Job.objects.filter(status='QUEUED').count(),
+        }
+        cache.set('metrics:gauges', gauges, getattr(settings, 'METRICS_GAUGE_SECONDS', 15))
+    return gauges
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in pairs)
+    return '{' + body + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Prometheus text exposition of every process plus the business gauges"""
+    counters, histograms = merged_snapshots()
+    samples = {}
+    for (name, labels), value in sorted(counters.items()):
+        samples.setdefault(name, []).append(f'{name}{_labels(labels)} {_format_number(value)}')
+    for (name, labels), entry in sorted(histograms.items(), key=lambda item: item[0]):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(entry['buckets'], entry['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {entry["count"]}')
+        lines.append(f'{name}_sum{_labels(labels)} {_format_number(entry["sum"])}')
+        lines.append(f'{name}_count{_labels(labels)} {entry["count"]}')
+    for name, value in business_gauges().items():
+        samples[name] = [f'{name} {value}']
+
+    output = []
+    for name in sorted(samples):
+        kind, text = HELP.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {text}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(samples[name])
+    return '\n'.join(output) + '\n'
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = token and request.headers.get('Authorization') == f'Bearer {token}'
+    user = getattr(request, 'user', None)
+    if not authorized and not (user is not None and user.is_staff):
+        return HttpResponseForbidden('Forbidden')
+    registry.flush(force=True)
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else '') or 'unmatched'
+
+
+class _QueryTimer:
+    """connection.execute_wrapper that counts queries and time for one request"""
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.seconds = 0.0
+        self.session_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        session = 'django_session' in sql
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            if 'locked' in str(exc):
+                table = 'session' if session else 'other'
+                registry.inc('rezo_db_lock_errors_total', {'table': table, 'view': _view_name(self.request)})
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.seconds += elapsed
+            if session:
+                self.session_seconds += elapsed
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = _QueryTimer(request)
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = _view_name(request)
+        registry.inc('rezo_http_requests_total', {
+            'view': view, 'method': request.method, 'status': f'{response.status_code // 100}xx',
+        })
+        registry.observe('rezo_http_request_duration_seconds', {'view': view}, duration, LATENCY_BUCKETS)
+        registry.observe('rezo_db_queries_per_request', {'view': view}, timer.queries, QUERY_BUCKETS)
+        registry.inc('rezo_db_query_duration_seconds_total', {'view': view}, timer.seconds)
+        if timer.session_seconds:
+            # Session reads/writes wait on the same SQLite write lock as everything else
+            registry.inc('rezo_session_query_duration_seconds_total', {'view': view}, timer.session_seconds)
+        page_cache = response.get('X-Page-Cache')
+        if page_cache:
+            registry.inc('rezo_page_cache_requests_total', {'view': view, 'result': page_cache.lower()})
+        registry.flush()
+        return response
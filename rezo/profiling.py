@@ -0,0 +1,213 @@
+"""
+On-demand request profiling.
+
+``ProfilingMiddleware`` profiles a request when it carries an allow-listed
+token in the ``X-Profile`` header or when it is picked by
+``PROFILING_SAMPLE_RATE``. Two profilers are available (``PROFILING_MODE`` or
+an ``X-Profile-Mode`` header):
+
+* ``sampler``  - a thread that samples the request thread's stack every
+  ``PROFILING_SAMPLE_INTERVAL`` seconds; writes ``<id>.collapsed``
+* ``cprofile`` - deterministic cProfile on top of the sampler; also writes
+  ``<id>.prof`` (pstats) and lists functions by their own time
+
+Each profile also gets ``<id>.json`` with the request details and top
+functions; only the newest ``PROFILING_KEEP`` profiles are kept in
+``PROFILING_DIR``. Collapsed files load in speedscope or flamegraph.pl.
+
+With no tokens and a zero sample rate the middleware removes itself at
+startup (MiddlewareNotUsed), so it costs nothing when disabled.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+MODES = ('cprofile', 'sampler')
+TOP_FUNCTIONS = 15
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def _label(code_or_key):
+    """'function (file.py:line)' for a code object or a pstats key"""
+    if isinstance(code_or_key, tuple):
+        filename, line, name = code_or_key
+    else:
+        filename, line, name = code_or_key.co_filename, code_or_key.co_firstlineno, code_or_key.co_name
+    if filename == '~':
+        return name  # Built-in
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval from a helper thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def top(self):
+        total = sum(self.stacks.values()) or 1
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [
+            {'function': name, 'samples': count, 'percent': round(100 * count / total, 1)}
+            for name, count in leaves.most_common(TOP_FUNCTIONS)
+        ]
+
+
+def top_from_stats(stats):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            'function': _label(func),
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 2),
+            'cumtime_ms': round(cumtime * 1000, 2),
+        }
+        for func, (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def recent_profiles(limit=50):
+    """Metadata of the newest profiles, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as handle:
+                profiles.append(json.load(handle))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def _rotate(directory, keep):
+    ids = sorted({name.split('.', 1)[0] for name in os.listdir(directory)}, reverse=True)
+    for stale in ids[keep:]:
+        for extension in ('.json', '.prof', '.collapsed'):
+            path = os.path.join(directory, stale + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.tokens = set(getattr(settings, 'PROFILING_TOKENS', ()))
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        if not self.tokens and not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.mode = getattr(settings, 'PROFILING_MODE', 'sampler')
+        self.interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005)
+        self.keep = getattr(settings, 'PROFILING_KEEP', 50)
+
+    def __call__(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token and token in self.tokens:
+            trigger = 'header'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sampled'
+        else:
+            return self.get_response(request)
+
+        mode = request.META.get('HTTP_X_PROFILE_MODE', self.mode) if trigger == 'header' else self.mode
+        if mode not in MODES:
+            mode = self.mode
+
+        # cProfile only records caller -> callee pairs, so the flame graph
+        # always comes from sampled stacks
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        profiler = cProfile.Profile() if mode == 'cprofile' else None
+        started = time.perf_counter()
+        sampler.start()
+        if profiler:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler:
+                profiler.disable()
+            sampler.stop()
+        duration = time.perf_counter() - started
+
+        # Ids sort chronologically, which is what rotation and listing rely on
+        profile_id = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:4]}'
+        self._write(profile_id, mode, trigger, sampler, profiler, request, response, duration)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def _write(self, profile_id, mode, trigger, sampler, profiler, request, response, duration):
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, profile_id)
+
+        with open(base + '.collapsed', 'w') as handle:
+            handle.write(sampler.collapsed())
+        files = [profile_id + '.collapsed']
+        if profiler:
+            profiler.dump_stats(base + '.prof')
+            files.append(profile_id + '.prof')
+            top = top_from_stats(pstats.Stats(profiler))
+        else:
+            top = sampler.top()
+
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        metadata = {
+            'id': profile_id,
+            'mode': mode,
+            'trigger': trigger,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else '',
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'user': user.get_username() if user is not None and user.is_authenticated else '',
+            'created_at': time.time(),
+            'files': files,
+            'top': top,
+        }
+        with open(base + '.json', 'w') as handle:
+            json.dump(metadata, handle)
+        _rotate(directory, self.keep)
@@ -0,0 +1,133 @@
+"""
+Read replica routing.
+
+Report-style views (decorated with ``@replica_reads``) send their inventory
+queries to the ``replica`` database alias, which is a copy of the primary
+SQLite file refreshed by ``manage.py sync_replica`` with SQLite's online
+backup API. Reads fall back to the primary when:
+
+* no replica is configured, or it is the primary itself (test mirror)
+* the copy is missing or older than ``REPLICA_MAX_LAG_SECONDS``
+* the current session wrote something after the copy was taken
+  (read-your-writes: ``ReplicaMiddleware`` stamps the session on writes)
+
+Writes, sessions and auth always use the primary. Catalog pages and the JSON
+API stay on the primary too: their caches and ETags are keyed by the catalog
+version, and a lagging copy would pin old content to a new version.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+SESSION_KEY = '_replica_wrote_at'
+
+_reads = ContextVar('rezo_replica_reads', default=False)
+_wrote = ContextVar('rezo_replica_wrote', default=False)
+
+
+def replica_synced_at():
+    """Time the replica copy was taken, or None if there is no usable copy"""
+    if REPLICA not in settings.DATABASES:
+        return None
+    name = str(connections[REPLICA].settings_dict['NAME'])
+    if name == str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']):
+        return None
+    try:
+        return os.path.getmtime(name)
+    except OSError:
+        return None
+
+
+def read_alias(request):
+    """Database alias report reads for this request may use"""
+    synced_at = replica_synced_at()
+    if synced_at is None or time.time() - synced_at > getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 60):
+        return DEFAULT_DB_ALIAS
+    session = getattr(request, 'session', None)
+    wrote_at = session.get(SESSION_KEY) if session is not None else None
+    if wrote_at and wrote_at >= synced_at:
+        return DEFAULT_DB_ALIAS
+    return REPLICA
+
+
+def replica_reads(view):
+    """Route the view's inventory reads to the replica when it is fresh enough"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _reads.set(read_alias(request) == REPLICA)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _reads.reset(token)
+    return wrapper
+
+
+def sync_replica(pages=-1):
+    """Copy the primary into the replica file; returns the copy's size in bytes"""
+    source_path = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    target_path = str(connections[REPLICA].settings_dict['NAME']) if REPLICA in settings.DATABASES else source_path
+    if target_path == source_path:
+        raise ImproperlyConfigured('DATABASES has no separate "replica" database to sync')
+    # Back up into a temporary file and swap it in, so readers never see a half-copied database
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(target_path)), prefix=f'{os.path.basename(target_path)}.', suffix='.tmp'
+    )
+    os.close(fd)
+    shutil.copymode(source_path, temp_path)
+    source, target = sqlite3.connect(source_path), sqlite3.connect(temp_path)
+    try:
+        source.backup(target, pages=pages)
+    except BaseException:
+        target.close()
+        os.unlink(temp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(temp_path, target_path)
+    return os.path.getsize(target_path)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Once this request has written, it reads its own writes from the primary
+        if _reads.get() and not _wrote.get() and model._meta.app_label in getattr(settings, 'REPLICA_APPS', ('inventory',)):
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the backup copy
+        return False if db == REPLICA else None
+
+
+class ReplicaMiddleware:
+    """Remember when a session last wrote, so its own reads skip older copies"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and request.session.session_key:
+                request.session[SESSION_KEY] = time.time()
+        finally:
+            _wrote.reset(token)
+        return response
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,7 +46,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'rezo.metrics.MetricsMiddleware',
+    'rezo.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'rezo.replicas.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -79,9 +84,57 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # `manage.py test [--parallel]` runs against in-memory copies
+        'TEST': {'NAME': ':memory:'},
+    },
+    # Copy of the primary for report reads, refreshed by `manage.py sync_replica`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('REZO_REPLICA_DB', BASE_DIR / 'replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['rezo.replicas.ReplicaRouter']
+# Report views read from the replica only if its copy is at most this old
+REPLICA_MAX_LAG_SECONDS = int(os.environ.get('REZO_REPLICA_MAX_LAG', 60))
+REPLICA_APPS = ('inventory',)
+
+
+# Caches
+# The page cache only stores anonymous catalog pages; entries are bounded by
+# MAX_ENTRIES and PAGE_CACHE_SECONDS, and retired early by catalog version bumps.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rezo-pages',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_CACHE_SECONDS = 60
+VERSION_CACHE_SECONDS = 5
+
+# The in-process autocomplete index (inventory/autocomplete.py) is rebuilt in the
+# background when older than this, to pick up writes made by other processes
+AUTOCOMPLETE_REFRESH_SECONDS = 300
+
+# Utilization analytics (inventory/analytics.py) are cached per catalog version for up to this long
+ANALYTICS_CACHE_SECONDS = 600
+
+# Asset serial numbers reserved per process with one counter UPDATE (inventory/serials.py)
+SERIAL_BLOCK_SIZE = 50
+
+# Staff actions are buffered per process and written to the audit log (inventory/audit.py)
+# in one bulk insert this many seconds after the first entry, or once this many are waiting
+AUDIT_FLUSH_SECONDS = 5
+AUDIT_BATCH_SIZE = 200
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,7 +179,54 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored under their SHA-256 (inventory/storage.py); identical files are kept once
+STORAGES = {
+    'default': {'BACKEND': 'inventory.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Let the front-end server send media files: None, 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache)
+MEDIA_SENDFILE_HEADER = os.environ.get('REZO_MEDIA_SENDFILE') or None
+# nginx `internal` location aliased to MEDIA_ROOT (X-Accel-Redirect only)
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# gc_media leaves unreferenced files younger than this alone (uploads not yet committed)
+MEDIA_GC_GRACE_HOURS = 24
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Background jobs (inventory/jobs.py, processed by `manage.py run_worker`)
+# Set JOBS_RUN_EAGERLY to run handlers in-process right after commit instead.
+JOBS_RUN_EAGERLY = os.environ.get('REZO_JOBS_EAGER') == '1'
+JOBS_RETRY_BASE_SECONDS = 30
+JOBS_STALE_AFTER_SECONDS = 300
+
+# Uploaded asset photos are downscaled to fit this box (pixels)
+ASSET_IMAGE_MAX_SIZE = 1600
+
+# On-demand profiling (rezo/profiling.py). Requests are profiled when they send
+# `X-Profile: <token>` with an allow-listed token, or at PROFILING_SAMPLE_RATE.
+# With neither configured the middleware is skipped entirely.
+PROFILING_TOKENS = [token for token in os.environ.get('REZO_PROFILING_TOKENS', '').split(',') if token]
+PROFILING_SAMPLE_RATE = float(os.environ.get('REZO_PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MODE = 'sampler'  # or 'cprofile'
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_KEEP = 50
+
+# Prometheus metrics (rezo/metrics.py). Each worker process writes its numbers to
+# METRICS_DIR; /metrics merges them. Scrapers authenticate with a bearer token.
+METRICS_DIR = os.path.join(BASE_DIR, '.metrics')
+METRICS_FLUSH_SECONDS = 5
+METRICS_GAUGE_SECONDS = 15
+METRICS_TOKEN = os.environ.get('REZO_METRICS_TOKEN', '')
+
+# Test runs: fast password hashing, and keep runtime output out of the project folder
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+if TESTING:
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    METRICS_DIR = os.path.join(tempfile.gettempdir(), f'rezo-test-metrics-{os.getpid()}')
+    PROFILING_DIR = os.path.join(tempfile.gettempdir(), f'rezo-test-profiles-{os.getpid()}')
+    JOBS_RUN_EAGERLY = False
+    AUDIT_FLUSH_SECONDS = None
@@ -15,20 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from accounts import views as accounts_views
-from inventory.views import home, asset_list
+from inventory.views import home, asset_list, serve_media
 from django.conf import settings
-from django.conf.urls.static import static
+from rezo.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', home, name='home'),  # Homepage
     path('assets/', asset_list, name='asset_list'),
     path('accounts/login/', accounts_views.login_view, name='login'),
     path('accounts/', include('accounts.urls')),
     path('inventory/', include('inventory.urls')),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+]
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rezo.settings')
 
 application = get_wsgi_application()
+
+# Build the search autocomplete index before the first request
+from inventory.autocomplete import warm  # noqa: E402
+
+warm()